@@ -0,0 +1,350 @@
+import csv
+import functools
+import json
+import sys
+import time
+from collections import Counter
+
+import batch
+import formats
+from checkpoint import Checkpoint
+from system_control_registers import write_lines
+from table_printer import Table_Printer
+
+# distinct signatures tracked by default, signatures seen more than 1/(capacity + 1) of the time are always kept
+DEFAULT_CAPACITY = 1000
+
+# registers whose set bits make up a fault signature, SHCSR only holds handler enable and state bits
+SIGNATURE_REGISTERS = ("HFSR", "UFSR", "BFSR", "MMFSR")
+
+# joined signatures kept while aggregating, so memory does not grow with the number of distinct register values
+SIGNATURE_CACHE_SIZE = 4096
+
+class TopK:
+    """mergeable misra-gries heavy hitters sketch, keeps at most 2 * capacity keys with counts low by at most error"""
+
+    def __init__(self, capacity = DEFAULT_CAPACITY):
+
+        self.capacity   = capacity
+        self.counts     = Counter()
+        self.error      = 0
+
+    def add(self, key, count = 1):
+        """counts key, pruning the sketch once it holds twice its capacity"""
+
+        self.counts[key] += count
+
+        if len(self.counts) > 2 * self.capacity:
+            self._prune()
+
+    def merge(self, other: "TopK"):
+        """adds the counts of another sketch"""
+
+        self.counts.update(other.counts)
+        self.error += other.error
+
+        if len(self.counts) > self.capacity:
+            self._prune()
+
+    def _prune(self):
+        """subtracts the (capacity + 1)th largest count from every key and drops the keys that reach zero"""
+
+        threshold = sorted(self.counts.values(), reverse=True)[self.capacity]
+
+        self.error  += threshold
+        self.counts = Counter({key: count - threshold for (key, count) in self.counts.items() if count > threshold})
+
+    def most_common(self, n = None) -> list:
+        """returns up to n (key, count) pairs, largest count first"""
+
+        return self.counts.most_common(n)
+
+class FaultAggregate:
+    """streaming counts of fault bitfields and signatures across many records, mergeable across workers"""
+
+    def __init__(self, capacity = DEFAULT_CAPACITY):
+
+        self.records    = 0
+
+        # (register, bitfield flags of a decoded value) -> count, bounded by the size of the register layouts
+        self.flags      = Counter()
+
+        self.signatures = TopK(capacity)
+
+    def merge(self, other: "FaultAggregate"):
+        """adds the counts of another aggregate, e.g. the partial result of a worker"""
+
+        self.records += other.records
+        self.flags.update(other.flags)
+        self.signatures.merge(other.signatures)
+
+    def bitfield_counts(self) -> Counter:
+        """returns the number of records with each 'REGISTER.BITFIELD' set"""
+
+        fields = dict(zip(formats.FIELD_REGISTERS, formats.REGISTER_FIELDS))
+        counts = Counter()
+
+        for ((name, flags), count) in self.flags.items():
+            for (index, bitfield) in enumerate(fields[name]):
+                if flags & (1 << index):
+                    counts[f"{name}.{bitfield}"] += count
+
+        return counts
+
+    def to_dict(self) -> dict:
+        """returns the aggregate as a json compatible dict"""
+
+        return {
+            "records":      self.records,
+            "capacity":     self.signatures.capacity,
+            "error":        self.signatures.error,
+            "flags":        [[name, flags, count] for ((name, flags), count) in self.flags.items()],
+            "signatures":   dict(self.signatures.counts)
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "FaultAggregate":
+        """rebuilds an aggregate from to_dict() output"""
+
+        aggregate = cls(state["capacity"])
+        aggregate.records = state["records"]
+        aggregate.flags.update({(name, flags): count for (name, flags, count) in state["flags"]})
+        aggregate.signatures.counts.update(state["signatures"])
+        aggregate.signatures.error = state["error"]
+
+        return aggregate
+
+def aggregate_records(records, aggregate = None, capacity = DEFAULT_CAPACITY) -> FaultAggregate:
+    """counts the bitfields and signatures of records into aggregate, or a new one"""
+
+    aggregate   = aggregate or FaultAggregate(capacity)
+    encoder     = formats.FieldEncoder()
+
+    signature_indexes   = tuple(formats.FIELD_REGISTERS.index(name) for name in SIGNATURE_REGISTERS)
+    signature_fields    = tuple(formats.REGISTER_FIELDS[index] for index in signature_indexes)
+
+    # signatures only depend on the bitfield flags of the signature registers, the most recent ones are joined once
+    @functools.lru_cache(maxsize=SIGNATURE_CACHE_SIZE)
+    def signature(key: tuple) -> str:
+        return "+".join(bitfield for (fields, flags) in zip(signature_fields, key) if flags for (index, bitfield) in enumerate(fields) if flags & (1 << index))
+
+    for record in records:
+        (raw, decoded) = encoder.encode(record)
+
+        aggregate.records += 1
+
+        for (name, entry) in zip(formats.FIELD_REGISTERS, decoded):
+            if entry is not None:
+                aggregate.flags[(name, entry.flags)] += 1
+
+        aggregate.signatures.add(signature(tuple(decoded[index].flags if decoded[index] is not None else 0 for index in signature_indexes)))
+
+    return aggregate
+
+def aggregate_chunk(lines: list, input_format: str, fieldnames = None, capacity = DEFAULT_CAPACITY) -> FaultAggregate:
+    """aggregates a chunk of input lines, run in a worker process"""
+
+    return aggregate_records(batch.read_records(lines, input_format, fieldnames), capacity=capacity)
+
+def _aggregate_piece(piece: tuple, input_format: str, fieldnames = None, capacity = DEFAULT_CAPACITY) -> tuple:
+    """aggregates the lines of a (lines, end offset) piece of a file, returns (aggregate, end offset)"""
+
+    (lines, end) = piece
+
+    return (aggregate_chunk(lines, input_format, fieldnames, capacity), end)
+
+def _iter_pieces(f, offset: int, chunk_size: int):
+    """yields (lines, end offset) of up to chunk_size complete lines of a binary file, starting at offset"""
+
+    f.seek(offset)
+    lines = list()
+
+    for line in f:
+
+        # a record still being appended is left for the next run
+        if not line.endswith(b"\n"):
+            break
+
+        offset += len(line)
+        lines.append(line.decode("utf-8"))
+
+        if len(lines) >= chunk_size:
+            yield (lines, offset)
+            lines = list()
+
+    if lines:
+        yield (lines, offset)
+
+def iter_summary(aggregate: FaultAggregate, top = 20, style = "plain", header_char = "=", separator_char = "-", line_width = 80):
+    """yields the lines of a ranked summary of signatures and bitfields"""
+
+    def share(count) -> str:
+        return f"{count} ({count / aggregate.records:.1%})" if aggregate.records else str(count)
+
+    # signatures
+    yield header_char * line_width
+    yield f"Fault signatures: {aggregate.records} records"
+    yield separator_char * line_width
+    yield ""
+
+    signatures = aggregate.signatures.most_common(top)
+    if signatures:
+        yield from Table_Printer([share(count) for (_, count) in signatures], [signature.replace("+", " + ") or "no fault bits set" for (signature, _) in signatures], style).list()
+
+    if aggregate.signatures.error:
+        yield ""
+        yield f"counts may be low by up to {aggregate.signatures.error}"
+
+    yield ""
+
+    # bitfields
+    yield header_char * line_width
+    yield "Bitfields set"
+    yield separator_char * line_width
+    yield ""
+
+    bitfields = aggregate.bitfield_counts().most_common()
+    if bitfields:
+        yield from Table_Printer([name for (name, _) in bitfields], [share(count) for (_, count) in bitfields], style).list()
+
+    yield ""
+    yield header_char * line_width
+
+def _iter_inputs(paths):
+    """yields an open text stream for each input path, '-' for stdin"""
+
+    for path in paths:
+        if path == '-':
+            yield (path, sys.stdin)
+        else:
+            with open(path, newline='') as stream:
+                yield (path, stream)
+
+def run(paths, input_format = None, jobs = 1, chunk_size = 10000, capacity = DEFAULT_CAPACITY, merge = False) -> FaultAggregate:
+    """aggregates every record in the input files, or merges saved aggregates if merge is set"""
+
+    aggregate = FaultAggregate(capacity)
+
+    for (path, stream) in _iter_inputs(paths):
+
+        if merge:
+            aggregate.merge(FaultAggregate.from_dict(json.load(stream)))
+            continue
+
+        stream_format = input_format or batch.guess_format(path)
+
+        if jobs <= 1:
+            aggregate_records(batch.read_records(stream, stream_format), aggregate)
+            continue
+
+        # workers receive raw lines, so the csv header is read here and passed along
+        fieldnames = None
+        if stream_format == "csv":
+            fieldnames = next(csv.reader(stream), None)
+            if fieldnames is None:
+                continue
+
+        for partial in batch.map_chunks(aggregate_chunk, stream, jobs, chunk_size, (stream_format, fieldnames, capacity)):
+            aggregate.merge(partial)
+
+    return aggregate
+
+def run_incremental(paths, checkpoint_path, input_format = None, jobs = 1, chunk_size = 10000, capacity = None, interval = 10.0) -> FaultAggregate:
+    """aggregates only the records appended to the input files since the last run, returns the aggregate of all of them
+
+    the offsets read and the aggregate are saved together in the checkpoint every interval seconds and at the end,
+    so a run that is killed resumes from its last checkpoint without counting any record twice. capacity defaults to
+    that of the checkpoint, a different one raises ValueError as the sketch can not be resized
+    """
+
+    checkpoint  = Checkpoint.load(checkpoint_path)
+
+    if checkpoint.state:
+        aggregate = FaultAggregate.from_dict(checkpoint.state)
+        if capacity is not None and capacity != aggregate.signatures.capacity:
+            raise ValueError(f"{checkpoint_path} was started with capacity {aggregate.signatures.capacity}, it can not be resumed with capacity {capacity}")
+    else:
+        aggregate = FaultAggregate(capacity or DEFAULT_CAPACITY)
+
+    capacity    = aggregate.signatures.capacity
+    saved       = time.monotonic()
+
+    for path in paths:
+
+        if path == '-':
+            raise ValueError("stdin can not be read incrementally, name the input files")
+
+        stream_format   = input_format or batch.guess_format(path)
+        entry           = checkpoint.resume(path)
+        (offset, fieldnames) = (entry["offset"], entry["fieldnames"])
+
+        with open(path, 'rb') as f:
+
+            # the csv header is kept in the checkpoint, later runs start past it
+            if stream_format == "csv" and fieldnames is None:
+                header = f.readline()
+                if not header.endswith(b"\n"):
+                    continue
+                fieldnames  = next(csv.reader([header.decode("utf-8")]))
+                offset      = len(header)
+                checkpoint.advance(path, offset, fieldnames)
+
+            pieces = _iter_pieces(f, offset, chunk_size)
+
+            if jobs <= 1:
+                partials = (_aggregate_piece(piece, stream_format, fieldnames, capacity) for piece in pieces)
+            else:
+                partials = batch.map_pool(_aggregate_piece, pieces, jobs, (stream_format, fieldnames, capacity))
+
+            for (partial, end) in partials:
+                aggregate.merge(partial)
+                checkpoint.advance(path, end, fieldnames)
+
+                if time.monotonic() - saved >= interval:
+                    checkpoint.state = aggregate.to_dict()
+                    checkpoint.save()
+                    saved = time.monotonic()
+
+    checkpoint.state = aggregate.to_dict()
+    checkpoint.save()
+
+    return aggregate
+
+def add_arguments(parser):
+    """adds aggregate subcommand arguments to an argparse parser"""
+
+    parser.add_argument('inputs', nargs='*', default=['-'], help="input files of register records, '-' for stdin (default)")
+    parser.add_argument('-o', '--output', dest="output", default='-', help="output file, '-' for stdout (default)")
+    parser.add_argument('--input-format', dest="input_format", choices=batch.readers.keys(), default=None, help="input record format (default: from extension, else jsonl)")
+    parser.add_argument('--json', dest="json", action='store_true', help="write the aggregate as json, which can be merged later, instead of a summary")
+    parser.add_argument('--merge', dest="merge", action='store_true', help="inputs are json aggregates to merge instead of records")
+    parser.add_argument('--top', dest="top", type=int, default=20, help="signatures shown in the summary (default: 20)")
+    parser.add_argument('--capacity', dest="capacity", type=batch.positive_int, default=None, help=f"distinct signatures tracked (default: {DEFAULT_CAPACITY}, or that of the checkpoint)")
+    parser.add_argument('--checkpoint', dest="checkpoint", default=None, help="checkpoint file, only records appended to the inputs since the last run are read")
+    parser.add_argument('--checkpoint-interval', dest="checkpoint_interval", type=float, default=10.0, help="seconds between checkpoint saves during a run (default: 10)")
+    parser.add_argument('-j', '--jobs', dest="jobs", type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument('--chunk-size', dest="chunk_size", type=batch.positive_int, default=10000, help="records per chunk sent to a worker (default: 10000)")
+
+def main(args):
+    """runs the aggregate subcommand from parsed arguments"""
+
+    # a checkpoint of another capacity, or records of a core the bitfield counts are not laid out for
+    try:
+        if args.checkpoint is not None:
+            aggregate = run_incremental(args.inputs, args.checkpoint, args.input_format, args.jobs, args.chunk_size, args.capacity, args.checkpoint_interval)
+        else:
+            aggregate = run(args.inputs, args.input_format, args.jobs, args.chunk_size, args.capacity or DEFAULT_CAPACITY, args.merge)
+    except ValueError as error:
+        sys.exit(f"error: {error}")
+
+    output_stream = sys.stdout if args.output == '-' else open(args.output, 'w')
+
+    try:
+        if args.json:
+            json.dump(aggregate.to_dict(), output_stream)
+            output_stream.write("\n")
+        else:
+            write_lines(output_stream, iter_summary(aggregate, args.top))
+    finally:
+        if output_stream is not sys.stdout:
+            output_stream.close()
@@ -0,0 +1,618 @@
+import argparse
+import csv
+import io
+import json
+import sys
+from collections import deque
+from itertools import islice
+
+import columnar
+import formats
+import profiling
+import report_cache
+import symbols
+import triage
+from system_control_registers import ADDRESS_VALID_BITS, PROFILE_REGISTERS, SECURE_ADDRESS_VALID_BITS, get_profile, iter_record_report, scb_register
+
+# write buffer of output files
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# register columns accepted in input records
+REGISTERS = ("cfsr", "hfsr", "shcsr")
+
+# fault address columns accepted in input records
+ADDRESS_REGISTERS = tuple(ADDRESS_VALID_BITS.keys())
+
+# core register columns accepted in input records
+CORE_REGISTERS = ("exc_return",)
+
+# SecureFault register columns accepted in input records, only decoded for ARMv8-M
+SECURE_REGISTERS = ("sfsr",) + tuple(SECURE_ADDRESS_VALID_BITS.keys())
+
+# debug register columns accepted in input records, decoded through scb_registers.json
+DEBUG_REGISTERS = ("dfsr",)
+
+# decoded register columns written to output records
+DECODED_REGISTERS = ("UFSR", "BFSR", "MMFSR", "HFSR", "SHCSR")
+
+# resolved fault address columns written to output records
+ADDRESS_COLUMNS = ("bfar", "bfar_symbol", "mmfar", "mmfar_symbol")
+
+# names of the matching triage rules, highest priority first
+DIAGNOSIS_COLUMNS = ("diagnoses",)
+
+# core profile and SecureFault columns, after the others so existing columns keep their place
+SECURE_COLUMNS = ("core", "sfsr", "SFSR", "sfar", "sfar_symbol")
+
+# debug fault status columns, after the SecureFault ones
+DEBUG_COLUMNS = ("dfsr", "DFSR")
+
+# every register column of an input record
+RECORD_REGISTERS = REGISTERS + ADDRESS_REGISTERS + CORE_REGISTERS + SECURE_REGISTERS + DEBUG_REGISTERS
+
+def parse_value(value):
+    """converts a record field to a register value, None if the field is empty"""
+
+    if value is None or value == "":
+        return None
+
+    if isinstance(value, str):
+        value = int(value, 0)
+    elif not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"invalid register value {value!r}")
+
+    if not 0 <= value <= 0xFFFFFFFF:
+        raise ValueError(f"register value {value} is not a 32 bit unsigned value")
+
+    return value
+
+def parse_record(row: dict, core = None) -> dict:
+    """converts a parsed csv row or json object to a register record, raises ValueError for invalid fields
+
+    core is the profile of a record without a 'core' field, the record is invalid if it holds a register its profile does not have
+    """
+
+    if not isinstance(row, dict):
+        raise ValueError(f"expected a record object, got {type(row).__name__}")
+
+    record = dict()
+    for reg in RECORD_REGISTERS:
+        try:
+            record[reg] = parse_value(row.get(reg))
+        except ValueError as error:
+            raise ValueError(f"{reg}: {error}") from None
+
+    record["id"] = row.get("id")
+    record["core"] = row.get("core") or None
+
+    # unknown cores are invalid records like bad register values
+    profile = get_profile(record["core"] if record["core"] is not None else core)
+
+    # and so are registers the core does not have, which would be left out of the output without a word
+    unsupported = [reg for (reg, register) in PROFILE_REGISTERS if record[reg] is not None and getattr(profile, register) is None]
+    if unsupported:
+        raise ValueError(f"{profile.name} ({profile.description}) has no register for {', '.join(unsupported)}")
+
+    return record
+
+def skip_record(line: int, error):
+    """reports a record that could not be parsed on stderr, it is left out of the output"""
+
+    print(f"line {line}: {error}, record skipped", file=sys.stderr)
+
+    if profiling.active is not None:
+        profiling.active.counters["skipped"] += 1
+
+def read_csv(stream, fieldnames = None, first_line = 1, core = None):
+    """yields register records from a csv stream with a header row, or without one if fieldnames are given
+
+    invalid records are reported on stderr with their line number, counted from first_line, and skipped
+    """
+
+    reader = csv.DictReader(stream, fieldnames)
+
+    for row in reader:
+        try:
+            yield parse_record(row, core)
+        except ValueError as error:
+            skip_record(first_line - 1 + reader.line_num, error)
+
+def read_jsonl(stream, fieldnames = None, first_line = 1, core = None):
+    """yields register records from a json lines stream
+
+    invalid records are reported on stderr with their line number, counted from first_line, and skipped
+    """
+
+    for (line_number, line) in enumerate(stream, first_line):
+
+        # skip blank lines
+        if not line.strip():
+            continue
+
+        try:
+            yield parse_record(json.loads(line), core)
+        except ValueError as error:
+            skip_record(line_number, error)
+
+readers = {
+    "csv":      read_csv,
+    "jsonl":    read_jsonl
+}
+
+def read_records(stream, fmt = "jsonl", fieldnames = None, first_line = 1, core = None):
+    """yields register records from stream in the given input format, with the core profile of records that do not name one, skipping invalid records"""
+
+    return readers[fmt](stream, fieldnames, first_line, core)
+
+class BatchDecoder:
+    """decodes register records, reusing one instance of each register class of every core profile"""
+
+    def __init__(self, symbol_index = None, profile = None):
+
+        self.profile        = get_profile(profile)
+        self.symbol_index   = symbol_index
+
+        # register instances of each profile, created on the first record of the profile
+        self._registers     = dict()
+
+        # DFSR is the same on every profile, created on the first record holding one
+        self._dfsr          = None
+
+        registers           = self.registers(self.profile)
+        self.cfsr           = registers.cfsr
+        self.hfsr           = registers.hfsr
+        self.shcsr          = registers.shcsr
+
+    def registers(self, profile) -> "SimpleNamespace":
+        """returns the register instances of a profile"""
+
+        try:
+            return self._registers[profile]
+        except KeyError:
+            self._registers[profile] = profile.registers()
+            return self._registers[profile]
+
+    def _profile(self, record: dict):
+        """returns the profile a record names in its 'core' field, else the profile of the decoder"""
+
+        core = record.get("core")
+
+        return self.profile if core is None else get_profile(core)
+
+    def decode(self, record: dict) -> dict:
+        """decodes one record into lists of set bitfields per register, leaving out registers its profile does not implement
+
+        parse_record rejects records holding such registers, so only records built some other way can lose them here
+        """
+
+        result      = {"id": record.get("id")}
+        decoded     = [None] * len(triage.TRIAGE_REGISTERS)
+        profile     = self._profile(record)
+        registers   = self.registers(profile)
+
+        if record.get("core") is not None:
+            result["core"] = profile.name
+
+        cfsr        = registers.cfsr
+        cfsr_value  = record.get("cfsr") if cfsr is not None else None
+        if cfsr_value is not None:
+            cfsr.decode(cfsr_value)
+            result["cfsr"]  = cfsr_value
+            result["UFSR"]  = cfsr.ufsr.get_set_bits()
+            result["BFSR"]  = cfsr.bfsr.get_set_bits()
+            result["MMFSR"] = cfsr.mmfsr.get_set_bits()
+            decoded[0:3]    = (cfsr.ufsr.decoded, cfsr.bfsr.decoded, cfsr.mmfsr.decoded)
+
+            # fault addresses are only kept when their valid bit is set
+            for reg in ADDRESS_REGISTERS:
+                (_, sub_register, valid_bit) = ADDRESS_VALID_BITS[reg]
+                address = record.get(reg)
+
+                if address is not None and getattr(cfsr, sub_register).values[valid_bit]:
+                    result[reg] = address
+                    if self.symbol_index is not None:
+                        result[f"{reg}_symbol"] = self.symbol_index.resolve(address)
+
+        hfsr        = registers.hfsr
+        hfsr_value  = record.get("hfsr") if hfsr is not None else None
+        if hfsr_value is not None:
+            hfsr.decode(hfsr_value)
+            result["hfsr"]  = hfsr_value
+            result["HFSR"]  = hfsr.get_set_bits()
+            decoded[3]      = hfsr.decoded
+
+        shcsr       = registers.shcsr
+        shcsr_value = record.get("shcsr")
+        if shcsr_value is not None:
+            shcsr.decode(shcsr_value)
+            result["shcsr"] = shcsr_value
+            result["SHCSR"] = shcsr.get_set_bits()
+            decoded[4]      = shcsr.decoded
+
+        sfsr        = registers.sfsr
+        sfsr_value  = record.get("sfsr") if sfsr is not None else None
+        if sfsr_value is not None:
+            sfsr.decode(sfsr_value)
+            result["sfsr"]  = sfsr_value
+            result["SFSR"]  = sfsr.get_set_bits()
+            decoded[5]      = sfsr.decoded
+
+            for reg in SECURE_ADDRESS_VALID_BITS.keys():
+                (_, valid_bit) = SECURE_ADDRESS_VALID_BITS[reg]
+                address = record.get(reg)
+
+                if address is not None and sfsr.values[valid_bit]:
+                    result[reg] = address
+                    if self.symbol_index is not None:
+                        result[f"{reg}_symbol"] = self.symbol_index.resolve(address)
+
+        dfsr_value = record.get("dfsr")
+        if dfsr_value is not None:
+            if self._dfsr is None:
+                self._dfsr = scb_register("DFSR")()
+
+            self._dfsr.decode(dfsr_value)
+            result["dfsr"]  = dfsr_value
+            result["DFSR"]  = self._dfsr.get_set_bits()
+
+        if cfsr_value is not None or hfsr_value is not None or shcsr_value is not None or sfsr_value is not None:
+            result["diagnoses"] = [rule.name for rule in profile.triage().diagnose(decoded, result.get("bfar"), result.get("mmfar"))]
+
+        exc_return_value = record.get("exc_return")
+        if exc_return_value is not None:
+
+            # created on first use, most records only hold fault status registers
+            if registers.exc_return is None:
+                registers.exc_return = profile.exc_return_class()()
+
+            registers.exc_return.decode(exc_return_value)
+            result["exc_return"] = exc_return_value
+            result["EXC_RETURN"] = registers.exc_return.get_set_bits()
+
+        frame = record.get("frame")
+        if frame is not None:
+            result["frame"] = frame.to_dict()
+
+        return result
+
+    def iter_report(self, record: dict):
+        """yields the ascii report of every register in one record, one register at a time"""
+
+        profile     = self._profile(record)
+        registers   = self.registers(profile)
+
+        return iter_record_report(record, registers.cfsr, registers.hfsr, registers.shcsr, self.symbol_index, profile, registers.sfsr)
+
+    def report(self, record: dict) -> str:
+        """renders the ascii reports of every register in one record"""
+
+        return "".join(self.iter_report(record))
+
+def decode_records(records, symbol_index = None, profile = None):
+    """yields a decoded result for every record"""
+
+    decoder = BatchDecoder(symbol_index, profile)
+
+    for record in records:
+        yield decoder.decode(record)
+
+def format_result(result: dict) -> dict:
+    """prepares a decoded result for json output, modifying it in place"""
+
+    # drop empty ids so the output stays compact
+    if result.get("id") is None:
+        del result["id"]
+
+    # keep raw values in the same hex notation as the reports
+    for reg in RECORD_REGISTERS:
+        if reg in result:
+            result[reg] = f"0x{result[reg]:08X}"
+
+    if "frame" in result:
+        result["frame"] = {name: f"0x{value:08X}" for (name, value) in result["frame"].items()}
+
+    return result
+
+def write_jsonl(results, stream, header = True):
+    """writes decoded results as json lines"""
+
+    for result in results:
+        stream.write(json.dumps(format_result(result), separators=(",", ":")))
+        stream.write("\n")
+
+def write_csv(results, stream, header = True):
+    """writes decoded results as csv, set bitfields joined with '|'"""
+
+    fieldnames = ("id",) + REGISTERS + DECODED_REGISTERS + ADDRESS_COLUMNS + DIAGNOSIS_COLUMNS + SECURE_COLUMNS + DEBUG_COLUMNS
+
+    writer = csv.writer(stream, lineterminator="\n")
+
+    if header:
+        writer.writerow(fieldnames)
+
+    for result in results:
+        row = ["" if result.get("id") is None else result["id"]]
+        row.extend(f"0x{result[reg]:08X}" if reg in result else "" for reg in REGISTERS)
+        row.extend("|".join(result[reg]) if reg in result else "" for reg in DECODED_REGISTERS)
+        for reg in ADDRESS_REGISTERS:
+            row.append(f"0x{result[reg]:08X}" if reg in result else "")
+            row.append(result.get(f"{reg}_symbol") or "")
+        row.append("|".join(result.get("diagnoses", ())))
+        row.append(result.get("core") or "")
+        row.append(f"0x{result['sfsr']:08X}" if "sfsr" in result else "")
+        row.append("|".join(result["SFSR"]) if "SFSR" in result else "")
+        row.append(f"0x{result['sfar']:08X}" if "sfar" in result else "")
+        row.append(result.get("sfar_symbol") or "")
+        row.append(f"0x{result['dfsr']:08X}" if "dfsr" in result else "")
+        row.append("|".join(result["DFSR"]) if "DFSR" in result else "")
+        writer.writerow(row)
+
+writers = {
+    "csv":      write_csv,
+    "jsonl":    write_jsonl
+}
+
+# output formats, including full ascii reports, one column per bitfield and columnar files
+output_formats = ("jsonl", "csv", "report") + tuple(formats.writers.keys()) + tuple(columnar.writers.keys())
+
+# output formats written to binary streams
+binary_output_formats = formats.binary_formats + tuple(columnar.writers.keys())
+
+def write_records(records, stream, output_format = "jsonl", header = True, symbol_index = None, batch_size = columnar.DEFAULT_BATCH_SIZE, core = None):
+    """decodes records and writes them to stream in the given output format, with the core profile of records that do not name one
+
+    per bitfield and columnar formats have the fixed columns of the default profile, so they raise ValueError for records
+    of any other profile
+    """
+
+    # time spent reading and parsing input is charged to its own stage while profiling
+    if profiling.active is not None:
+        records = profiling.active.iterate("parse", records, "records")
+
+    if output_format == "report":
+        decoder = BatchDecoder(symbol_index, core)
+        for record in records:
+            stream.writelines(decoder.iter_report(record))
+        return
+
+    if output_format in formats.writers or output_format in columnar.writers:
+        formats.check_core(core)
+
+    # per bitfield formats come straight from the decoded entries, no reports are rendered
+    if output_format in formats.writers:
+        formats.writers[output_format](records, stream, header)
+        return
+
+    if output_format in columnar.writers:
+        columnar.writers[output_format](records, stream, header, batch_size)
+        return
+
+    writers[output_format](decode_records(records, symbol_index, core), stream, header)
+
+# symbol index of a worker process, loaded once by _init_worker
+_worker_symbol_index = None
+
+def _init_worker(cache_size, symbols_path):
+    """sets up the report cache and symbol index of a worker process"""
+
+    global _worker_symbol_index
+
+    report_cache.configure(cache_size)
+
+    if symbols_path is not None:
+        _worker_symbol_index = symbols.load(symbols_path)
+
+def process_chunk(lines: list, input_format: str, output_format: str, fieldnames = None, core = None, first_line = 1):
+    """parses, decodes and renders a chunk of input lines to text or bytes, run in a worker process"""
+
+    buffer = io.BytesIO() if output_format in binary_output_formats else io.StringIO()
+    write_records(read_records(lines, input_format, fieldnames, first_line, core), buffer, output_format, header=False, symbol_index=_worker_symbol_index, core=core)
+
+    return buffer.getvalue()
+
+def _process_numbered_chunk(chunk: tuple, input_format: str, output_format: str, fieldnames = None, core = None):
+    """process_chunk of a (first line number, lines) chunk"""
+
+    (first_line, lines) = chunk
+
+    return process_chunk(lines, input_format, output_format, fieldnames, core, first_line)
+
+def _chunks(iterable, size: int):
+    """yields lists of up to size items"""
+
+    # a size of 0 would yield nothing and drop every item
+    if size < 1:
+        raise ValueError(f"chunk size {size} is not a positive size")
+
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def map_pool(function, items, jobs: int, args = (), initializer = None, initargs = ()):
+    """yields function(item, *args) for each item in input order, calling it in a process pool"""
+
+    # imported here as it is slow to import and only needed with more than one job
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as pool:
+
+        # bound the items in flight so memory does not grow with the input
+        pending = deque()
+
+        for item in items:
+            pending.append(pool.submit(function, item, *args))
+
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+def map_chunks(function, lines, jobs: int, chunk_size = 10000, args = (), initializer = None, initargs = ()):
+    """yields function(chunk, *args) for each chunk of input lines in input order, calling it in a process pool"""
+
+    return map_pool(function, _chunks(lines, chunk_size), jobs, args, initializer, initargs)
+
+def process_parallel(lines, input_format, output_format, jobs: int, chunk_size = 10000, fieldnames = None, cache_size = None, symbols_path = None, core = None, first_line = 1):
+    """yields rendered output of each chunk of input lines in input order, decoding chunks in a process pool"""
+
+    # every worker has its own report cache, sized like the one in this process
+    cache_size = report_cache.default_cache.maxsize if cache_size is None else cache_size
+
+    # chunks carry the number of their first line, so workers report invalid records by input line
+    chunks = ((first_line + index * chunk_size, chunk) for (index, chunk) in enumerate(_chunks(lines, chunk_size)))
+
+    return map_pool(_process_numbered_chunk, chunks, jobs, (input_format, output_format, fieldnames, core), _init_worker, (cache_size, symbols_path))
+
+def run(input_stream, output_stream, input_format = "jsonl", output_format = "jsonl", jobs = 1, chunk_size = 10000, cache_size = None, symbols_path = None, batch_size = columnar.DEFAULT_BATCH_SIZE, core = None):
+    """streams records from input_stream through the decoders into output_stream"""
+
+    if cache_size is not None:
+        report_cache.configure(cache_size)
+
+    # input and output are only wrapped while profiling, columnar writers need the real file
+    stats = profiling.active
+    if stats is not None:
+        input_stream = stats.count_input(input_stream)
+        if output_format not in columnar.writers:
+            output_stream = profiling.TimedStream(output_stream, stats)
+
+    # columnar files have a single writer, so they are always written by this process
+    if jobs <= 1 or output_format in columnar.writers:
+        symbol_index = symbols.load(symbols_path) if symbols_path is not None else None
+        write_records(read_records(input_stream, input_format, core=core), output_stream, output_format, symbol_index=symbol_index, batch_size=batch_size, core=core)
+        return
+
+    # workers receive raw lines, so the csv header is read here and passed along
+    fieldnames = None
+    first_line = 1
+    if input_format == "csv":
+        fieldnames = next(csv.reader(input_stream), None)
+        if fieldnames is None:
+            return
+        first_line = 2
+
+    # headers are the only output not produced per chunk
+    write_records([], output_stream, output_format)
+
+    chunks = process_parallel(input_stream, input_format, output_format, jobs, chunk_size, fieldnames, cache_size, symbols_path, core, first_line)
+
+    # workers are not timed, only how long this process waits for them
+    if stats is not None:
+        chunks = stats.iterate("workers", chunks)
+
+    for text in chunks:
+        output_stream.write(text)
+
+def guess_format(path, default = "jsonl"):
+    """picks a record format from a file extension"""
+
+    if path.endswith(".csv"):
+        return "csv"
+
+    if path.endswith(".jsonl") or path.endswith(".json"):
+        return "jsonl"
+
+    if path.endswith(".bin"):
+        return "binary"
+
+    if path.endswith(".arrow"):
+        return "arrow"
+
+    if path.endswith(".parquet"):
+        return "parquet"
+
+    return default
+
+def open_output(path, output_format):
+    """opens an output file, '-' for stdout, in binary mode for binary output formats"""
+
+    if output_format in binary_output_formats:
+        return sys.stdout.buffer if path == '-' else open(path, 'wb', buffering=OUTPUT_BUFFER_SIZE)
+
+    return sys.stdout if path == '-' else open(path, 'w', newline='', buffering=OUTPUT_BUFFER_SIZE)
+
+def positive_int(value) -> int:
+    """parses a size option, which must be at least 1 as a size of 0 would read or write nothing"""
+
+    size = int(value)
+
+    if size < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive size")
+
+    return size
+
+def add_arguments(parser):
+    """adds batch subcommand arguments to an argparse parser"""
+
+    parser.add_argument('input', nargs='?', default='-', help="input file of register records, '-' for stdin (default)")
+    parser.add_argument('-o', '--output', dest="output", default='-', help="output file, '-' for stdout (default)")
+    parser.add_argument('--input-format', dest="input_format", choices=readers.keys(), default=None, help="input record format (default: from extension, else jsonl)")
+    parser.add_argument('--output-format', dest="output_format", choices=output_formats, default=None, help="output record format (default: from extension, else jsonl)")
+    parser.add_argument('-j', '--jobs', dest="jobs", type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument('--chunk-size', dest="chunk_size", type=positive_int, default=10000, help="records per chunk sent to a worker (default: 10000)")
+    parser.add_argument('--batch-size', dest="batch_size", type=positive_int, default=columnar.DEFAULT_BATCH_SIZE, help=f"records per record batch of arrow and parquet output (default: {columnar.DEFAULT_BATCH_SIZE})")
+    parser.add_argument('--cache-size', dest="cache_size", type=int, default=None, help=f"rendered reports kept in the report cache, 0 disables it (default: {report_cache.default_cache.maxsize})")
+    parser.add_argument('--core', dest="core", default=None, help="core profile of records without a 'core' field: armv8m, armv7m, armv6m or a core like cortex-m33 (default: armv7m)")
+    parser.add_argument('--cache-stats', dest="cache_stats", action='store_true', help="print report cache counters to stderr when done")
+    parser.add_argument('--stats', dest="stats", action='store_true', help="time every stage and print a summary with record, byte and cache counters to stderr when done")
+    parser.add_argument('--trace', dest="trace", default=None, help="time every stage and write the calls to a chrome trace json file")
+    parser.add_argument('--profile', dest="profile", default=None, help="run under cProfile, write the pstats to a file and print the slowest functions to stderr")
+    symbols.add_symbol_arguments(parser)
+
+def main(args):
+    """runs the batch subcommand from parsed arguments"""
+
+    input_format    = args.input_format or guess_format(args.input)
+    output_format   = args.output_format or guess_format(args.output)
+
+    try:
+        core = get_profile(args.core).name
+    except ValueError as error:
+        sys.exit(f"error: {error}")
+
+    input_stream    = sys.stdin if args.input == '-' else open(args.input, newline='')
+    output_stream   = open_output(args.output, output_format)
+
+    # stage timers only cover this process, workers of parallel jobs are not timed
+    stats = profiling.enable(trace=args.trace is not None) if args.stats or args.trace is not None else None
+
+    profiler = None
+    if args.profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        run(input_stream, output_stream, input_format, output_format, args.jobs, args.chunk_size, args.cache_size, symbols.symbols_path(args), args.batch_size, core)
+    except ValueError as error:
+        sys.exit(f"error: {error}")
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream not in (sys.stdout, sys.stdout.buffer):
+            output_stream.close()
+        if stats is not None:
+            profiling.disable()
+
+    if stats is not None:
+        if args.stats:
+            print("\n".join(stats.summary()), file=sys.stderr)
+        if args.trace is not None:
+            stats.write_trace(args.trace)
+
+    if profiler is not None:
+        import pstats
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(20)
+
+    # workers keep their own caches, so only the counters of this process are shown
+    if args.cache_stats:
+        cache_stats = report_cache.stats()
+        print(", ".join(f"{name}: {value}" for (name, value) in cache_stats.items()), file=sys.stderr)
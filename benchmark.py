@@ -0,0 +1,740 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import batch
+import columnar
+import exception_frame
+import formats
+import report_cache
+import server
+import symbols
+import triage
+from register import decode_bitfields
+from table_printer import Table_Printer
+from system_control_registers import BFSR, UFSR, MMFSR, CFSR, HFSR, SHCSR, get_register_report
+
+# time a plain decode may spend importing modules the interpreter does not already load, the startup benchmark fails above it
+STARTUP_IMPORT_THRESHOLD_MS = 15
+
+_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_control_registers.py")
+
+# relative change of a metric, in its worse direction, that compare() reports as a regression
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# (cfsr, hfsr, shcsr, bfar) of common fault signatures of a fleet, most frequent first
+_FLEET_SIGNATURES = [
+    (0x00008200, 0x40000000, 0x00000000, 0x00000004),   # NULL dereference escalated to HardFault
+    (0x00000400, 0x40000000, 0x00000000, 0x00000000),   # imprecise bus fault
+    (0x00020000, 0x40000000, 0x00000000, 0x00000000),   # branch to an even address
+    (0x00008200, 0x00000000, 0x00070002, 0x2000F000),   # precise bus fault in the BusFault handler
+    (0x00001000, 0x40000000, 0x00000000, 0x00000000),   # stack overflow on exception entry
+    (0x00000082, 0x00000000, 0x00070001, 0x00000010),   # MPU NULL guard
+    (0x02000000, 0x00000000, 0x00070008, 0x00000000),   # divide by zero
+    (0x00010000, 0x40000000, 0x00000000, 0x00000000),   # undefined instruction
+    (0x00040000, 0x40000000, 0x00000000, 0x00000000),   # invalid EXC_RETURN
+    (0x00080000, 0x00000000, 0x00070008, 0x00000000),   # FPU disabled
+    (0x01000000, 0x00000000, 0x00070008, 0x00000000),   # unaligned access
+    (0x00000000, 0x40000000, 0x00000000, 0x00000000),   # forced without a cause
+    (0x00000000, 0x00000002, 0x00000000, 0x00000000)    # vector table read
+]
+
+def random_values(count, bits = 32, seed = 0) -> list:
+    """generates reproducible uniform-random register values"""
+
+    rng = random.Random(seed)
+
+    return [rng.getrandbits(bits) for _ in range(count)]
+
+def bench_cfsr_decode(count = 100000, repeat = 5) -> dict:
+    """compares dict-walking CFSR decode against the lookup-table decode"""
+
+    values = random_values(count)
+
+    def walk():
+        for value in values:
+            decode_bitfields(BFSR._bfsr_bitfields, (value & CFSR._CFSR_BFSR_MASK) >> CFSR._CFSR_BFSR_SHIFT)
+            decode_bitfields(UFSR._ufsr_bitfields, (value & CFSR._CFSR_UFSR_MASK) >> CFSR._CFSR_UFSR_SHIFT)
+            decode_bitfields(MMFSR._mmfsr_bitfields, (value & CFSR._CFSR_MMFSR_MASK) >> CFSR._CFSR_MMFSR_SHIFT)
+
+    cfsr = CFSR(0)
+
+    def lookup():
+        for value in values:
+            cfsr.decode(value)
+
+    walk_time   = min(timeit.repeat(walk, number=1, repeat=repeat))
+    lookup_time = min(timeit.repeat(lookup, number=1, repeat=repeat))
+
+    return {
+        "dict walk (ns/value)":     walk_time / count * 1e9,
+        "lookup (ns/value)":        lookup_time / count * 1e9,
+        "speedup":                  walk_time / lookup_time
+    }
+
+def bench_thread_stress(count = 20000, threads = 16) -> dict:
+    """decodes the same values from many threads at once, tests/test_threads.py checks the results"""
+
+    values = random_values(count)
+
+    # each thread walks the values from a different starting point so decodes interleave
+    def decode_all(offset) -> list:
+        cfsr    = CFSR()
+        hfsr    = HFSR()
+        shcsr   = SHCSR()
+        results = list()
+
+        for value in values[offset:] + values[:offset]:
+            cfsr.decode(value)
+            hfsr.decode(value)
+            shcsr.decode(value)
+            results.append((value, (dict(cfsr.ufsr.values), dict(cfsr.bfsr.values), dict(cfsr.mmfsr.values), dict(hfsr.values), dict(shcsr.values), tuple(shcsr.get_table()))))
+
+        return results
+
+    start = timeit.default_timer()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(decode_all, [i * count // threads for i in range(threads)]))
+    elapsed = timeit.default_timer() - start
+
+    return {
+        "threads":              threads,
+        "decodes":              threads * count,
+        "decodes per second":   threads * count / elapsed
+    }
+
+def bench_parallel_scaling(count = 100000, output_format = "report", max_jobs = None) -> dict:
+    """measures batch throughput with 1 to max_jobs worker processes"""
+
+    cfsr_values     = random_values(count, seed=1)
+    hfsr_values     = random_values(count, seed=2)
+    shcsr_values    = random_values(count, seed=3)
+
+    lines = [json.dumps({"cfsr": c, "hfsr": h, "shcsr": s}) + "\n" for (c, h, s) in zip(cfsr_values, hfsr_values, shcsr_values)]
+
+    max_jobs    = max_jobs or os.cpu_count() or 1
+    results     = dict()
+    base        = None
+
+    jobs = 1
+    while True:
+        start = timeit.default_timer()
+        batch.run(iter(lines), io.StringIO(), "jsonl", output_format, jobs, chunk_size=max(1, count // (8 * jobs)))
+        rate = count / (timeit.default_timer() - start)
+
+        base = base or rate
+        results[f"jobs={jobs} (records/s)"] = rate
+        results[f"jobs={jobs} speedup"]     = rate / base
+
+        if jobs >= max_jobs:
+            break
+        jobs = min(jobs * 2, max_jobs)
+
+    return results
+
+def random_table(rng, rows) -> tuple:
+    """generates register names and descriptions of random lengths, including words wider than a column"""
+
+    words = ["fault", "a", "the", "register", "BFAR", "exception", "occurred", "x" * 70, "imprecise", "stack"]
+
+    names           = ["".join(rng.choice("ABCDEFGHIJ") for _ in range(rng.randint(1, 16))) for _ in range(rows)]
+    descriptions    = [" ".join(rng.choice(words) for _ in range(rng.randint(0, 40))) for _ in range(rows)]
+
+    return (names, descriptions)
+
+def bench_table_render(rows = 1000, repeat = 5) -> dict:
+    """compares the speed of the compiled table renderer and the original one, tests/test_table_printer.py checks their output"""
+
+    rng = random.Random(0)
+
+    (names, descriptions) = random_table(rng, rows)
+
+    original_time = min(timeit.repeat(lambda: Table_Printer(names, descriptions, compiled=False), number=1, repeat=repeat))
+    compiled_time = min(timeit.repeat(lambda: Table_Printer(names, descriptions, compiled=True), number=1, repeat=repeat))
+
+    return {
+        "rows":                     rows,
+        "original (ms)":            original_time * 1e3,
+        "compiled (ms)":            compiled_time * 1e3,
+        "speedup":                  original_time / compiled_time
+    }
+
+def bench_diagram_render(count = 20000, repeat = 5) -> dict:
+    """checks cached diagram skeletons against formatting the whole template per decode and compares their speed"""
+
+    registers = [BFSR(), UFSR(), MMFSR(), HFSR(), SHCSR()]
+    values = random_values(count)
+
+    # decoded once up front, both paths render the same decodes and only the rendering is timed
+    decodes = list()
+    for value in values:
+        for register in registers:
+            register.decode(value)
+            decodes.append((register.diagram_template, register._get_diagram(), register.values))
+
+    for (template, skeleton, bitfields) in decodes[:5000]:
+        if skeleton.render(bitfields) != template.format_map(bitfields).split('\n'):
+            raise RuntimeError(f"diagram differs from its template for {dict(bitfields)}")
+
+    def format_template():
+        for (template, skeleton, bitfields) in decodes:
+            template.format_map(bitfields).split('\n')
+
+    def render_skeleton():
+        for (template, skeleton, bitfields) in decodes:
+            skeleton.render(bitfields)
+
+    format_time     = min(timeit.repeat(format_template, number=1, repeat=repeat))
+    skeleton_time   = min(timeit.repeat(render_skeleton, number=1, repeat=repeat))
+    diagrams        = len(decodes)
+
+    return {
+        "format template (us/diagram)": format_time / diagrams * 1e6,
+        "skeleton (us/diagram)":        skeleton_time / diagrams * 1e6,
+        "speedup":                      format_time / skeleton_time
+    }
+
+def bench_columnar(count = 50000, repeat = 3) -> dict:
+    """checks arrow output read back against the per-bitfield decode and measures its throughput, skipped without pyarrow"""
+
+    if columnar.pa is None:
+        return {}
+
+    records = corpus("skewed", count)
+
+    # ids of every json type and missing registers, which the columns must keep as strings and nulls
+    for (index, record) in enumerate(records):
+        record["id"] = (index, f"dev-{index}", None)[index % 3]
+        if index % 5 == 0:
+            del record["hfsr"]
+
+    def write() -> bytes:
+        stream = io.BytesIO()
+        columnar.write_arrow(records, stream)
+        return stream.getvalue()
+
+    table   = columnar.pa.ipc.open_file(write()).read_all().to_pydict()
+    encoder = formats.FieldEncoder()
+    groups  = [tuple(f"{name}.{field}" for field in fields) for (name, fields) in zip(formats.FIELD_REGISTERS, formats.REGISTER_FIELDS)]
+
+    for (index, record) in enumerate(records):
+        (raw, decoded) = encoder.encode(record)
+
+        expected = {"id": str(record["id"]) if record["id"] is not None else None}
+        expected.update(zip(formats.RAW_COLUMNS, raw))
+        for (entry, fields, columns) in zip(decoded, formats.REGISTER_FIELDS, groups):
+            expected.update(zip(columns, (bool(value) for value in entry.row) if entry is not None else (None,) * len(fields)))
+
+        actual = {column: table[column][index] for column in expected.keys()}
+        if actual != expected:
+            raise RuntimeError(f"arrow record {index} differs from the per-bitfield decode: {actual} != {expected}")
+
+    write_time = min(timeit.repeat(write, number=1, repeat=repeat))
+
+    return {
+        "arrow (ns/record)":    write_time / count * 1e9,
+        "records per second":   count / write_time
+    }
+
+def bench_frame_decode(count = 200000, repeat = 5) -> dict:
+    """decodes stacked exception frames of mixed basic and extended layouts from one memory image"""
+
+    rng = random.Random(0)
+    exc_returns = (0xFFFFFFFD, 0xFFFFFFED, 0xFFFFFFBC, 0xFFFFFFAC)
+
+    # frames are laid out back to back, each in a slot large enough for any layout
+    slot    = 256
+    memory  = bytes(rng.getrandbits(8) for _ in range(4096)) * (count * slot // 4096 + 1)
+    frames  = [(rng.choice(exc_returns), index * slot) for index in range(count)]
+
+    def decode():
+        for frame in exception_frame.iter_frames(memory, frames):
+            frame.pc
+
+    decode_time = min(timeit.repeat(decode, number=1, repeat=repeat))
+
+    return {
+        "decode (ns/frame)":    decode_time / count * 1e9,
+        "frames per second":    count / decode_time
+    }
+
+def bench_profile_switch(count = 20000, repeat = 5) -> dict:
+    """decodes the skewed corpus with one core profile and with the profile switching on every record of a mixed fleet"""
+
+    records = corpus("skewed", count)
+    cores   = ("cortex-m33", "cortex-m4", "cortex-m0+")
+    mixed   = [dict(record, core=cores[index % len(cores)], sfsr=record["cfsr"] & 0xFF) for (index, record) in enumerate(records)]
+
+    decoder = batch.BatchDecoder()
+
+    def decode(records):
+        for record in records:
+            decoder.decode(record)
+
+    # the first pass builds the layouts and triage tables of every profile, later passes only switch between them
+    decode(mixed)
+
+    single_time = min(timeit.repeat(lambda: decode(records), number=1, repeat=repeat))
+    mixed_time  = min(timeit.repeat(lambda: decode(mixed), number=1, repeat=repeat))
+
+    return {
+        "single profile (ns/record)":   single_time / count * 1e9,
+        "mixed profiles (ns/record)":   mixed_time / count * 1e9,
+        "switching overhead":           mixed_time / single_time
+    }
+
+def corpus(kind = "uniform", count = 10000, seed = 0) -> list:
+    """generates register records: 'uniform' random values, a 'skewed' fleet distribution, or 'all-bits' set"""
+
+    rng = random.Random(seed)
+
+    if kind == "uniform":
+        return [{"cfsr": rng.getrandbits(32), "hfsr": rng.getrandbits(32), "shcsr": rng.getrandbits(32), "bfar": rng.getrandbits(32), "mmfar": rng.getrandbits(32)} for _ in range(count)]
+
+    if kind == "all-bits":
+        return [{"cfsr": 0xFFFFFFFF, "hfsr": 0xFFFFFFFF, "shcsr": 0xFFFFFFFF, "bfar": 0xFFFFFFFF, "mmfar": 0xFFFFFFFF} for _ in range(count)]
+
+    if kind != "skewed":
+        raise ValueError(f"unknown corpus '{kind}'")
+
+    # zipf-like frequencies of the common signatures, and a few random records
+    weights = [1 / (rank + 1) ** 1.2 for rank in range(len(_FLEET_SIGNATURES))]
+    records = list()
+
+    for _ in range(count):
+        if rng.random() < 0.02:
+            (cfsr, hfsr, shcsr, bfar) = (rng.getrandbits(32), rng.getrandbits(32), rng.getrandbits(32), rng.getrandbits(32))
+        else:
+            (cfsr, hfsr, shcsr, bfar) = rng.choices(_FLEET_SIGNATURES, weights)[0]
+        records.append({"cfsr": cfsr, "hfsr": hfsr, "shcsr": shcsr, "bfar": bfar, "mmfar": bfar})
+
+    return records
+
+# synthetic corpora of the stage, allocation and end to end benchmarks
+CORPORA = ("uniform", "skewed", "all-bits")
+
+def bench_stages(count = 20000, repeat = 3) -> dict:
+    """measures the time per record of every decode and render stage on each corpus"""
+
+    results = dict()
+
+    for kind in CORPORA:
+        records = corpus(kind, count)
+        cfsr    = CFSR(0)
+        hfsr    = HFSR()
+        shcsr   = SHCSR()
+        rules   = triage.default_triage()
+        nocache = report_cache.ReportCache(0)
+
+        registers = (cfsr.ufsr, cfsr.bfsr, cfsr.mmfsr, hfsr, shcsr)
+
+        def decode_record(record):
+            cfsr.decode(record["cfsr"])
+            hfsr.decode(record["hfsr"])
+            shcsr.decode(record["shcsr"])
+
+        def decode_all():
+            for record in records:
+                decode_record(record)
+
+        def register_decode():
+            for record in records:
+                hfsr.decode(record["hfsr"])
+                shcsr.decode(record["shcsr"])
+
+        def cfsr_decode():
+            for record in records:
+                cfsr.decode(record["cfsr"])
+
+        def table_render():
+            for record in records:
+                decode_record(record)
+                for register in registers:
+                    decoded = register.decoded
+                    if decoded.set_bits:
+                        Table_Printer(decoded.set_bits, decoded.descriptions).list()
+
+        def diagram():
+            for record in records:
+                decode_record(record)
+                for register in registers:
+                    register.get_diagram()
+
+        def report():
+            for record in records:
+                decode_record(record)
+                for register in registers:
+                    get_register_report(register, cache=nocache)
+
+        def diagnose():
+            for record in records:
+                decode_record(record)
+                rules.diagnose_registers(cfsr, hfsr, shcsr, record["bfar"], record["mmfar"])
+
+        def end_to_end():
+            batch.write_records(iter(records), _Discard(), "report")
+
+        # decoding is part of every stage after the first two, it is timed alone and subtracted
+        decode_time = min(timeit.repeat(decode_all, number=1, repeat=repeat))
+
+        stages = {
+            "HFSR+SHCSR decode":    (register_decode, 0),
+            "CFSR decode":          (cfsr_decode, 0),
+            "table render":         (table_render, decode_time),
+            "diagram":              (diagram, decode_time),
+            "report":               (report, decode_time),
+            "diagnose":             (diagnose, decode_time),
+            "batch report":         (end_to_end, 0)
+        }
+
+        for (stage, (function, baseline)) in stages.items():
+            elapsed = min(timeit.repeat(function, number=1, repeat=repeat)) - baseline
+            results[f"{kind} {stage} (ns/record)"] = max(elapsed, 0) / count * 1e9
+
+    return results
+
+class _Discard:
+    """text stream that drops everything written to it"""
+
+    def write(self, data):
+        return len(data)
+
+    def writelines(self, lines):
+        for _ in lines:
+            pass
+
+def bench_allocations(count = 5000, warmup = 1000) -> dict:
+    """traces the memory kept and the peak memory used per record by batch decoding and reporting each corpus"""
+
+    results = dict()
+
+    for kind in CORPORA:
+        records = corpus(kind, warmup + count, seed=1)
+
+        decoder = batch.BatchDecoder()
+
+        # fill the lookup tables and caches shared by every record first
+        for record in records[:warmup]:
+            decoder.decode(dict(record))
+            decoder.report(record)
+
+        tracemalloc.start()
+        (start, _) = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        for record in records[warmup:]:
+            decoder.decode(dict(record))
+            decoder.report(record)
+
+        (current, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[f"{kind} retained (bytes/record)"]  = (current - start) / count
+        results[f"{kind} peak (KiB)"]               = (peak - start) / 1024
+
+    return results
+
+def _run_measured(args: list, interval = 0.005) -> tuple:
+    """runs a command, returns (wall time in seconds, peak resident set size in MiB, or None where /proc is not available)
+
+    ru_maxrss of a child counts the memory of the benchmark process it was forked from, so the peak is sampled
+    from VmHWM of the child's own address space instead, which only grows until it exits
+    """
+
+    start   = timeit.default_timer()
+    process = subprocess.Popen(args, stdout=subprocess.DEVNULL)
+    peak    = None
+
+    while process.poll() is None:
+        try:
+            with open(f"/proc/{process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak = int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        time.sleep(interval)
+
+    elapsed = timeit.default_timer() - start
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args)
+
+    return (elapsed, peak)
+
+def bench_end_to_end(count = 50000) -> dict:
+    """runs the batch command line on each corpus, measures records per second and peak RSS"""
+
+    results = dict()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in CORPORA:
+            path = os.path.join(directory, f"{kind}.jsonl")
+
+            with open(path, 'w') as f:
+                for record in corpus(kind, count, seed=2):
+                    f.write(json.dumps(record) + "\n")
+
+            for output_format in ("jsonl", "report"):
+                (elapsed, rss) = _run_measured([sys.executable, _script, "batch", path, "--output-format", output_format, "-o", os.path.join(directory, "out")])
+
+                results[f"{kind} {output_format} (records/s)"] = count / elapsed
+                if rss is not None:
+                    results[f"{kind} {output_format} peak RSS (MiB)"] = rss
+
+    return results
+
+def write_firmware(path, count):
+    """writes a minimal ELF32 firmware image with count function symbols"""
+
+    strtab  = bytearray(b"\0")
+    symtab  = bytearray(16)
+
+    for index in range(count):
+        symtab += struct.pack("<IIIBBH", len(strtab), 0x08000000 + 16 * index + 1, 16, (1 << 4) | symbols.STT_FUNC, 0, 1)
+        strtab += f"function_{index}".encode() + b"\0"
+
+    shstrtab = b"\0.symtab\0.strtab\0.shstrtab\0"
+
+    symtab_offset   = 52
+    strtab_offset   = symtab_offset + len(symtab)
+    shstrtab_offset = strtab_offset + len(strtab)
+    shoff           = shstrtab_offset + len(shstrtab)
+
+    sections = [
+        bytes(40),
+        struct.pack("<10I", 1, symbols.SHT_SYMTAB, 0, 0, symtab_offset, len(symtab), 2, 1, 4, 16),
+        struct.pack("<10I", 9, 3, 0, 0, strtab_offset, len(strtab), 0, 0, 1, 0),
+        struct.pack("<10I", 17, 3, 0, 0, shstrtab_offset, len(shstrtab), 0, 0, 1, 0)
+    ]
+
+    header = b"\x7fELF" + bytes([1, 1, 1]) + bytes(9) + struct.pack("<HHIIIIIHHHHHH", 2, 40, 1, 0, 0, shoff, 0, 52, 32, 0, 40, len(sections), 3)
+
+    with open(path, 'wb') as f:
+        f.write(header + symtab + strtab + shstrtab + b"".join(sections))
+
+def bench_symbol_cold_start(count = 200000, repeat = 5) -> dict:
+    """compares the time to open a symbol index and resolve one address from a firmware image, a text index and a binary index"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        firmware    = os.path.join(directory, "firmware.elf")
+        text_index  = os.path.join(directory, "firmware.idx")
+        binary      = os.path.join(directory, "firmware.fidx")
+
+        write_firmware(firmware, count)
+        index = symbols.load(firmware)
+        index.save(text_index)
+        index.save_binary(binary)
+
+        address = 0x08000000 + 8 * count
+
+        def cold_start(path):
+            return min(timeit.repeat(lambda: symbols.load(path).resolve(address), number=1, repeat=repeat))
+
+        elf_time    = cold_start(firmware)
+        text_time   = cold_start(text_index)
+        binary_time = cold_start(binary)
+
+    return {
+        "symbols":                  count,
+        "ELF re-parse (ms)":        elf_time * 1e3,
+        "text index (ms)":          text_time * 1e3,
+        "binary index (ms)":        binary_time * 1e3,
+        "speedup over ELF":         elf_time / binary_time
+    }
+
+def bench_server(count = 20000, connections = 4, pipeline = 16, spawns = 5) -> dict:
+    """load tests a decode server on a unix socket, one request at a time and pipelined, against a process per decode"""
+
+    cfsr_values = random_values(count, seed=1)
+    hfsr_values = random_values(count, seed=2)
+    bodies      = [json.dumps({"cfsr": c, "hfsr": h}).encode() for (c, h) in zip(cfsr_values, hfsr_values)]
+
+    # what the service replaces: one interpreter per decode
+    start = timeit.default_timer()
+    for (c, h) in zip(cfsr_values[:spawns], hfsr_values[:spawns]):
+        subprocess.run([sys.executable, _script, "--cfsr", hex(c), "--hfsr", hex(h)], check=True, stdout=subprocess.DEVNULL)
+    spawn_time = (timeit.default_timer() - start) / spawns
+
+    with tempfile.TemporaryDirectory() as directory:
+        unix_path   = os.path.join(directory, "server.sock")
+        process     = subprocess.Popen([sys.executable, _script, "serve", "--unix", unix_path])
+
+        try:
+            while not os.path.exists(unix_path):
+                if process.poll() is not None:
+                    raise RuntimeError("decode server exited on startup")
+                time.sleep(0.01)
+
+            single      = asyncio.run(server.load_test(bodies[:count // 10], 1, 1, unix_path=unix_path))
+            pipelined   = asyncio.run(server.load_test(bodies, connections, pipeline, unix_path=unix_path))
+        finally:
+            process.terminate()
+            process.wait()
+
+    return {
+        "process per decode (ms)":      spawn_time * 1e3,
+        "single p50 latency (ms)":      single["p50 latency (ms)"],
+        "single p99 latency (ms)":      single["p99 latency (ms)"],
+        "pipelined requests/s":         pipelined["requests per second"],
+        "pipelined p99 window (ms)":    pipelined["p99 latency (ms)"]
+    }
+
+def import_times(args: list) -> dict:
+    """runs python -X importtime with args, returns the self import time in microseconds of every module"""
+
+    result = subprocess.run([sys.executable, "-X", "importtime"] + args, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    times  = dict()
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        (self_time, cumulative, name) = line[len("import time:"):].split("|")
+
+        # skip the column header
+        if self_time.strip().isdigit():
+            times[name.strip()] = int(self_time)
+
+    return times
+
+def bench_startup(runs = 10) -> dict:
+    """times the startup of a plain decode and fails if its imports take longer than STARTUP_IMPORT_THRESHOLD_MS"""
+
+    decode_args = [_script, "--cfsr", "0xEF205AB5", "--hfsr", "0x80000000", "--shcsr", "0x9CFF2C90"]
+
+    # the first run writes the bytecode caches
+    subprocess.run([sys.executable] + decode_args, check=True, stdout=subprocess.DEVNULL)
+
+    interpreter = import_times(["-c", "pass"])
+    added       = {name: time for (name, time) in import_times(decode_args).items() if name not in interpreter}
+    import_time = sum(added.values()) / 1e3
+
+    if import_time > STARTUP_IMPORT_THRESHOLD_MS:
+        slowest = ", ".join(f"{name} {time / 1e3:.1f} ms" for (name, time) in sorted(added.items(), key=lambda item: -item[1])[:5])
+        raise RuntimeError(f"plain decode imports take {import_time:.1f} ms, over the {STARTUP_IMPORT_THRESHOLD_MS} ms threshold (slowest: {slowest})")
+
+    def wall_time(args) -> float:
+        times = list()
+        for _ in range(runs):
+            start = timeit.default_timer()
+            subprocess.run([sys.executable] + args, check=True, stdout=subprocess.DEVNULL)
+            times.append(timeit.default_timer() - start)
+        return sorted(times)[len(times) // 2]
+
+    return {
+        "modules imported":         len(added),
+        "import time (ms)":         import_time,
+        "threshold (ms)":           STARTUP_IMPORT_THRESHOLD_MS,
+        "empty interpreter (ms)":   wall_time(["-c", "pass"]) * 1e3,
+        "plain decode (ms)":        wall_time(decode_args) * 1e3,
+        "argparse path (ms)":       wall_time([_script, "--help"]) * 1e3
+    }
+
+benchmarks = {
+    "stages":               bench_stages,
+    "allocations":          bench_allocations,
+    "end_to_end":           bench_end_to_end,
+    "cfsr_decode":          bench_cfsr_decode,
+    "profile_switch":       bench_profile_switch,
+    "thread_stress":        bench_thread_stress,
+    "parallel_scaling":     bench_parallel_scaling,
+    "symbol_cold_start":    bench_symbol_cold_start,
+    "table_render":         bench_table_render,
+    "diagram_render":       bench_diagram_render,
+    "frame_decode":         bench_frame_decode,
+    "columnar":             bench_columnar,
+    "server":               bench_server,
+    "startup":              bench_startup
+}
+
+def print_results(name, results: dict):
+
+    width = max([28] + [len(metric) for metric in results.keys()])
+
+    print(name)
+    if not results:
+        print("    skipped")
+    for (metric, value) in results.items():
+        print(f"    {metric:<{width}} {value:12.2f}")
+
+def _direction(metric) -> int:
+    """returns 1 if a larger value of a metric is better, -1 if smaller is better, 0 if it is not compared"""
+
+    if "per second" in metric or "/s)" in metric or "speedup" in metric:
+        return 1
+
+    if any(unit in metric for unit in ("(ns", "(us", "(ms", "(s)", "(bytes", "(KiB", "(MiB", "RSS")):
+        return -1
+
+    return 0
+
+def compare(results: dict, baseline: dict, threshold = DEFAULT_REGRESSION_THRESHOLD) -> list:
+    """returns (benchmark, metric, baseline value, value, relative change) of every metric that got worse by more than threshold"""
+
+    regressions = list()
+
+    for (name, metrics) in results.items():
+        for (metric, value) in metrics.items():
+            direction = _direction(metric)
+            base = baseline.get(name, {}).get(metric)
+
+            if not direction or not base:
+                continue
+
+            # positive when the metric got worse
+            change = (base - value) / base if direction > 0 else (value - base) / base
+
+            if change > threshold:
+                regressions.append((name, metric, base, value, change))
+
+    return regressions
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmark the fault analyzer")
+    parser.add_argument('names', nargs='*', help=f"benchmarks to run (default: all of {', '.join(benchmarks.keys())})")
+    parser.add_argument('--json', dest="json", default=None, help="write the results to this json file")
+    parser.add_argument('--compare', dest="baseline", default=None, help="json results of an earlier run to check for regressions")
+    parser.add_argument('--threshold', dest="threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD, help=f"relative change reported as a regression (default: {DEFAULT_REGRESSION_THRESHOLD})")
+
+    args = parser.parse_args()
+
+    for name in args.names:
+        if name not in benchmarks:
+            parser.error(f"unknown benchmark '{name}'")
+
+    results = dict()
+
+    for name in (args.names or benchmarks.keys()):
+        results[name] = benchmarks[name]()
+        print_results(name, results[name])
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "results": results}, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+        regressions = compare(results, baseline, args.threshold)
+
+        for (name, metric, base, value, change) in regressions:
+            print(f"regression: {name} {metric}: {base:.2f} -> {value:.2f} ({change:+.0%})")
+
+        if regressions:
+            raise SystemExit(1)
+
+        print(f"no regressions over {args.threshold:.0%} against {args.baseline}")
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import tempfile
+
+CHECKPOINT_VERSION = 1
+
+# bytes at the start of an input file hashed to notice files that were replaced instead of appended to
+FINGERPRINT_SIZE = 4096
+
+def fingerprint(path, size: int) -> str:
+    """returns the SHA-1 of the first size bytes of a file"""
+
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read(size)).hexdigest()
+
+class Checkpoint:
+    """how far each append-only input file has been read, saved together with the state built from it"""
+
+    def __init__(self, path):
+
+        self.path   = path
+        self.files  = dict()
+        self.state  = None
+
+    @classmethod
+    def load(cls, path) -> "Checkpoint":
+        """reads a checkpoint file, or starts an empty checkpoint if there is none yet"""
+
+        checkpoint = cls(path)
+
+        if not os.path.exists(path):
+            return checkpoint
+
+        with open(path) as f:
+            saved = json.load(f)
+
+        if saved.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"{path}: checkpoint version {saved.get('version')} is not supported")
+
+        checkpoint.files = saved["files"]
+        checkpoint.state = saved["state"]
+
+        return checkpoint
+
+    def save(self):
+        """writes the checkpoint, replacing the previous one atomically so a killed run leaves either one intact"""
+
+        data = json.dumps({"version": CHECKPOINT_VERSION, "files": self.files, "state": self.state})
+
+        (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def resume(self, input_path) -> dict:
+        """returns the progress entry of an input file, checking that it was only appended to since"""
+
+        entry = self.files.get(os.path.abspath(input_path))
+
+        if entry is None:
+            return {"offset": 0, "fingerprint": None, "fingerprint_size": 0, "fieldnames": None}
+
+        if os.path.getsize(input_path) < entry["offset"] or fingerprint(input_path, entry["fingerprint_size"]) != entry["fingerprint"]:
+            raise ValueError(f"{input_path}: file changed since the checkpoint, it is not append-only")
+
+        return entry
+
+    def advance(self, input_path, offset: int, fieldnames = None):
+        """records that an input file has been read up to offset"""
+
+        key     = os.path.abspath(input_path)
+        entry   = self.files.setdefault(key, {"offset": 0, "fingerprint": None, "fingerprint_size": 0, "fieldnames": None})
+
+        entry["offset"]     = offset
+        entry["fieldnames"] = fieldnames
+
+        # the fingerprint only covers bytes already read, which never change in an append-only file
+        size = min(offset, FINGERPRINT_SIZE)
+        if entry["fingerprint"] is None or size != entry["fingerprint_size"]:
+            entry["fingerprint"]        = fingerprint(input_path, size)
+            entry["fingerprint_size"]   = size
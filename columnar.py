@@ -0,0 +1,153 @@
+from array import array
+
+import formats
+import vectorized
+from system_control_registers import BFSR, MMFSR, CFSR
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# records per arrow record batch, which bounds the memory held by the writers
+DEFAULT_BATCH_SIZE = 65536
+
+# positions of the bits marking fault addresses valid within CFSR
+_address_valid_shifts = {
+    "bfar":     CFSR._CFSR_BFSR_SHIFT + BFSR._BFSR_BFARVALID_SHIFT,
+    "mmfar":    CFSR._CFSR_MMFSR_SHIFT + MMFSR._MMFSR_MMARVALID_SHIFT
+}
+
+# bitfield columns decoded from each raw value column
+_field_layouts = (
+    ("cfsr",    vectorized._cfsr_layout),
+    ("hfsr",    vectorized._hfsr_layout),
+    ("shcsr",   vectorized._shcsr_layout)
+)
+
+def _require_pyarrow():
+    """raises an error naming the missing dependency of the columnar formats"""
+
+    if pa is None:
+        raise ImportError("pyarrow is required for arrow and parquet output")
+
+def schema():
+    """returns the arrow schema of decoded records: id, raw values as uint32, bitfields as booleans"""
+
+    _require_pyarrow()
+
+    fields = [pa.field("id", pa.string())]
+    fields.extend(pa.field(reg, pa.uint32()) for reg in formats.RAW_COLUMNS)
+    fields.extend(pa.field(column, pa.bool_()) for column in formats.FIELD_COLUMNS)
+
+    return pa.schema(fields)
+
+class ColumnBuffer:
+    """raw values of up to one record batch held in typed arrays"""
+
+    def __init__(self):
+
+        self.ids        = list()
+        self.raw        = {reg: array(vectorized._UINT32_TYPECODE) for reg in formats.RAW_COLUMNS}
+        self.present    = {reg: list() for reg in formats.RAW_COLUMNS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, record: dict):
+        """adds the raw values of one record, fault addresses only if their valid bit is set"""
+
+        # json input may hold numeric ids, the id column is always a string
+        record_id = record.get("id")
+
+        # records of other cores would be decoded with the wrong layouts
+        if record.get("core") is not None:
+            formats.check_core(record["core"], record_id)
+
+        self.ids.append(str(record_id) if record_id is not None else None)
+
+        cfsr_value = record.get("cfsr")
+
+        for reg in formats.RAW_COLUMNS:
+            value = record.get(reg)
+
+            if reg in _address_valid_shifts and (cfsr_value is None or not (cfsr_value >> _address_valid_shifts[reg]) & 1):
+                value = None
+
+            self.present[reg].append(value is not None)
+            self.raw[reg].append(value if value is not None else 0)
+
+    def clear(self):
+        """empties the buffer for the next record batch"""
+
+        self.__init__()
+
+    def _validity(self, reg: str):
+        """returns the arrow validity bitmap of a raw value column, None if no value is missing"""
+
+        present = self.present[reg]
+
+        if all(present):
+            return None
+
+        return pa.array(present, type=pa.bool_()).buffers()[1]
+
+    def to_batch(self):
+        """converts the buffered values to an arrow record batch"""
+
+        length      = len(self)
+        columns     = [pa.array(self.ids, type=pa.string())]
+        validity    = {reg: self._validity(reg) for reg in formats.RAW_COLUMNS}
+
+        for reg in formats.RAW_COLUMNS:
+            columns.append(pa.Array.from_buffers(pa.uint32(), length, [validity[reg], pa.py_buffer(self.raw[reg])]))
+
+        # bitfields are decoded a whole column at a time, then packed into one bit each
+        for (reg, layout) in _field_layouts:
+            for column in vectorized.decode_layout(layout, self.raw[reg]).values():
+                values = pa.Array.from_buffers(pa.uint8(), length, [validity[reg], pa.py_buffer(column)])
+                columns.append(values.cast(pa.bool_()))
+
+        return pa.RecordBatch.from_arrays(columns, schema=schema())
+
+def iter_record_batches(records, batch_size = DEFAULT_BATCH_SIZE):
+    """yields arrow record batches of up to batch_size decoded records"""
+
+    _require_pyarrow()
+
+    buffer = ColumnBuffer()
+
+    for record in records:
+        buffer.append(record)
+
+        if len(buffer) >= batch_size:
+            yield buffer.to_batch()
+            buffer.clear()
+
+    if len(buffer):
+        yield buffer.to_batch()
+
+def write_arrow(records, stream, header = True, batch_size = DEFAULT_BATCH_SIZE):
+    """writes decoded records to a binary stream as an arrow ipc file"""
+
+    _require_pyarrow()
+
+    with pa.ipc.new_file(stream, schema()) as writer:
+        for record_batch in iter_record_batches(records, batch_size):
+            writer.write_batch(record_batch)
+
+def write_parquet(records, stream, header = True, batch_size = DEFAULT_BATCH_SIZE):
+    """writes decoded records to a binary stream as a parquet file, one row group per record batch"""
+
+    _require_pyarrow()
+
+    import pyarrow.parquet as pq
+
+    with pq.ParquetWriter(stream, schema()) as writer:
+        for record_batch in iter_record_batches(records, batch_size):
+            writer.write_batch(record_batch)
+
+writers = {
+    "arrow":    write_arrow,
+    "parquet":  write_parquet
+}
@@ -0,0 +1,130 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+import batch
+import columnar
+import elf_core
+import symbols
+from scb import SCB_BASE, check_base, read_fault_registers, image_size
+
+def iter_coredump_file(path, base = SCB_BASE, record_size = None, byteorder = "<"):
+    """yields fault register records from a raw or ELF coredump file, one per record_size bytes if it is an archive of raw dumps"""
+
+    # ELF core files carry their own address map
+    if elf_core.is_elf(path):
+        with elf_core.ElfCore(path) as core:
+            yield core.record()
+        return
+
+    size = os.path.getsize(path)
+
+    if size < image_size(base):
+        raise ValueError(f"{path}: {size} bytes is too small for an SCB image at 0x{base:08X}")
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+
+        # a single dump
+        if record_size is None:
+            record = read_fault_registers(buffer, 0, base, byteorder)
+            record["id"] = path
+            yield record
+            return
+
+        # pages are only touched once, so let the kernel read ahead and drop them behind us
+        if hasattr(buffer, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            buffer.madvise(mmap.MADV_SEQUENTIAL)
+
+        for (index, offset) in enumerate(range(0, size - image_size(base) + 1, record_size)):
+            record = read_fault_registers(buffer, offset, base, byteorder)
+            record["id"] = f"{path}:{index}"
+            yield record
+
+def check_record_size(record_size, base = SCB_BASE):
+    """raises ValueError if records of record_size bytes would not each hold an SCB image at base"""
+
+    if record_size is not None and record_size < image_size(base):
+        raise ValueError(f"record size {record_size} is smaller than an SCB image at 0x{base:08X} ({image_size(base)} bytes)")
+
+def _skip_file(path, error):
+    """reports a coredump file that could not be read on stderr, the sweep goes on with the next file"""
+
+    message = str(error)
+    if path not in message:
+        message = f"{path}: {message}"
+
+    print(f"{message}, skipped", file=sys.stderr)
+
+def _iter_files(path):
+    """yields path if it is a file, else every file below it in sorted order"""
+
+    if not os.path.isdir(path):
+        yield path
+        return
+
+    for (root, dirs, files) in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            yield os.path.join(root, name)
+
+def iter_coredumps(paths, base = SCB_BASE, record_size = None, byteorder = "<"):
+    """yields fault register records from coredump files, walking directories in sorted order
+
+    files that cannot be read, are truncated or are not coredumps are reported on stderr and skipped
+    """
+
+    check_base(base)
+    check_record_size(record_size, base)
+
+    for path in paths:
+        for file_path in _iter_files(path):
+            try:
+                yield from iter_coredump_file(file_path, base, record_size, byteorder)
+            except (OSError, ValueError, struct.error) as error:
+                _skip_file(file_path, error)
+
+def record_size_type(value) -> int:
+    """parses --record-size, a positive size in bytes. the image size depends on --base, so main checks it"""
+
+    size = int(value, 0)
+
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive size")
+
+    return size
+
+def add_arguments(parser):
+    """adds coredump subcommand arguments to an argparse parser"""
+
+    parser.add_argument('paths', nargs='+', help="coredump files or directories of coredumps")
+    parser.add_argument('--base', dest="base", type=lambda x: int(x, 0), default=SCB_BASE, help=f"address of the first byte of each memory image (default: 0x{SCB_BASE:08X})")
+    parser.add_argument('--record-size', dest="record_size", type=record_size_type, default=None, help="size of each memory image if files are archives of many dumps")
+    parser.add_argument('--big-endian', dest="byteorder", action='store_const', const='>', default='<', help="memory images are big endian")
+    parser.add_argument('-o', '--output', dest="output", default='-', help="output file, '-' for stdout (default)")
+    parser.add_argument('--output-format', dest="output_format", choices=batch.output_formats, default=None, help="output record format (default: from extension, else jsonl)")
+    parser.add_argument('--batch-size', dest="batch_size", type=batch.positive_int, default=columnar.DEFAULT_BATCH_SIZE, help=f"records per record batch of arrow and parquet output (default: {columnar.DEFAULT_BATCH_SIZE})")
+    symbols.add_symbol_arguments(parser)
+
+def main(args):
+    """runs the coredump subcommand from parsed arguments"""
+
+    # images must hold the fault registers and records must not overlap, checked before the output file is created
+    try:
+        check_base(args.base)
+        check_record_size(args.record_size, args.base)
+    except ValueError as error:
+        sys.exit(f"error: {error}")
+
+    output_format = args.output_format or batch.guess_format(args.output)
+    output_stream = batch.open_output(args.output, output_format)
+    symbols_path  = symbols.symbols_path(args)
+    symbol_index  = symbols.load(symbols_path) if symbols_path else None
+
+    try:
+        records = iter_coredumps(args.paths, args.base, args.record_size, args.byteorder)
+        batch.write_records(records, output_stream, output_format, symbol_index=symbol_index, batch_size=args.batch_size)
+    finally:
+        if output_stream not in (sys.stdout, sys.stdout.buffer):
+            output_stream.close()
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import xml.etree.ElementTree as ElementTree
+
+from register import Register
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# bump when the parsed form changes, so stale cache files are not used
+DEFINITIONS_CACHE_VERSION = 1
+
+# register definitions of the SCB that are not hand-written in system_control_registers
+SCB_DEFINITIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scb_registers.json")
+
+class DefinedRegister(Register):
+    """register class compiled from a register definition"""
+
+    __slots__ = ()
+
+    definition = None
+
+    def __init__(self, value = None):
+        super().__init__(self.definition["bitfields"])
+
+        if value is not None:
+            self.decode(value)
+
+def _bitfield(name, lsb: int, width: int, description) -> tuple:
+    """returns (name, bitfield dict) of a bitfield at lsb that is width bits wide"""
+
+    return (name, {
+        "mask":         ((1 << width) - 1) << lsb,
+        "shift":        lsb,
+        "description":  " ".join((description or name).split())
+    })
+
+def _definition(name, size: int, address, description, bitfields: list) -> dict:
+    """returns a register definition with bitfields ordered from the most significant bit like the hand-written registers"""
+
+    bitfields.sort(key=lambda bitfield: -bitfield[1]["shift"])
+
+    return {
+        "name":         name,
+        "size":         size,
+        "address":      address,
+        "description":  " ".join((description or "").split()),
+        "bitfields":    dict(bitfields)
+    }
+
+def _parse_bits(bits) -> tuple:
+    """converts a 'msb:lsb' or 'bit' string or a bit number to (lsb, width)"""
+
+    (msb, _, lsb) = str(bits).partition(":")
+    (msb, lsb) = (int(msb), int(lsb or msb))
+
+    return (lsb, msb - lsb + 1)
+
+def _parse_schema(schema: dict) -> dict:
+    """parses the {"registers": {NAME: {"size", "address", "description", "bitfields": {FIELD: {"bits", "description"}}}}} schema"""
+
+    definitions = dict()
+
+    for (name, register) in schema["registers"].items():
+        bitfields = list()
+
+        for (field, spec) in register["bitfields"].items():
+            (lsb, width) = _parse_bits(spec["bits"])
+            bitfields.append(_bitfield(field, lsb, width, spec.get("description")))
+
+        address = register.get("address")
+        if isinstance(address, str):
+            address = int(address, 0)
+
+        definitions[name] = _definition(name, register.get("size", 32), address, register.get("description"), bitfields)
+
+    return definitions
+
+def _text(element, tag, default = None):
+    """returns the stripped text of a child element, or default"""
+
+    child = element.find(tag)
+
+    return child.text.strip() if child is not None and child.text else default
+
+def _svd_bits(field) -> tuple:
+    """returns (lsb, width) of an SVD field in any of its three bit range notations"""
+
+    if field.find("bitOffset") is not None:
+        return (int(_text(field, "bitOffset"), 0), int(_text(field, "bitWidth", "1"), 0))
+
+    if field.find("lsb") is not None:
+        (lsb, msb) = (int(_text(field, "lsb"), 0), int(_text(field, "msb"), 0))
+        return (lsb, msb - lsb + 1)
+
+    return _parse_bits(_text(field, "bitRange").strip("[]"))
+
+def _parse_svd(data: bytes, peripheral = None) -> dict:
+    """parses the registers of a CMSIS-SVD device file, only those of one peripheral if given"""
+
+    definitions = dict()
+
+    for element in ElementTree.fromstring(data).iter("peripheral"):
+
+        if peripheral is not None and _text(element, "name") != peripheral:
+            continue
+
+        base = int(_text(element, "baseAddress", "0"), 0)
+
+        for register in element.iter("register"):
+            name = _text(register, "name")
+
+            bitfields = [_bitfield(_text(field, "name"), *_svd_bits(field), _text(field, "description")) for field in register.iter("field")]
+
+            offset = _text(register, "addressOffset")
+            address = base + int(offset, 0) if offset is not None else None
+
+            definitions[name] = _definition(name, int(_text(register, "size", "32"), 0), address, _text(register, "description"), bitfields)
+
+    return definitions
+
+def parse(path, data: bytes, peripheral = None) -> dict:
+    """parses register definitions from an SVD, YAML or JSON file, picked by extension"""
+
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in (".svd", ".xml"):
+        return _parse_svd(data, peripheral)
+
+    if extension in (".yaml", ".yml"):
+        if yaml is None:
+            raise ImportError("PyYAML is required for yaml register definitions")
+        return _parse_schema(yaml.safe_load(data))
+
+    return _parse_schema(json.loads(data))
+
+def _load(path, cache_dir, peripheral) -> tuple:
+    """returns (content key, register definitions) of a file"""
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    # keyed by content, so an edited file is parsed again
+    key = hashlib.sha1(f"{DEFINITIONS_CACHE_VERSION}:{peripheral}:{os.path.splitext(path)[1]}:".encode() + data).hexdigest()
+
+    if cache_dir is None:
+        return (key, parse(path, data, peripheral))
+
+    cache_path = os.path.join(cache_dir, key + ".pickle")
+
+    try:
+        with open(cache_path, 'rb') as f:
+            return (key, pickle.load(f))
+    except FileNotFoundError:
+        pass
+
+    definitions = parse(path, data, peripheral)
+
+    # write to a temporary file first so readers never load a partial cache file
+    os.makedirs(cache_dir, exist_ok=True)
+    (fd, tmp_path) = tempfile.mkstemp(dir=cache_dir)
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(definitions, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+    return (key, definitions)
+
+def load(path, cache_dir = None, peripheral = None) -> dict:
+    """returns the register definitions of a file, from a pickled copy in cache_dir if it was parsed before"""
+
+    return _load(path, cache_dir, peripheral)[1]
+
+def register_class(definition: dict) -> type:
+    """compiles a register definition into a Register subclass"""
+
+    return type(definition["name"], (DefinedRegister,), {
+        "__slots__":    (),
+        "__doc__":      definition["description"] or None,
+        "name":         definition["name"],
+        "size":         (definition["size"] + 3) // 4,
+        "width":        definition["size"],
+        "address":      definition["address"],
+        "definition":   definition
+    })
+
+# compiled classes by definition file content, so every load of a file decodes through the same layouts
+_compiled = dict()
+
+def load_registers(path = SCB_DEFINITIONS, cache_dir = None, peripheral = None) -> dict:
+    """returns a Register subclass for every register defined in a file, by name"""
+
+    (key, definitions) = _load(path, cache_dir, peripheral)
+
+    try:
+        return _compiled[key]
+    except KeyError:
+        pass
+
+    _compiled[key] = {name: register_class(definition) for (name, definition) in definitions.items()}
+
+    return _compiled[key]
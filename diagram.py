@@ -0,0 +1,189 @@
+import functools
+import operator
+
+# distinct value rows kept per diagram, fault registers only ever show a handful of value combinations
+ROW_CACHE_SIZE = 4096
+
+class Diagram:
+    """static lines of a register diagram and the slots on its value row where bitfield values are filled in"""
+
+    __slots__ = ("lines", "row", "slots", "fields", "format_row")
+
+    def __init__(self, lines: list, row: int, slots: list):
+
+        self.lines  = tuple(lines)
+        self.row    = row
+
+        # (bitfield, width) of every slot, left to right
+        self.slots  = tuple((bitfield, width) for (column, width, bitfield) in sorted(slots))
+
+        # picks the slot values as a tuple, itemgetter returns a bare value for a single name so it is only used for two or more
+        names       = tuple(bitfield for (bitfield, width) in self.slots)
+        self.fields = operator.itemgetter(*names) if len(names) > 1 else lambda values: tuple(values[name] for name in names)
+
+        # the value row as one format string, braces in the drawing are escaped and each slot is a positional field
+        row_format  = ""
+        position    = 0
+        for (index, (column, width, bitfield)) in enumerate(sorted(slots)):
+            row_format += lines[row][position:column].replace("{", "{{").replace("}", "}}") + f"{{{index}}}"
+            position = column + width
+        row_format += lines[row][position:].replace("{", "{{").replace("}", "}}")
+
+        widths = tuple(width for (bitfield, width) in self.slots)
+
+        @functools.lru_cache(maxsize=ROW_CACHE_SIZE)
+        def format_row(values: tuple) -> str:
+            return row_format.format(*(str(value) if width == 1 and value < 10 else f"{value:X}".center(width) for (value, width) in zip(values, widths)))
+
+        self.format_row = format_row
+
+    def render(self, values) -> list:
+        """returns the diagram lines with the value of every bitfield filled in"""
+
+        lines = list(self.lines)
+        lines[self.row] = self.format_row(self.fields(values))
+
+        return lines
+
+def parse_template(template: str) -> Diagram:
+    """builds a diagram from a hand-drawn template with a one character '{BITFIELD}' slot for each value"""
+
+    lines   = template.split('\n')
+    row     = None
+    slots   = list()
+
+    for (index, line) in enumerate(lines):
+        if "{" not in line:
+            continue
+
+        if row is not None:
+            raise ValueError("diagram template values must all be on one line")
+        row = index
+
+        # slot columns are counted after the placeholders before them are replaced
+        stripped = ""
+        position = 0
+        while True:
+            start = line.find("{", position)
+            if start < 0:
+                break
+            end = line.index("}", start)
+            stripped += line[position:start]
+            slots.append((len(stripped), 1, line[start + 1:end]))
+            stripped += " "
+            position = end + 1
+        lines[index] = stripped + line[position:]
+
+    if row is None:
+        raise ValueError("diagram template has no values")
+
+    return Diagram(lines, row, slots)
+
+def _cells(bitfields: dict, bits: int) -> list:
+    """splits a register into (msb, lsb, bitfield or None for reserved bits) cells from the most significant bit"""
+
+    fields = sorted(((bitfields[name]["shift"] + bin(bitfields[name]["mask"]).count("1") - 1, bitfields[name]["shift"], name) for name in bitfields.keys()), reverse=True)
+
+    cells   = list()
+    top     = bits - 1
+
+    for (msb, lsb, name) in fields:
+        if msb < top:
+            cells.append((top, msb + 1, None))
+        cells.append((msb, lsb, name))
+        top = lsb - 1
+
+    if top >= 0:
+        cells.append((top, 0, None))
+
+    return cells
+
+def generate(bitfields: dict, bits: int) -> Diagram:
+    """draws a diagram of a register from its bitfield masks: bit ruler, value cells and labelled leader lines"""
+
+    cells = _cells(bitfields, bits)
+
+    # bit b is drawn in column 1 + 2 * (bits - 1 - b), cells are separated by borders on the even columns
+    def column(bit) -> int:
+        return 1 + 2 * (bits - 1 - bit)
+
+    width = 2 * bits + 1
+
+    # bit ruler, labelling the first and last bit of every cell, tens above units
+    tens    = [" "] * width
+    units   = [" "] * width
+    units[0] = units[-1] = "│"
+    for (msb, lsb, name) in cells:
+        for bit in {msb, lsb}:
+            units[column(bit)] = str(bit % 10)
+            if bit >= 10:
+                tens[column(bit)] = str(bit // 10)
+
+    top     = "├" + "┬".join("─" * (2 * (msb - lsb) + 1) for (msb, lsb, name) in cells) + "┤"
+    values  = "│"
+    bottom  = "└"
+    slots   = list()
+    arrows  = list()
+
+    for (msb, lsb, name) in cells:
+        cell_width = 2 * (msb - lsb) + 1
+
+        if name is None:
+            label = "RESERVED" if cell_width >= 10 else "RES" if cell_width >= 5 else ""
+            values += label.center(cell_width)
+            bottom += "─" * cell_width
+        else:
+            slots.append((len(values), cell_width, name))
+            values += " " * cell_width
+            arrow = len(bottom) + cell_width // 2
+            bottom += "─" * (cell_width // 2) + "▲" + "─" * (cell_width // 2)
+            arrows.append((arrow, name))
+
+        values += "│"
+        bottom += "┴"
+
+    bottom = bottom[:-1] + "┘"
+
+    # fields left of the middle are labelled on the left, outermost first, the others on the right
+    left    = [(arrow, name) for (arrow, name) in arrows if arrow < width // 2]
+    right   = [(arrow, name) for (arrow, name) in reversed(arrows) if arrow >= width // 2]
+
+    # left labels end two columns before the leftmost arrow, the diagram is indented to make room for them
+    margin      = max([len(name) + 1 - left[0][0] for (arrow, name) in left] + [0]) if left else 0
+    label_end   = margin + left[0][0] - 2 if left else 0
+    label_start = margin + right[0][0] + 2 if right else 0
+    line_width  = max([margin + width] + [label_start + len(name) for (arrow, name) in right])
+
+    leaders = list()
+    for row in range(max(len(left), len(right))):
+        line = [" "] * line_width
+
+        # fields labelled on later rows still need their vertical line
+        for (arrow, name) in left[row + 1:] + right[row + 1:]:
+            line[margin + arrow] = "│"
+
+        if row < len(left):
+            (arrow, name) = left[row]
+            line[label_end - len(name) + 1:label_end + 1] = name
+            line[label_end + 1:margin + arrow] = "─" * (margin + arrow - label_end - 1)
+            line[margin + arrow] = "┘"
+
+        if row < len(right):
+            (arrow, name) = right[row]
+            line[margin + arrow] = "└"
+            line[margin + arrow + 1:label_start] = "─" * (label_start - margin - arrow - 1)
+            line[label_start:label_start + len(name)] = name
+
+        leaders.append("".join(line).rstrip())
+
+    pad     = " " * margin
+    lines   = [""]
+
+    if any(digit != " " for digit in tens):
+        lines.append((pad + "".join(tens)).rstrip())
+
+    lines += [pad + "".join(units), pad + top, pad + values, pad + bottom] + leaders + [""]
+
+    slots = [(margin + slot, cell_width, name) for (slot, cell_width, name) in slots]
+
+    return Diagram(lines, len(lines) - len(leaders) - 3, slots)
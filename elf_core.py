@@ -0,0 +1,264 @@
+import struct
+from bisect import bisect_right
+
+import exception_frame
+from exception_frame import STACKED_REGISTERS
+from scb import SCB_REGISTERS, read_fault_registers, image_size
+
+ELF_MAGIC       = b"\x7fELF"
+
+_ELFCLASS32     = 1
+_ELFDATA2LSB    = 1
+_ELFDATA2MSB    = 2
+
+PT_LOAD         = 1
+PT_NOTE         = 4
+
+NT_PRSTATUS     = 1
+
+# general purpose registers saved in an ARM NT_PRSTATUS note
+CORE_REGISTERS = ("r0", "r1", "r2", "r3", "r4", "r5", "r6", "r7", "r8", "r9", "r10", "r11", "r12", "sp", "lr", "pc", "xpsr")
+
+# offset of pr_reg in a 32 bit elf_prstatus
+_PRSTATUS_REG_OFFSET = 72
+
+# ELF32 header after e_ident, and program header
+_ehdr_format = "HHIIIIIHHHHHH"
+_phdr_format = "IIIIIIII"
+
+def is_elf(path) -> bool:
+    """checks a file for the ELF magic number"""
+
+    with open(path, 'rb') as f:
+        return f.read(4) == ELF_MAGIC
+
+def read_elf_header(f, path) -> tuple:
+    """reads an ELF32 header from the start of f, returns (byteorder, header fields after e_ident)"""
+
+    ident = f.read(16)
+
+    if ident[:4] != ELF_MAGIC:
+        raise ValueError(f"{path}: not an ELF file")
+
+    if ident[4] != _ELFCLASS32:
+        raise ValueError(f"{path}: only ELF32 files are supported")
+
+    if ident[5] == _ELFDATA2LSB:
+        byteorder = "<"
+    elif ident[5] == _ELFDATA2MSB:
+        byteorder = ">"
+    else:
+        raise ValueError(f"{path}: unknown ELF data encoding {ident[5]}")
+
+    ehdr = struct.unpack(byteorder + _ehdr_format, f.read(struct.calcsize(_ehdr_format)))
+
+    return (byteorder, ehdr)
+
+def parse_notes(data, byteorder) -> list:
+    """parses the contents of a note segment or section into (name, type, desc) tuples"""
+
+    notes   = list()
+    header  = struct.Struct(byteorder + "III")
+
+    position = 0
+    while position + header.size <= len(data):
+        (namesz, descsz, note_type) = header.unpack_from(data, position)
+        position += header.size
+
+        name = data[position:position + namesz].rstrip(b"\0").decode("ascii", "replace")
+        position += (namesz + 3) & ~3
+
+        desc = data[position:position + descsz]
+        position += (descsz + 3) & ~3
+
+        notes.append((name, note_type, desc))
+
+    return notes
+
+class Segment:
+    """PT_LOAD segment of a core file"""
+
+    __slots__ = ("vaddr", "offset", "filesz", "memsz")
+
+    def __init__(self, vaddr, offset, filesz, memsz):
+
+        self.vaddr  = vaddr
+        self.offset = offset
+        self.filesz = filesz
+        self.memsz  = memsz
+
+class ElfCore:
+    """reads registers and memory from an ELF32 core file with seek-based reads"""
+
+    def __init__(self, path):
+
+        self.path       = path
+        self._file      = open(path, 'rb')
+        self._notes     = None
+
+        try:
+            self._read_headers()
+        except Exception:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def _read_headers(self):
+        """indexes the program headers, the only part of the file read up front"""
+
+        (self.byteorder, ehdr) = read_elf_header(self._file, self.path)
+        (phoff, phentsize, phnum) = (ehdr[4], ehdr[8], ehdr[9])
+
+        phdr_struct = struct.Struct(self.byteorder + _phdr_format)
+
+        self._file.seek(phoff)
+        phdrs = self._file.read(phentsize * phnum)
+
+        segments            = list()
+        self._note_segments = list()
+
+        for index in range(phnum):
+            (p_type, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, p_flags, p_align) = phdr_struct.unpack_from(phdrs, index * phentsize)
+
+            if p_type == PT_LOAD:
+                segments.append(Segment(p_vaddr, p_offset, p_filesz, p_memsz))
+            elif p_type == PT_NOTE:
+                self._note_segments.append((p_offset, p_filesz))
+
+        # sorted by address for bisect lookups
+        segments.sort(key=lambda segment: segment.vaddr)
+
+        self.segments   = segments
+        self._vaddrs    = [segment.vaddr for segment in segments]
+
+    def _find_segment(self, address) -> Segment:
+        """returns the PT_LOAD segment covering address, or None"""
+
+        index = bisect_right(self._vaddrs, address) - 1
+
+        if index < 0:
+            return None
+
+        segment = self.segments[index]
+
+        if address >= segment.vaddr + segment.memsz:
+            return None
+
+        return segment
+
+    def read(self, address, size) -> bytes:
+        """reads size bytes of target memory starting at address"""
+
+        segment = self._find_segment(address)
+
+        if segment is None or address + size > segment.vaddr + segment.memsz:
+            raise ValueError(f"{self.path}: 0x{address:08X}-0x{address + size:08X} is not in the core file")
+
+        start       = address - segment.vaddr
+        in_file     = max(0, min(size, segment.filesz - start))
+
+        self._file.seek(segment.offset + start)
+        data = self._file.read(in_file)
+
+        # memory past the end of the file data reads as zero
+        return data + bytes(size - in_file)
+
+    def contains(self, address, size = 4) -> bool:
+        """checks if target memory at address is in the core file"""
+
+        segment = self._find_segment(address)
+
+        return segment is not None and address + size <= segment.vaddr + segment.memsz
+
+    def read_words(self, address, count) -> tuple:
+        """reads count 32 bit words of target memory starting at address"""
+
+        return struct.unpack(f"{self.byteorder}{count}I", self.read(address, 4 * count))
+
+    def fault_registers(self) -> dict:
+        """reads the SCB fault registers"""
+
+        start = SCB_REGISTERS["shcsr"]
+
+        return read_fault_registers(self.read(start, image_size(start)), 0, start, self.byteorder)
+
+    def notes(self) -> list:
+        """returns (name, type, desc) of every note, read on first use"""
+
+        if self._notes is not None:
+            return self._notes
+
+        self._notes = list()
+
+        for (offset, size) in self._note_segments:
+            self._file.seek(offset)
+            self._notes.extend(parse_notes(self._file.read(size), self.byteorder))
+
+        return self._notes
+
+    def core_registers(self) -> dict:
+        """returns the general purpose registers from the NT_PRSTATUS note, or None"""
+
+        for (name, note_type, desc) in self.notes():
+            if note_type == NT_PRSTATUS and len(desc) >= _PRSTATUS_REG_OFFSET + 4 * len(CORE_REGISTERS):
+                values = struct.unpack_from(f"{self.byteorder}{len(CORE_REGISTERS)}I", desc, _PRSTATUS_REG_OFFSET)
+                return dict(zip(CORE_REGISTERS, values))
+
+        return None
+
+    def stacked_registers(self, sp = None) -> dict:
+        """returns the registers stacked on exception entry at sp (default: sp from NT_PRSTATUS), or None"""
+
+        if sp is None:
+            core_registers = self.core_registers()
+            if core_registers is None:
+                return None
+            sp = core_registers["sp"]
+
+        if not self.contains(sp, 4 * len(STACKED_REGISTERS)):
+            return None
+
+        return dict(zip(STACKED_REGISTERS, self.read_words(sp, len(STACKED_REGISTERS))))
+
+    def exception_frame(self, msp = None, psp = None) -> exception_frame.ExceptionFrame:
+        """returns the frame stacked on entry to the exception the core was dumped in, or None
+
+        LR from NT_PRSTATUS must hold EXC_RETURN, and SP is taken as the MSP unless msp is given. NT_PRSTATUS only
+        holds the SP in use when the core was dumped, which inside a handler is the MSP, and no standard note holds the
+        PSP. frames stacked on the process stack are therefore only decoded when psp is given, otherwise None
+        """
+
+        core_registers = self.core_registers()
+        if core_registers is None or not exception_frame.is_exc_return(core_registers["lr"]):
+            return None
+
+        exc_return  = core_registers["lr"]
+        msp         = core_registers["sp"] if msp is None else msp
+        sp          = psp if exception_frame.frame_stack(exc_return) == "PSP" else msp
+        size        = exception_frame.frame_size(exc_return)
+
+        if sp is None or not self.contains(sp, size):
+            return None
+
+        return exception_frame.decode_frame(self.read(sp, size), 0, exc_return, sp, self.byteorder)
+
+    def record(self) -> dict:
+        """returns the fault registers, and the exception frame if there is one, as a batch record"""
+
+        record = self.fault_registers()
+        record["id"] = self.path
+
+        frame = self.exception_frame()
+        if frame is not None:
+            record["exc_return"]    = frame.exc_return
+            record["frame"]         = frame
+
+        return record
@@ -0,0 +1,334 @@
+import struct
+
+from register import Register
+
+# registers pushed to the stack on exception entry, in stack order
+STACKED_REGISTERS = ("r0", "r1", "r2", "r3", "r12", "lr", "pc", "xpsr")
+
+# floating-point registers of the extended frame, stacked after the basic frame
+FP_REGISTERS = ("s0", "s1", "s2", "s3", "s4", "s5", "s6", "s7", "s8", "s9", "s10", "s11", "s12", "s13", "s14", "s15", "fpscr")
+
+# callee saved registers of the additional state context, stacked before the basic frame by the Secure state
+CALLEE_REGISTERS = ("integrity_signature", "r4", "r5", "r6", "r7", "r8", "r9", "r10", "r11")
+
+# xPSR bit set if a padding word was stacked to align the frame to 8 bytes
+XPSR_SPREALIGN = 1 << 9
+
+# exception numbers below 16 are system exceptions, the others external interrupts
+EXCEPTION_NAMES = {
+    1:  "Reset",
+    2:  "NMI",
+    3:  "HardFault",
+    4:  "MemManage",
+    5:  "BusFault",
+    6:  "UsageFault",
+    7:  "SecureFault",
+    11: "SVCall",
+    12: "DebugMonitor",
+    14: "PendSV",
+    15: "SysTick"
+}
+
+class EXC_RETURN(Register):
+
+    __slots__ = ()
+
+    name = "EXC_RETURN"
+    size = 8
+
+    _EXC_RETURN_PREFIX_MASK     = 0xFF000000
+    _EXC_RETURN_PREFIX_SHIFT    = 24
+    _EXC_RETURN_S_MASK          = 0x00000040
+    _EXC_RETURN_S_SHIFT         = 6
+    _EXC_RETURN_DCRS_MASK       = 0x00000020
+    _EXC_RETURN_DCRS_SHIFT      = 5
+    _EXC_RETURN_FTYPE_MASK      = 0x00000010
+    _EXC_RETURN_FTYPE_SHIFT     = 4
+    _EXC_RETURN_MODE_MASK       = 0x00000008
+    _EXC_RETURN_MODE_SHIFT      = 3
+    _EXC_RETURN_SPSEL_MASK      = 0x00000004
+    _EXC_RETURN_SPSEL_SHIFT     = 2
+    _EXC_RETURN_ES_MASK         = 0x00000001
+    _EXC_RETURN_ES_SHIFT        = 0
+
+    _EXC_RETURN_PREFIX_DESC     = "Marks the value as an EXC_RETURN, always 0xFF"
+    _EXC_RETURN_S_DESC          = "The exception frame was stacked on a Secure stack"
+    _EXC_RETURN_DCRS_DESC       = "Default callee register stacking, the callee saved registers are not on the stack (cleared if the additional state context was stacked)"
+    _EXC_RETURN_FTYPE_DESC      = "A basic frame without floating-point state was stacked (cleared if the extended frame was stacked)"
+    _EXC_RETURN_MODE_DESC       = "Returns to Thread mode (cleared if it returns to Handler mode)"
+    _EXC_RETURN_SPSEL_DESC      = "The frame is on the process stack, PSP (cleared if it is on the main stack, MSP)"
+    _EXC_RETURN_ES_DESC         = "The exception was taken to the Secure state"
+
+    _exc_return_bitfields = {
+        "PREFIX": {
+            "mask":         _EXC_RETURN_PREFIX_MASK,
+            "shift":        _EXC_RETURN_PREFIX_SHIFT,
+            "description":  _EXC_RETURN_PREFIX_DESC
+        },
+        "S": {
+            "mask":         _EXC_RETURN_S_MASK,
+            "shift":        _EXC_RETURN_S_SHIFT,
+            "description":  _EXC_RETURN_S_DESC
+        },
+        "DCRS": {
+            "mask":         _EXC_RETURN_DCRS_MASK,
+            "shift":        _EXC_RETURN_DCRS_SHIFT,
+            "description":  _EXC_RETURN_DCRS_DESC
+        },
+        "FTYPE": {
+            "mask":         _EXC_RETURN_FTYPE_MASK,
+            "shift":        _EXC_RETURN_FTYPE_SHIFT,
+            "description":  _EXC_RETURN_FTYPE_DESC
+        },
+        "MODE": {
+            "mask":         _EXC_RETURN_MODE_MASK,
+            "shift":        _EXC_RETURN_MODE_SHIFT,
+            "description":  _EXC_RETURN_MODE_DESC
+        },
+        "SPSEL": {
+            "mask":         _EXC_RETURN_SPSEL_MASK,
+            "shift":        _EXC_RETURN_SPSEL_SHIFT,
+            "description":  _EXC_RETURN_SPSEL_DESC
+        },
+        "ES": {
+            "mask":         _EXC_RETURN_ES_MASK,
+            "shift":        _EXC_RETURN_ES_SHIFT,
+            "description":  _EXC_RETURN_ES_DESC
+        }
+    }
+
+    def __init__(self, value = None):
+        super().__init__(self._exc_return_bitfields)
+
+        if value is not None:
+            self.decode(value)
+
+class EXC_RETURN_V7M(EXC_RETURN):
+    """EXC_RETURN of ARMv7-M, which has no Security Extension"""
+
+    __slots__ = ()
+
+    _exc_return_bitfields = {name: EXC_RETURN._exc_return_bitfields[name] for name in ("PREFIX", "FTYPE", "MODE", "SPSEL")}
+
+class EXC_RETURN_V6M(EXC_RETURN):
+    """EXC_RETURN of ARMv6-M, which has no floating-point extension either"""
+
+    __slots__ = ()
+
+    _exc_return_bitfields = {name: EXC_RETURN._exc_return_bitfields[name] for name in ("PREFIX", "MODE", "SPSEL")}
+
+def is_exc_return(value) -> bool:
+    """checks if a value, e.g. LR in an exception handler, is an EXC_RETURN"""
+
+    return value >> 24 == 0xFF
+
+def _check(exc_return):
+
+    if not is_exc_return(exc_return):
+        raise ValueError(f"0x{exc_return:08X} is not an EXC_RETURN value")
+
+def frame_stack(exc_return) -> str:
+    """returns the stack the frame of an EXC_RETURN value is on, 'MSP' or 'PSP'"""
+
+    return "PSP" if exc_return & EXC_RETURN._EXC_RETURN_SPSEL_MASK else "MSP"
+
+def _frame_layout(exc_return) -> tuple:
+    """returns (additional state context stacked, extended frame stacked) of an EXC_RETURN value"""
+
+    additional  = bool(exc_return & EXC_RETURN._EXC_RETURN_S_MASK) and not exc_return & EXC_RETURN._EXC_RETURN_DCRS_MASK
+    extended    = not exc_return & EXC_RETURN._EXC_RETURN_FTYPE_MASK
+
+    return (additional, extended)
+
+# register names and struct format of each frame layout, by (additional state context, extended frame)
+_layouts = {
+    (False, False): (STACKED_REGISTERS, "8I"),
+    (False, True):  (STACKED_REGISTERS + FP_REGISTERS, "8I17I4x"),
+    (True, False):  (CALLEE_REGISTERS + STACKED_REGISTERS, "I4x8I8I"),
+    (True, True):   (CALLEE_REGISTERS + STACKED_REGISTERS + FP_REGISTERS, "I4x8I8I17I4x")
+}
+
+# structs compiled once for every layout and byte order
+_frame_structs = {(byteorder, layout): struct.Struct(byteorder + _layouts[layout][1]) for byteorder in "<>" for layout in _layouts.keys()}
+
+def frame_size(exc_return) -> int:
+    """returns the size in bytes of the frame stacked for an EXC_RETURN value"""
+
+    return _frame_structs[("<", _frame_layout(exc_return))].size
+
+class ExceptionFrame:
+    """registers stacked on exception entry, as selected by EXC_RETURN"""
+
+    __slots__ = ("exc_return", "sp", "names", "words", "_base")
+
+    def __init__(self, exc_return, sp, names: tuple, words: tuple):
+
+        self.exc_return = exc_return
+        self.sp         = sp
+        self.names      = names
+        self.words      = words
+
+        # index of r0, the basic frame follows the additional state context
+        self._base      = len(CALLEE_REGISTERS) if names[0] == CALLEE_REGISTERS[0] else 0
+
+    @property
+    def stack(self) -> str:
+        """'MSP' or 'PSP'"""
+
+        return frame_stack(self.exc_return)
+
+    @property
+    def extended(self) -> bool:
+        """True if the floating-point registers were stacked"""
+
+        return len(self.words) - self._base > len(STACKED_REGISTERS)
+
+    @property
+    def registers(self) -> dict:
+        """value of every stacked register by name"""
+
+        return dict(zip(self.names, self.words))
+
+    @property
+    def lr(self) -> int:
+        return self.words[self._base + 5]
+
+    @property
+    def pc(self) -> int:
+        return self.words[self._base + 6]
+
+    @property
+    def xpsr(self) -> int:
+        return self.words[self._base + 7]
+
+    @property
+    def exception_number(self) -> int:
+        """number of the exception the interrupted code was running in, 0 for Thread mode"""
+
+        return self.xpsr & 0x1FF
+
+    @property
+    def caller_sp(self) -> int:
+        """stack pointer before the frame was stacked, including the alignment padding word"""
+
+        return self.sp + frame_size(self.exc_return) + (4 if self.xpsr & XPSR_SPREALIGN else 0)
+
+    def to_dict(self) -> dict:
+        """returns the stack pointer and the stacked registers as a json compatible dict"""
+
+        frame = {"sp": self.sp}
+        frame.update(zip(self.names, self.words))
+
+        return frame
+
+def decode_frame(buffer, offset, exc_return, sp = None, byteorder = "<") -> ExceptionFrame:
+    """unpacks the frame selected by exc_return from buffer[offset:], without copying the buffer"""
+
+    _check(exc_return)
+
+    layout = _frame_layout(exc_return)
+
+    try:
+        words = _frame_structs[(byteorder, layout)].unpack_from(buffer, offset)
+    except struct.error:
+        raise ValueError(f"{frame_size(exc_return)} byte exception frame at offset {offset} is past the end of the buffer") from None
+
+    return ExceptionFrame(exc_return, offset if sp is None else sp, _layouts[layout][0], words)
+
+def read_frame(buffer, base, exc_return, msp = None, psp = None, byteorder = "<") -> ExceptionFrame:
+    """unpacks the frame on the stack exc_return selects from a memory image starting at address base"""
+
+    _check(exc_return)
+
+    stack   = frame_stack(exc_return)
+    sp      = psp if stack == "PSP" else msp
+
+    if sp is None:
+        raise ValueError(f"EXC_RETURN 0x{exc_return:08X} selects the {stack}, which is not known")
+
+    if sp < base:
+        raise ValueError(f"{stack} 0x{sp:08X} is below the memory image at 0x{base:08X}")
+
+    return decode_frame(buffer, sp - base, exc_return, sp, byteorder)
+
+def _outside_image(size, sp, base, buffer) -> ValueError:
+    """returns the error for a frame at sp that is not inside the memory image at base"""
+
+    return ValueError(f"{size} byte exception frame at SP 0x{sp:08X} is outside the memory image at 0x{base:08X}-0x{base + buffer.nbytes:08X}")
+
+def iter_frames(buffer, frames, base = 0, byteorder = "<"):
+    """yields an ExceptionFrame for every (exc_return, sp) pair, the stacks being in a memory image starting at address base"""
+
+    buffer = memoryview(buffer)
+
+    # local names keep the loop free of global and attribute lookups
+    structs = {layout: _frame_structs[(byteorder, layout)] for layout in _layouts.keys()}
+    names   = {layout: _layouts[layout][0] for layout in _layouts.keys()}
+    layouts = dict()
+
+    for (exc_return, sp) in frames:
+
+        try:
+            layout = layouts[exc_return]
+        except KeyError:
+            _check(exc_return)
+            layout = layouts[exc_return] = _frame_layout(exc_return)
+
+        # a negative offset would unpack from the end of the buffer, so it is checked before unpacking
+        offset = sp - base
+        if offset < 0:
+            raise _outside_image(structs[layout].size, sp, base, buffer)
+
+        try:
+            words = structs[layout].unpack_from(buffer, offset)
+        except struct.error:
+            raise _outside_image(structs[layout].size, sp, base, buffer) from None
+
+        yield ExceptionFrame(exc_return, sp, names[layout], words)
+
+def iter_frame_report(frame: ExceptionFrame, symbol_index = None, style = "plain", header_char = "=", separator_char = "-", line_width = 80):
+    """yields the lines of a stacked frame report, code addresses are resolved to symbols if symbol_index is given"""
+
+    from table_printer import Table_Printer
+
+    # create header
+    yield header_char * line_width
+
+    # print stack
+    yield f"Stacked frame: 0x{frame.sp:08X} ({frame.stack}, {'extended' if frame.extended else 'basic'} frame)"
+
+    # create separator
+    yield separator_char * line_width
+
+    # padding
+    yield ""
+
+    values = list()
+    for (name, value) in zip(frame.names, frame.words):
+        symbol = symbol_index.resolve(value) if symbol_index is not None and name in ("lr", "pc") else None
+        values.append(f"0x{value:08X} {symbol}" if symbol else f"0x{value:08X}")
+
+    yield from Table_Printer([name.upper() for name in frame.names], values, style).list()
+
+    # padding
+    yield ""
+
+    # exception
+    number = frame.exception_number
+    if number == 0:
+        yield "interrupted code was running in Thread mode"
+    else:
+        yield f"interrupted code was running in exception {number} ({EXCEPTION_NAMES.get(number, f'IRQ {number - 16}' if number >= 16 else 'reserved')})"
+
+    yield f"SP before the exception: 0x{frame.caller_sp:08X}"
+
+    # padding
+    yield ""
+
+    # header
+    yield header_char * line_width
+
+def get_frame_report(frame: ExceptionFrame, symbol_index = None, style = "plain", header_char = "=", separator_char = "-", line_width = 80) -> str:
+    """generates report of a stacked exception frame"""
+
+    return "\n".join(iter_frame_report(frame, symbol_index, style, header_char, separator_char, line_width))
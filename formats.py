@@ -0,0 +1,222 @@
+import csv
+import functools
+import json
+import struct
+
+import triage
+from system_control_registers import CFSR, HFSR, SHCSR, ADDRESS_VALID_BITS, get_profile, register_fields
+
+# raw value columns of a record, in output order
+RAW_COLUMNS = ("cfsr", "hfsr", "shcsr", "bfar", "mmfar")
+
+# decoded registers in column order, each with its bitfields in layout order
+FIELD_REGISTERS = ("UFSR", "BFSR", "MMFSR", "HFSR", "SHCSR")
+
+# raw value column each decoded register comes from
+_register_sources = {
+    "UFSR":     "cfsr",
+    "BFSR":     "cfsr",
+    "MMFSR":    "cfsr",
+    "HFSR":     "hfsr",
+    "SHCSR":    "shcsr"
+}
+
+# bitfield names of each decoded register, in FIELD_REGISTERS order
+REGISTER_FIELDS = register_fields()
+
+# one column per bitfield, named 'REGISTER.BITFIELD' like the vectorized decoder
+FIELD_COLUMNS = tuple(f"{name}.{bitfield}" for (name, fields) in zip(FIELD_REGISTERS, REGISTER_FIELDS) for bitfield in fields)
+
+# position of the first bit of each register in the packed bitfield flags
+_flag_offsets = tuple(sum(len(fields) for fields in REGISTER_FIELDS[:index]) for index in range(len(REGISTER_FIELDS)))
+
+# binary stream: header, column names joined with '\n', then fixed size records of
+# (present raw values, padding, cfsr, hfsr, shcsr, bfar, mmfar, bitfield flags)
+BINARY_MAGIC    = b"FREC"
+BINARY_VERSION  = 1
+
+_binary_header  = struct.Struct("<4sHHI")
+_binary_record  = struct.Struct("<H2x5IQ")
+
+# json fragments kept by the jsonl-fields writer, like the decoded values kept for wide register layouts
+FRAGMENT_CACHE_SIZE = 4096
+
+def check_core(core, record_id = None):
+    """raises ValueError unless core is the default profile, the one the bitfield columns of these formats are laid out for"""
+
+    profile = get_profile(core)
+    default = get_profile()
+
+    if profile is not default:
+        record = f"record {record_id}: " if record_id is not None else ""
+        raise ValueError(f"{record}{profile.name} ({profile.description}) is not supported by the per bitfield and columnar formats, which only have {default.name} columns")
+
+class FieldEncoder:
+    """decodes records into raw values and the shared decoded entry of every register, without rendering"""
+
+    def __init__(self):
+
+        self.cfsr   = CFSR(0)
+        self.hfsr   = HFSR()
+        self.shcsr  = SHCSR()
+
+    def encode(self, record: dict) -> tuple:
+        """returns (raw values, decoded entries) of a record, None where a register is missing"""
+
+        # records of other cores would be decoded with the wrong layouts
+        if record.get("core") is not None:
+            check_core(record["core"], record.get("id"))
+
+        (cfsr_value, hfsr_value, shcsr_value) = (record.get("cfsr"), record.get("hfsr"), record.get("shcsr"))
+        raw     = [cfsr_value, hfsr_value, shcsr_value, None, None]
+        decoded = [None] * len(FIELD_REGISTERS)
+
+        if cfsr_value is not None:
+            self.cfsr.decode(cfsr_value)
+            decoded[0] = self.cfsr.ufsr.decoded
+            decoded[1] = self.cfsr.bfsr.decoded
+            decoded[2] = self.cfsr.mmfsr.decoded
+
+            # fault addresses are only kept when their valid bit is set
+            for (index, reg) in ((3, "bfar"), (4, "mmfar")):
+                (_, sub_register, valid_bit) = ADDRESS_VALID_BITS[reg]
+                if getattr(self.cfsr, sub_register).values[valid_bit]:
+                    raw[index] = record.get(reg)
+
+        if hfsr_value is not None:
+            self.hfsr.decode(hfsr_value)
+            decoded[3] = self.hfsr.decoded
+
+        if shcsr_value is not None:
+            self.shcsr.decode(shcsr_value)
+            decoded[4] = self.shcsr.decoded
+
+        return (raw, decoded)
+
+def write_fields_jsonl(records, stream, header = True):
+    """writes records as json lines with one key per bitfield, leaving out missing registers"""
+
+    encoder = FieldEncoder()
+    rules   = triage.default_triage()
+
+    # the json of a register only depends on its bitfield values, and that of the diagnoses on the matching rules.
+    # both are keyed by value rather than by decoded entry, which wide layouts rebuild after evicting it
+    @functools.lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+    def register_fragment(index: int, row: tuple) -> str:
+        return "".join(f'"{FIELD_REGISTERS[index]}.{bitfield}":{value},' for (bitfield, value) in zip(REGISTER_FIELDS[index], row))
+
+    @functools.lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+    def diagnoses_fragment(matches: tuple) -> str:
+        return '"diagnoses":' + json.dumps([rule.name for rule in matches]) + ","
+
+    for record in records:
+        (raw, decoded) = encoder.encode(record)
+
+        line = "{"
+        if record.get("id") is not None:
+            line += '"id":' + json.dumps(record["id"]) + ","
+
+        line += "".join(f'"{reg}":"0x{value:08X}",' for (reg, value) in zip(RAW_COLUMNS, raw) if value is not None)
+
+        for (index, entry) in enumerate(decoded):
+            if entry is not None:
+                line += register_fragment(index, entry.row)
+
+        if raw[0] is not None or raw[1] is not None or raw[2] is not None:
+            line += diagnoses_fragment(rules.diagnose(decoded, raw[3], raw[4]))
+
+        stream.write(line.rstrip(",") + "}\n")
+
+def write_fields_csv(records, stream, header = True):
+    """writes records as csv with one column per bitfield, empty where a register is missing"""
+
+    encoder = FieldEncoder()
+    rules   = triage.default_triage()
+    writer  = csv.writer(stream, lineterminator="\n")
+    empty   = tuple(("",) * len(fields) for fields in REGISTER_FIELDS)
+
+    if header:
+        writer.writerow(("id",) + RAW_COLUMNS + FIELD_COLUMNS + ("diagnoses",))
+
+    for record in records:
+        (raw, decoded) = encoder.encode(record)
+
+        row = ["" if record.get("id") is None else record["id"]]
+        row.extend(f"0x{value:08X}" if value is not None else "" for value in raw)
+
+        for (index, entry) in enumerate(decoded):
+            row.extend(entry.row if entry is not None else empty[index])
+
+        # diagnosed like the jsonl-fields writer, only when there is a register to diagnose
+        if raw[0] is not None or raw[1] is not None or raw[2] is not None:
+            row.append("|".join(rule.name for rule in rules.diagnose(decoded, raw[3], raw[4])))
+        else:
+            row.append("")
+
+        writer.writerow(row)
+
+def write_binary(records, stream, header = True):
+    """writes records to a binary stream as fixed size structs, record ids are not kept"""
+
+    encoder = FieldEncoder()
+    pack    = _binary_record.pack
+
+    if header:
+        names = "\n".join(FIELD_COLUMNS).encode("ascii")
+        stream.write(_binary_header.pack(BINARY_MAGIC, BINARY_VERSION, _binary_record.size, len(names)))
+        stream.write(names)
+
+    for record in records:
+        (raw, decoded) = encoder.encode(record)
+
+        present = 0
+        for (index, value) in enumerate(raw):
+            if value is not None:
+                present |= 1 << index
+            else:
+                raw[index] = 0
+
+        flags = 0
+        for (index, entry) in enumerate(decoded):
+            if entry is not None:
+                flags |= entry.flags << _flag_offsets[index]
+
+        stream.write(pack(present, *raw, flags))
+
+def read_binary(stream):
+    """yields a dict of raw values and bitfields for every record of a binary stream"""
+
+    (magic, version, record_size, names_length) = _binary_header.unpack(stream.read(_binary_header.size))
+
+    if magic != BINARY_MAGIC:
+        raise ValueError("not a binary fault record stream")
+
+    if version != BINARY_VERSION:
+        raise ValueError(f"binary fault record version {version} is not supported")
+
+    columns = stream.read(names_length).decode("ascii").split("\n")
+
+    while True:
+        data = stream.read(record_size)
+        if len(data) < record_size:
+            return
+
+        (present, *raw, flags) = _binary_record.unpack_from(data)
+
+        result = {reg: value for (index, (reg, value)) in enumerate(zip(RAW_COLUMNS, raw)) if present & (1 << index)}
+
+        # bitfields of missing registers are left out
+        for (index, column) in enumerate(columns):
+            if _register_sources[column.split(".", 1)[0]] in result:
+                result[column] = (flags >> index) & 1
+
+        yield result
+
+writers = {
+    "jsonl-fields": write_fields_jsonl,
+    "csv-fields":   write_fields_csv,
+    "binary":       write_binary
+}
+
+# formats written to binary streams
+binary_formats = ("binary",)
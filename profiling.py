@@ -0,0 +1,328 @@
+import importlib
+import json
+import os
+import time
+from collections import defaultdict
+
+import report_cache
+
+# stage charged with the time spent outside every timed function, e.g. formatting output records
+BASE_STAGE = "other"
+
+# (stage, module, attribute) of the functions timed while stats are enabled
+TIMED_FUNCTIONS = (
+    ("decode",  "register",                 "Register.decode"),
+    ("decode",  "batch",                    "BatchDecoder.decode"),
+    ("decode",  "formats",                  "FieldEncoder.encode"),
+    ("diagram", "register",                 "Register.get_diagram"),
+    ("table",   "register",                 "Decoded.table"),
+    ("report",  "system_control_registers", "get_register_report"),
+    ("report",  "system_control_registers", "get_report"),
+    ("report",  "system_control_registers", "get_address_report"),
+    ("triage",  "triage",                   "Triage.diagnose"),
+    ("triage",  "triage",                   "Triage.diagnose_registers"),
+    ("triage",  "triage",                   "Triage.report"),
+    ("symbols", "symbols",                  "SymbolIndex.resolve"),
+    ("symbols", "symbols",                  "MappedSymbolIndex.resolve")
+)
+
+# trace events kept in memory, later calls are only counted
+TRACE_EVENT_LIMIT = 1 << 20
+
+def _decode_misses() -> int:
+    """returns the number of values decoded on a miss by the lru caches of every register layout"""
+
+    from register import Register
+
+    return sum(layout.cache_info()[1] for layout in list(Register._layouts.values()))
+
+def _wrap_cache_info() -> tuple:
+    """returns (hits, misses) of the description wrapping cache of the table printer"""
+
+    from table_printer import _wrap
+
+    info = _wrap.cache_info()
+
+    return (info.hits, info.misses)
+
+class Stats:
+    """call counts and exclusive time of every stage of a run, plus record, byte and cache counters
+
+    time is charged to the innermost timed function running, so the stages add up to the wall time. the timers
+    keep a single current stage, so stats of runs decoding from several threads at once are not meaningful
+    """
+
+    def __init__(self, trace = False):
+
+        # time and calls by stage, calls also by timed function
+        self.ns         = defaultdict(int)
+        self.calls      = defaultdict(int)
+        self.functions  = defaultdict(int)
+        self.counters   = defaultdict(int)
+
+        # chrome trace events as (name, stage, start ns, duration ns), if recorded
+        self.events     = list() if trace else None
+        self.dropped    = 0
+
+        self.stage      = BASE_STAGE
+        self.start      = time.perf_counter_ns()
+        self.end        = None
+        self._mark      = self.start
+
+        # cache counters are cumulative, only the difference from the start is reported
+        self._report_cache  = report_cache.stats()
+        self._decoded       = _decode_misses()
+        self._wrap          = _wrap_cache_info()
+        self._caches        = None
+
+    def enter(self, stage) -> tuple:
+        """charges the time since the last switch to the current stage and makes stage current, returns (previous stage, now)"""
+
+        now = time.perf_counter_ns()
+
+        self.ns[self.stage] += now - self._mark
+        self._mark = now
+
+        previous = self.stage
+        self.stage = stage
+
+        return (previous, now)
+
+    def timed(self, stage, name, function):
+        """returns function wrapped to charge its time to stage and count its calls under name"""
+
+        def timed_function(*args, **kwargs):
+            (previous, start) = self.enter(stage)
+            self.calls[stage] += 1
+            self.functions[name] += 1
+            try:
+                return function(*args, **kwargs)
+            finally:
+                (_, end) = self.enter(previous)
+                self._event(name, stage, start, end)
+
+        timed_function.__wrapped__ = function
+        timed_function.__name__ = function.__name__
+        timed_function.__doc__ = function.__doc__
+
+        return timed_function
+
+    def _event(self, name, stage, start, end):
+
+        if self.events is None:
+            return
+
+        if len(self.events) < TRACE_EVENT_LIMIT:
+            self.events.append((name, stage, start, end - start))
+        else:
+            self.dropped += 1
+
+    def iterate(self, stage, iterable, counter = None):
+        """yields the items of iterable, charging the time taken to produce them to stage and counting them in counter"""
+
+        iterator = iter(iterable)
+
+        while True:
+            (previous, start) = self.enter(stage)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.enter(previous)
+                return
+            (_, end) = self.enter(previous)
+
+            self.calls[stage] += 1
+            self._event(stage, stage, start, end)
+            if counter is not None:
+                self.counters[counter] += 1
+
+            yield item
+
+    def count_input(self, lines):
+        """yields the lines of an input stream, counting them and their size"""
+
+        counters = self.counters
+
+        for line in lines:
+            counters["input_lines"] += 1
+            counters["input_bytes"] += len(line)
+            yield line
+
+    def stop(self):
+        """ends the run, charging the remaining time and taking the cache counters"""
+
+        self.enter(BASE_STAGE)
+        self.end = self._mark
+
+        report_stats = report_cache.stats()
+        (wrap_hits, wrap_misses) = _wrap_cache_info()
+
+        # register.decode calls that did not decode on a miss were served from a lookup table or cache
+        decodes = self.functions["Register.decode"]
+        decoded = _decode_misses() - self._decoded
+
+        self._caches = {
+            "report":       (report_stats["hits"] - self._report_cache["hits"], report_stats["misses"] - self._report_cache["misses"]),
+            "decode":       (max(decodes - decoded, 0), decoded),
+            "wrap":         (wrap_hits - self._wrap[0], wrap_misses - self._wrap[1])
+        }
+
+    @property
+    def elapsed_ns(self) -> int:
+        return (self.end or time.perf_counter_ns()) - self.start
+
+    def caches(self) -> dict:
+        """(hits, misses) of the report cache, the decode lookup tables and the description wrapping cache"""
+
+        if self._caches is None:
+            self.stop()
+
+        return self._caches
+
+    def to_dict(self) -> dict:
+        """returns the stats as a json compatible dict"""
+
+        return {
+            "elapsed_ns":   self.elapsed_ns,
+            "stages":       {stage: {"ns": ns, "calls": self.calls.get(stage, 0)} for (stage, ns) in sorted(self.ns.items(), key=lambda item: -item[1])},
+            "functions":    dict(self.functions),
+            "counters":     dict(self.counters),
+            "caches":       {name: {"hits": hits, "misses": misses} for (name, (hits, misses)) in self.caches().items()}
+        }
+
+    def summary(self) -> list:
+        """returns the lines of a human readable summary"""
+
+        stats   = self.to_dict()
+        elapsed = stats["elapsed_ns"]
+        records = self.counters.get("records", 0)
+
+        lines = [f"elapsed: {elapsed / 1e9:.3f} s" + (f", {records} records, {records * 1e9 / elapsed:.0f} records/s" if records and elapsed else "")]
+
+        for name in ("input_bytes", "output_bytes", "skipped"):
+            if name in self.counters:
+                lines.append(f"{name.replace('_', ' ')}: {self.counters[name]}")
+
+        width = max([len(stage) for stage in stats["stages"].keys()] + [5])
+
+        lines.append(f"{'stage':<{width}}  {'time (ms)':>10}  {'share':>6}  {'calls':>10}  {'ns/record':>10}")
+        for (stage, entry) in stats["stages"].items():
+            share       = entry["ns"] / elapsed if elapsed else 0
+            per_record  = f"{entry['ns'] / records:.0f}" if records else "-"
+            lines.append(f"{stage:<{width}}  {entry['ns'] / 1e6:>10.1f}  {share:>6.1%}  {entry['calls'] or '-':>10}  {per_record:>10}")
+
+        for (name, (hits, misses)) in self.caches().items():
+            if hits + misses:
+                lines.append(f"{name} cache: {hits} hits, {misses} misses, {hits / (hits + misses):.1%} hit rate")
+
+        if self.dropped:
+            lines.append(f"trace: {self.dropped} events after the first {TRACE_EVENT_LIMIT} were not recorded")
+
+        return lines
+
+    def write_trace(self, path):
+        """writes the recorded calls as a chrome trace json file, for chrome://tracing or perfetto"""
+
+        pid = os.getpid()
+
+        events = [{"name": name, "cat": stage, "ph": "X", "ts": (start - self.start) / 1000, "dur": duration / 1000, "pid": pid, "tid": 0} for (name, stage, start, duration) in self.events or ()]
+
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": self.to_dict()}, f)
+
+class TimedStream:
+    """file-like wrapper of an output stream that counts the bytes written and charges the writes to the 'write' stage"""
+
+    def __init__(self, stream, stats: Stats):
+
+        self._stream    = stream
+        self._stats     = stats
+
+    def write(self, data):
+
+        (previous, _) = self._stats.enter("write")
+        try:
+            self._stats.calls["write"] += 1
+            self._stats.counters["output_bytes"] += len(data)
+            return self._stream.write(data)
+        finally:
+            self._stats.enter(previous)
+
+    def writelines(self, lines):
+
+        for line in lines:
+            self.write(line)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+# stats of the running profile, None while profiling is disabled
+active = None
+
+# original functions replaced by timed ones, restored by disable
+_originals = list()
+
+def _resolve(module, attribute) -> tuple:
+    """returns (object holding the function, function name) of a 'Class.function' or 'function' attribute"""
+
+    owner = importlib.import_module(module)
+    (path, _, name) = attribute.rpartition(".")
+
+    for part in filter(None, path.split(".")):
+        owner = getattr(owner, part)
+
+    return (owner, name)
+
+def enable(trace = False) -> Stats:
+    """starts collecting stats, timing the stages of TIMED_FUNCTIONS until disable is called
+
+    the functions are only replaced while profiling, so there is no cost when it is disabled
+    """
+
+    global active
+
+    if active is not None:
+        raise RuntimeError("profiling is already enabled")
+
+    stats = Stats(trace)
+
+    for (stage, module, attribute) in TIMED_FUNCTIONS:
+        (owner, name) = _resolve(module, attribute)
+
+        # subclasses sharing a function, e.g. resolve, are timed under the name of the class defining it
+        function = owner.__dict__[name]
+        _originals.append((owner, name, function))
+        setattr(owner, name, stats.timed(stage, attribute, function))
+
+    active = stats
+
+    return stats
+
+def disable() -> Stats:
+    """stops collecting stats, restores the original functions and returns the stats"""
+
+    global active
+
+    stats = active
+    active = None
+
+    while _originals:
+        (owner, name, function) = _originals.pop()
+        setattr(owner, name, function)
+
+    if stats is not None:
+        stats.stop()
+
+    return stats
+
+class profile:
+    """context manager collecting stats for a block, the stats are available as its value"""
+
+    def __init__(self, trace = False):
+        self.trace = trace
+
+    def __enter__(self) -> Stats:
+        return enable(self.trace)
+
+    def __exit__(self, *exc_info):
+        disable()
@@ -1,44 +1,208 @@
-from table_printer import Table_Printer as tp
+import functools
+import threading
+from types import MappingProxyType
+
+def decode_bitfields(bitfields: dict, reg_val: int) -> dict:
+    """walks a bitfield dict and returns the value of every bitfield"""
+
+    return {bitfield: (reg_val & bitfields[bitfield]["mask"]) >> bitfields[bitfield]["shift"] for bitfield in bitfields.keys()}
+
+def freeze_bitfields(bitfields: dict) -> MappingProxyType:
+    """returns a read-only copy of a bitfield dict"""
+
+    return MappingProxyType({bitfield: MappingProxyType(dict(bitfields[bitfield])) for bitfield in bitfields.keys()})
+
+class Decoded:
+    """precomputed decode of one register value, shared by all instances of a register class"""
+
+    __slots__ = ("values", "row", "flags", "set_bits", "descriptions", "_tables")
+
+    def __init__(self, bitfields: dict, reg_val: int):
+
+        self.values         = MappingProxyType(decode_bitfields(bitfields, reg_val))
+        self.row            = tuple(self.values.values())
+        self.set_bits       = tuple(bitfield for bitfield in bitfields.keys() if self.values[bitfield])
+        self.descriptions   = tuple(bitfields[bitfield]["description"] for bitfield in self.set_bits)
+        self._tables        = dict()
+
+        # one bit per bitfield in layout order, set if the bitfield is non-zero
+        self.flags = 0
+        for (index, value) in enumerate(self.row):
+            if value:
+                self.flags |= 1 << index
+
+    def table(self, style = "plain") -> list:
+        """rendered table rows of set bitfields, generated on first use of each style"""
+
+        try:
+            return self._tables[style]
+        except KeyError:
+            pass
+
+        # check for empty list
+        if len(self.set_bits) == 0:
+            table = []
+        else:
+            # imported on first use, decodes that never render a table do not need it
+            from table_printer import Table_Printer as tp
+            table = tp(self.set_bits, self.descriptions, style).list()
+
+        self._tables[style] = table
+
+        return table
+
+class Layout:
+    """immutable bitfield layout of a register class and its table of decoded values
+
+    layouts with at most precompute_bits bitfield bits have every value decoded up front. wider layouts could
+    reach 2^32 values, so they decode on a miss and keep the last cache_size values in a bounded lru cache
+    """
+
+    __slots__ = ("bitfields", "field_mask", "lookup", "cache", "_get")
+
+    def __init__(self, bitfields: dict, precompute_bits: int, cache_size = 4096):
+
+        self.bitfields  = freeze_bitfields(bitfields)
+        self.field_mask = 0
+        self.lookup     = dict()
+        self.cache      = None
+
+        for bitfield in self.bitfields.keys():
+            self.field_mask |= self.bitfields[bitfield]["mask"]
+
+        # decode every combination of bitfield bits if the table is small
+        if bin(self.field_mask).count("1") <= precompute_bits:
+            sub_mask = self.field_mask
+            while True:
+                self.lookup[sub_mask] = Decoded(self.bitfields, sub_mask)
+                if sub_mask == 0:
+                    break
+                sub_mask = (sub_mask - 1) & self.field_mask
+            self._get = self.lookup.__getitem__
+        else:
+            # lru_cache is thread-safe, concurrent misses build equal entries so whichever is stored last is fine
+            self.cache  = functools.lru_cache(maxsize=cache_size)(functools.partial(Decoded, self.bitfields))
+            self._get   = self.cache
+
+    def get_decoded(self, reg_val: int) -> Decoded:
+        """returns the table entry for a register value, decoding it on a miss"""
+
+        return self._get(reg_val & self.field_mask)
+
+    def cache_info(self) -> tuple:
+        """returns (hits, misses) of the lru cache of a wide layout, (0, 0) for a precomputed one"""
+
+        if self.cache is None:
+            return (0, 0)
+
+        info = self.cache.cache_info()
+
+        return (info.hits, info.misses)
 
 class Register:
 
+    # instances only hold the raw value and a reference to the shared decoded entry
+    __slots__ = ("_layout", "_raw", "_decoded")
+
     header_char     = '='
     separator_char  = '-'
 
+    # registers with at most this many bitfield bits have every value decoded up front
+    precompute_bits = 8
+
+    # decoded values kept for registers with more bitfield bits
+    cache_size      = 4096
+
+    # layouts, one per register class
+    _layouts        = dict()
+    _layouts_lock   = threading.Lock()
+
+    # width of the register in bits, the bits drawn in a diagram generated from the bitfield masks
+    width = 32
+
+    # hand-drawn diagram with a '{BITFIELD}' slot for each value, drawn from the bitfield masks if None
+    diagram_template = None
+
+    # diagram skeletons, one per register class
+    _diagrams       = dict()
+
     def __init__(self, bitfield_dict: dict):
 
-        self.bitfields  = bitfield_dict
+        self._layout    = self._get_layout(bitfield_dict)
         self._raw       = None
-        
+        self._decoded   = self._layout.get_decoded(0)
+
+    @classmethod
+    def _get_layout(cls, bitfield_dict: dict) -> Layout:
+        """returns the layout for this register class, building it on first use"""
+
+        try:
+            return Register._layouts[cls]
+        except KeyError:
+            with Register._layouts_lock:
+                if cls not in Register._layouts:
+                    Register._layouts[cls] = Layout(bitfield_dict, cls.precompute_bits, cls.cache_size)
+                return Register._layouts[cls]
+
+    @property
+    def bitfields(self) -> MappingProxyType:
+        """read-only bitfield layout shared by all instances of this register class"""
+
+        return self._layout.bitfields
+
     def decode(self, reg_val: int):
         """parses register value into bitfields"""
-        
+
         # store register value
         self._raw = reg_val
-        
-        # parse value into bitfields
-        for bitfield in self.bitfields.keys():
-            self.bitfields[bitfield]["value"] = (reg_val & self.bitfields[bitfield]["mask"]) >> self.bitfields[bitfield]["shift"]
 
-    def get_table(self, line_width = 80) -> list:
+        # look up the decoded bitfields
+        self._decoded = self._layout.get_decoded(reg_val)
+
+    @property
+    def values(self) -> MappingProxyType:
+        """value of every bitfield from the last decode"""
+
+        return self._decoded.values
+
+    @property
+    def decoded(self) -> Decoded:
+        """shared decoded entry of the last decode"""
+
+        return self._decoded
+
+    def get_set_bits(self) -> list:
+        """returns names of bitfields that are set"""
+
+        return list(self._decoded.set_bits)
+
+    def get_table(self, line_width = 80, style = "plain") -> list:
         """generates ascii table of bitfield descriptions"""
 
-        # make list of bitfields that are set and their descriptions
-        set_bits = [(bitfield, self.bitfields[bitfield]["description"]) for bitfield in self.bitfields.keys() if self.bitfields[bitfield]["value"]]
+        return self._decoded.table(style)
 
-        # check for empty list
-        if len(set_bits) == 0:
-            return []
+    @classmethod
+    def _get_diagram(cls) -> "diagram.Diagram":
+        """returns the diagram skeleton for this register class, drawn from its template or its bitfields on first use"""
 
-        (registers, descriptions) = zip(*set_bits)
+        try:
+            return Register._diagrams[cls]
+        except KeyError:
+            pass
 
-        table = tp(registers, descriptions)
+        # imported on first use, decodes that never render a diagram do not need it
+        import diagram
 
-        return table.list()
+        with Register._layouts_lock:
+            if cls not in Register._diagrams:
+                if cls.diagram_template is not None:
+                    Register._diagrams[cls] = diagram.parse_template(cls.diagram_template)
+                else:
+                    layout = Register._layouts[cls]
+                    Register._diagrams[cls] = diagram.generate(layout.bitfields, max(cls.width, layout.field_mask.bit_length()))
+            return Register._diagrams[cls]
 
     def get_diagram(self) -> list:
         """generates ascii diagram representation of register as list of strings"""
 
-        raise NotImplemented
-
-    
+        return self._get_diagram().render(self._decoded.values)
@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+
+class ReportCache:
+    """bounded least-recently-used cache of rendered register reports"""
+
+    def __init__(self, maxsize = 4096):
+
+        self.maxsize    = maxsize
+        self._entries   = OrderedDict()
+        self._lock      = threading.Lock()
+
+        self.hits       = 0
+        self.misses     = 0
+        self.evictions  = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key, render):
+        """returns the cached report for key, calling render() to create it on a miss"""
+
+        if not self.enabled:
+            return render()
+
+        with self._lock:
+            try:
+                report = self._entries[key]
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return report
+            except KeyError:
+                self.misses += 1
+
+        # render outside the lock so other threads are not held up
+        report = render()
+
+        with self._lock:
+            self._entries[key] = report
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return report
+
+    def resize(self, maxsize: int):
+        """changes the cache size, evicting the oldest reports if needed. 0 disables the cache"""
+
+        with self._lock:
+            self.maxsize = maxsize
+
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """drops all cached reports and resets the counters"""
+
+        with self._lock:
+            self._entries.clear()
+            self.hits       = 0
+            self.misses     = 0
+            self.evictions  = 0
+
+    def stats(self) -> dict:
+        """returns hit/miss/eviction counters and current size"""
+
+        with self._lock:
+            return {
+                "hits":         self.hits,
+                "misses":       self.misses,
+                "evictions":    self.evictions,
+                "size":         len(self._entries),
+                "maxsize":      self.maxsize
+            }
+
+# process wide cache used by cached_report
+default_cache = ReportCache()
+
+def configure(maxsize: int):
+    """sets the size of the process wide report cache, 0 disables it"""
+
+    default_cache.resize(maxsize)
+
+def stats() -> dict:
+    """returns the counters of the process wide report cache"""
+
+    return default_cache.stats()
+
+def clear():
+    """empties the process wide report cache"""
+
+    default_cache.clear()
@@ -0,0 +1,58 @@
+import struct
+
+# start of the system control block
+SCB_BASE = 0xE000ED00
+
+# addresses of the fault registers in the system control block
+SCB_REGISTERS = {
+    "shcsr":    0xE000ED24,
+    "cfsr":     0xE000ED28,
+    "hfsr":     0xE000ED2C,
+    "dfsr":     0xE000ED30,
+    "mmfar":    0xE000ED34,
+    "bfar":     0xE000ED38
+}
+
+# the fault registers are six consecutive words, unpacked with a single struct
+_FAULT_WORDS_ADDRESS    = SCB_REGISTERS["shcsr"]
+_FAULT_WORDS_END        = SCB_REGISTERS["bfar"] + 4
+
+_fault_words = {
+    "<": struct.Struct("<6I"),
+    ">": struct.Struct(">6I")
+}
+
+def check_base(base = SCB_BASE):
+    """raises ValueError if a memory image starting at base can not hold the fault registers"""
+
+    if not 0 <= base <= _FAULT_WORDS_ADDRESS:
+        raise ValueError(f"an SCB image at 0x{base:08X} starts after SHCSR at 0x{_FAULT_WORDS_ADDRESS:08X}")
+
+def read_fault_registers(buffer, offset = 0, base = SCB_BASE, byteorder = "<") -> dict:
+    """reads the fault registers from a memory image of the SCB at buffer[offset:], without copying the image
+
+    raises ValueError if the buffer does not hold them, rather than letting a negative offset read from its end
+    """
+
+    start = offset + _FAULT_WORDS_ADDRESS - base
+
+    if base > _FAULT_WORDS_ADDRESS or start < 0 or start + _fault_words[byteorder].size > len(buffer):
+        raise ValueError(f"the fault registers at 0x{_FAULT_WORDS_ADDRESS:08X}-0x{_FAULT_WORDS_END:08X} are outside the {len(buffer)} byte buffer read at offset {offset} as an image at 0x{base:08X}")
+
+    (shcsr, cfsr, hfsr, dfsr, mmfar, bfar) = _fault_words[byteorder].unpack_from(buffer, start)
+
+    return {
+        "cfsr":     cfsr,
+        "hfsr":     hfsr,
+        "shcsr":    shcsr,
+        "dfsr":     dfsr,
+        "mmfar":    mmfar,
+        "bfar":     bfar
+    }
+
+def image_size(base = SCB_BASE) -> int:
+    """smallest memory image starting at base that holds all the fault registers"""
+
+    check_base(base)
+
+    return _FAULT_WORDS_END - base
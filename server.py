@@ -0,0 +1,244 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit, parse_qsl
+
+import batch
+import report_cache
+import symbols
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# largest request body read, larger ones are refused before any of it is read
+MAX_BODY_SIZE = 16 << 20
+
+_reasons = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error"
+}
+
+def parse_records(payload, core = None) -> tuple:
+    """converts a json object or array of objects to (records, True if a single record was sent), with the core profile of records that do not name one"""
+
+    if isinstance(payload, dict):
+        return ([batch.parse_record(payload, core)], True)
+
+    if isinstance(payload, list) and all(isinstance(row, dict) for row in payload):
+        return ([batch.parse_record(row, core) for row in payload], False)
+
+    raise ValueError("expected a json object or an array of objects")
+
+class DecodeService:
+    """answers decode and report requests with one warm decoder and the process wide report cache"""
+
+    def __init__(self, symbol_index = None):
+
+        self.decoder    = batch.BatchDecoder(symbol_index)
+        self.requests   = 0
+        self.records    = 0
+
+    def decode(self, records: list, single: bool) -> bytes:
+        """returns the json encoded decoded results of records"""
+
+        results = [batch.format_result(self.decoder.decode(record)) for record in records]
+
+        return json.dumps(results[0] if single else results, separators=(",", ":")).encode()
+
+    def report(self, records: list) -> bytes:
+        """returns the ascii reports of records, separated by blank lines like the command line"""
+
+        return "".join(self.decoder.report(record) + "\n" for record in records).encode()
+
+    def stats(self) -> bytes:
+        """returns request counters and report cache counters as json"""
+
+        return json.dumps({"requests": self.requests, "records": self.records, "cache": report_cache.stats()}).encode()
+
+    def respond(self, method: str, target: str, body: bytes) -> tuple:
+        """handles one request, returns (status, content type, content)"""
+
+        self.requests += 1
+
+        url = urlsplit(target)
+
+        if url.path not in ("/decode", "/report", "/stats"):
+            return (404, "text/plain", f"unknown path {url.path}\n".encode())
+
+        if url.path == "/stats":
+            return (200, "application/json", self.stats())
+
+        try:
+            if method == "POST":
+                (records, single) = parse_records(json.loads(body), self.decoder.profile)
+            elif method == "GET":
+                (records, single) = parse_records(dict(parse_qsl(url.query)), self.decoder.profile)
+            else:
+                return (405, "text/plain", f"{method} is not supported\n".encode())
+
+            self.records += len(records)
+
+            if url.path == "/report":
+                return (200, "text/plain", self.report(records))
+
+            return (200, "application/json", self.decode(records, single))
+
+        # parse_record rejects values of the wrong type or range and registers the core does not have with ValueError,
+        # TypeError is kept as a safety net
+        except (ValueError, TypeError) as e:
+            return (400, "text/plain", f"{e}\n".encode())
+
+        # every request gets a response, a bug in one decode must not drop the connection
+        except Exception as e:
+            return (500, "text/plain", f"{type(e).__name__}: {e}\n".encode())
+
+    async def handle_connection(self, reader, writer):
+        """serves http/1.1 requests of one connection in order, so clients can pipeline them"""
+
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                    if not request_line:
+                        break
+
+                    (method, target, version) = request_line.decode("latin-1").split()
+
+                    headers = dict()
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        (name, _, value) = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(length)
+
+                # a malformed request line or content length, or a line longer than the stream limit
+                except ValueError:
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+
+                if length > MAX_BODY_SIZE:
+                    writer.write(b"HTTP/1.1 413 Content Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+
+                body = await reader.readexactly(length) if length else b""
+
+                (status, content_type, content) = self.respond(method, target, body)
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                writer.write(
+                    f"HTTP/1.1 {status} {_reasons[status]}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + content)
+
+                # only waits when the client is not reading its responses
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            writer.close()
+
+async def serve(service: DecodeService, host = DEFAULT_HOST, port = DEFAULT_PORT, unix_path = None):
+    """serves requests on a unix socket if unix_path is given, else on host:port, until cancelled"""
+
+    if unix_path is not None:
+        server = await asyncio.start_unix_server(service.handle_connection, unix_path)
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+
+    async with server:
+        await server.serve_forever()
+
+async def _open_connection(host, port, unix_path):
+
+    if unix_path is not None:
+        return await asyncio.open_unix_connection(unix_path)
+
+    return await asyncio.open_connection(host, port)
+
+async def _read_response(reader) -> bytes:
+    """reads one http response, returns its content"""
+
+    await reader.readline()
+
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        (name, _, value) = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+
+    return await reader.readexactly(length)
+
+async def load_test(bodies: list, connections = 4, pipeline = 16, path = "/decode", host = DEFAULT_HOST, port = DEFAULT_PORT, unix_path = None) -> dict:
+    """sends every json body to a running server over several connections, pipeline requests at a time, and measures latency"""
+
+    requests = [f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body for body in bodies]
+    latencies = list()
+
+    async def client(share: list):
+        (reader, writer) = await _open_connection(host, port, unix_path)
+
+        for start in range(0, len(share), pipeline):
+            window = share[start:start + pipeline]
+
+            sent = time.perf_counter()
+            writer.write(b"".join(window))
+
+            for _ in window:
+                await _read_response(reader)
+                latencies.append(time.perf_counter() - sent)
+
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(requests[index::connections]) for index in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    return {
+        "requests":             len(requests),
+        "requests per second":  len(requests) / elapsed,
+        "p50 latency (ms)":     latencies[len(latencies) // 2] * 1e3,
+        "p99 latency (ms)":     latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1e3
+    }
+
+def add_arguments(parser):
+    """adds serve subcommand arguments to an argparse parser"""
+
+    parser.add_argument('--host', dest="host", default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument('--port', dest="port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument('--unix', dest="unix_path", default=None, help="listen on this unix socket instead of a tcp port")
+    parser.add_argument('--cache-size', dest="cache_size", type=int, default=None, help=f"rendered reports kept in the report cache, 0 disables it (default: {report_cache.default_cache.maxsize})")
+    symbols.add_symbol_arguments(parser)
+
+def main(args):
+    """runs the serve subcommand from parsed arguments"""
+
+    if args.cache_size is not None:
+        report_cache.configure(args.cache_size)
+
+    symbols_path = symbols.symbols_path(args)
+    symbol_index = symbols.load(symbols_path) if symbols_path else None
+
+    try:
+        asyncio.run(serve(DecodeService(symbol_index), args.host, args.port, args.unix_path))
+    except KeyboardInterrupt:
+        pass
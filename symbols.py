@@ -0,0 +1,338 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from bisect import bisect_right
+
+import elf_core
+
+SHT_SYMTAB  = 2
+SHT_NOTE    = 7
+
+NT_GNU_BUILD_ID = 3
+
+STT_OBJECT  = 1
+STT_FUNC    = 2
+
+# ELF32 section header and symbol
+_shdr_format = "IIIIIIIIII"
+_sym_format  = "IIIBBH"
+
+# binary index: header, then (start, size, name offset, parent) records sorted by start, then NUL terminated names.
+# the parent is the index of the closest earlier record still open at the start of a record, -1 for none. the size
+# is stored rather than the end, which does not fit 32 bits for a range reaching the top of the address space
+INDEX_MAGIC     = b"FIDX"
+INDEX_VERSION   = 3
+
+# ranges past this address can not be written to a binary index
+_ADDRESS_SPACE_END = 1 << 32
+
+_index_header   = struct.Struct("<4sHHII32s")
+_index_record   = struct.Struct("<IIIi")
+
+def _read_sections(f, path) -> tuple:
+    """reads the section headers of an ELF32 file, returns (byteorder, sections)"""
+
+    (byteorder, ehdr) = elf_core.read_elf_header(f, path)
+    (shoff, shentsize, shnum) = (ehdr[5], ehdr[10], ehdr[11])
+
+    shdr_struct = struct.Struct(byteorder + _shdr_format)
+
+    f.seek(shoff)
+    shdrs = f.read(shentsize * shnum)
+
+    return (byteorder, [shdr_struct.unpack_from(shdrs, index * shentsize) for index in range(shnum)])
+
+def read_build_id(path) -> bytes:
+    """returns the GNU build ID of an ELF32 firmware image, or a SHA-1 of the file if it has none"""
+
+    with open(path, 'rb') as f:
+        (byteorder, sections) = _read_sections(f, path)
+
+        for section in sections:
+            if section[1] != SHT_NOTE:
+                continue
+
+            f.seek(section[4])
+            for (name, note_type, desc) in elf_core.parse_notes(f.read(section[5]), byteorder):
+                if name == "GNU" and note_type == NT_GNU_BUILD_ID:
+                    return desc
+
+        f.seek(0)
+        return hashlib.sha1(f.read()).digest()
+
+def read_elf_symbols(path) -> list:
+    """reads (start, size, name) of every sized function and object symbol in an ELF32 firmware image"""
+
+    entries = list()
+
+    with open(path, 'rb') as f:
+        (byteorder, sections) = _read_sections(f, path)
+
+        sym_struct = struct.Struct(byteorder + _sym_format)
+
+        for (sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size, sh_link, sh_info, sh_addralign, sh_entsize) in sections:
+
+            if sh_type != SHT_SYMTAB:
+                continue
+
+            # symbol names live in the linked string table
+            strtab = sections[sh_link]
+            f.seek(strtab[4])
+            strings = f.read(strtab[5])
+
+            f.seek(sh_offset)
+            symbols = f.read(sh_size)
+
+            for offset in range(0, sh_size - sym_struct.size + 1, sh_entsize or sym_struct.size):
+                (st_name, st_value, st_size, st_info, st_other, st_shndx) = sym_struct.unpack_from(symbols, offset)
+                st_type = st_info & 0xF
+
+                if st_size == 0 or st_type not in (STT_OBJECT, STT_FUNC):
+                    continue
+
+                # clear the thumb bit of function addresses
+                if st_type == STT_FUNC:
+                    st_value &= ~1
+
+                name = strings[st_name:strings.index(b"\0", st_name)].decode("utf-8", "replace")
+                entries.append((st_value, st_size, name))
+
+    return entries
+
+def read_map(path) -> list:
+    """reads (start, size, name) entries from a memory map file of 'start size name' lines"""
+
+    entries = list()
+
+    with open(path) as f:
+        for line in f:
+
+            # skip comments and blank lines
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+
+            (start, size, name) = line.split(None, 2)
+            entries.append((int(start, 0), int(size, 0), name))
+
+    return entries
+
+class SymbolIndex:
+    """sorted interval index of address ranges for O(log n) address to symbol lookups"""
+
+    def __init__(self, entries):
+
+        # sort by start, and ranges starting at the same address from the largest, so enclosing ranges come first
+        entries = sorted(entries, key=lambda entry: (entry[0], -entry[1]))
+
+        self.starts     = list()
+        self.ends       = list()
+        self.names      = list()
+
+        # index of the closest earlier range still open at the start of each range, -1 for none
+        self.parents    = list()
+        open_ranges     = list()
+
+        for (start, size, name) in entries:
+            while open_ranges and self.ends[open_ranges[-1]] <= start:
+                open_ranges.pop()
+
+            self.parents.append(open_ranges[-1] if open_ranges else -1)
+            open_ranges.append(len(self.starts))
+
+            self.starts.append(start)
+            self.ends.append(start + size)
+            self.names.append(name)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def lookup(self, address) -> tuple:
+        """returns (name, offset) of the innermost range holding address, or None"""
+
+        index = bisect_right(self.starts, address) - 1
+
+        # past the end of the nearest range, the address can still be inside a range enclosing it
+        while index >= 0 and address >= self.ends[index]:
+            index = self.parents[index]
+
+        if index < 0:
+            return None
+
+        return (self.names[index], address - self.starts[index])
+
+    def resolve(self, address) -> str:
+        """returns address as 'name+0xoffset', or None if no range holds it"""
+
+        found = self.lookup(address)
+
+        if found is None:
+            return None
+
+        (name, offset) = found
+
+        return f"{name}+0x{offset:X}" if offset else name
+
+    def save(self, path):
+        """writes the index as a memory map file, which loads without parsing the firmware again"""
+
+        with open(path, 'w') as f:
+            for (start, end, name) in zip(self.starts, self.ends, self.names):
+                f.write(f"0x{start:08X} 0x{end - start:X} {name}\n")
+
+    def save_binary(self, path, build_id = b""):
+        """writes the index in the memory-mappable binary format, replacing path atomically"""
+
+        names       = bytearray()
+        records     = bytearray()
+        build_id    = build_id[:32]
+
+        for (start, end, name, parent) in zip(self.starts, self.ends, self.names, self.parents):
+            if end > _ADDRESS_SPACE_END:
+                raise ValueError(f"{name} at 0x{start:08X} ends at 0x{end:X}, past the 32 bit address space")
+
+            records += _index_record.pack(start, end - start, len(names), parent)
+            names   += name.encode("utf-8") + b"\0"
+
+        names_offset = _index_header.size + len(records)
+        header = _index_header.pack(INDEX_MAGIC, INDEX_VERSION, len(build_id), len(self.starts), names_offset, build_id)
+
+        # write to a temporary file first so readers never map a partial index
+        (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(records)
+            f.write(names)
+        os.replace(tmp_path, path)
+
+class MappedSymbolIndex:
+    """binary symbol index searched directly in a read-only memory mapping"""
+
+    def __init__(self, path):
+
+        with open(path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, build_id_len, self._count, self._names_offset, build_id) = _index_header.unpack_from(self._buffer, 0)
+
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{path}: not a symbol index")
+
+        if version != INDEX_VERSION:
+            raise ValueError(f"{path}: symbol index version {version} is not supported, rebuild it")
+
+        self.build_id = build_id[:build_id_len]
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._buffer.close()
+
+    def lookup(self, address) -> tuple:
+        """returns (name, offset) of the innermost range holding address, or None"""
+
+        unpack_from = _index_record.unpack_from
+        buffer      = self._buffer
+
+        # binary search for the last record starting at or before address
+        (low, high) = (0, self._count)
+        while low < high:
+            middle = (low + high) // 2
+            if unpack_from(buffer, _index_header.size + middle * _index_record.size)[0] <= address:
+                low = middle + 1
+            else:
+                high = middle
+
+        index = low - 1
+
+        # past the end of the nearest range, the address can still be inside a range enclosing it
+        while index >= 0:
+            (start, size, name_offset, parent) = unpack_from(buffer, _index_header.size + index * _index_record.size)
+            if address < start + size:
+                break
+            index = parent
+
+        if index < 0:
+            return None
+
+        name_start  = self._names_offset + name_offset
+        name        = buffer[name_start:buffer.find(b"\0", name_start)].decode("utf-8", "replace")
+
+        return (name, address - start)
+
+    resolve = SymbolIndex.resolve
+
+def load(path):
+    """opens a binary symbol index, or builds an index from an ELF firmware image or a memory map file"""
+
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+
+    if magic == INDEX_MAGIC:
+        return MappedSymbolIndex(path)
+
+    if magic == elf_core.ELF_MAGIC:
+        return SymbolIndex(read_elf_symbols(path))
+
+    return SymbolIndex(read_map(path))
+
+def cached_index_path(firmware, index_dir) -> str:
+    """returns the binary index of a firmware image in index_dir, named by its build ID and built on first use"""
+
+    if elf_core.is_elf(firmware):
+        build_id = read_build_id(firmware)
+    else:
+        with open(firmware, 'rb') as f:
+            build_id = hashlib.sha1(f.read()).digest()
+
+    # the format version is part of the name, so indexes cached by an older version are built again
+    path = os.path.join(index_dir, f"{build_id.hex()}.v{INDEX_VERSION}.fidx")
+
+    if not os.path.exists(path):
+        os.makedirs(index_dir, exist_ok=True)
+        load(firmware).save_binary(path, build_id)
+
+    return path
+
+def add_symbol_arguments(parser):
+    """adds options for resolving fault addresses to an argparse parser"""
+
+    parser.add_argument('--symbols', dest="symbols", default=None, help="ELF firmware image, memory map or symbol index to resolve fault addresses")
+    parser.add_argument('--symbol-cache', dest="symbol_cache", default=None, help="directory of binary symbol indexes keyed by firmware build ID, built on first use")
+
+def symbols_path(args) -> str:
+    """returns the symbol file to load for parsed arguments, going through the index cache if one is given"""
+
+    if args.symbols is None or args.symbol_cache is None:
+        return args.symbols
+
+    try:
+        return cached_index_path(args.symbols, args.symbol_cache)
+    except ValueError as error:
+        sys.exit(f"error: {args.symbols}: {error}")
+
+def add_arguments(parser):
+    """adds index subcommand arguments to an argparse parser"""
+
+    parser.add_argument('firmware', help="ELF firmware image or memory map file")
+    parser.add_argument('-o', '--output', dest="output", required=True, help="index file to write")
+    parser.add_argument('--text', dest="text", action='store_true', help="write a memory map text file instead of a binary index")
+
+def main(args):
+    """runs the index subcommand from parsed arguments"""
+
+    index = load(args.firmware)
+
+    try:
+        if args.text:
+            index.save(args.output)
+        elif elf_core.is_elf(args.firmware):
+            index.save_binary(args.output, read_build_id(args.firmware))
+        else:
+            index.save_binary(args.output)
+    except ValueError as error:
+        sys.exit(f"error: {args.firmware}: {error}")
@@ -1,8 +1,17 @@
-import argparse
+import sys
+from types import SimpleNamespace
+
+import report_cache
 from register import Register
 
 class BFSR(Register):
 
+    __slots__ = ()
+
+    name = "BFSR"
+    size = 2
+    width = 8
+
     _BFSR_BFARVALID_MASK     = 0b10000000
     _BFSR_BFARVALID_SHIFT    = 7
     _BFSR_LSPERR_MASK        = 0b00100000
@@ -71,32 +80,25 @@ class BFSR(Register):
         if value is not None:
             self.decode(value)
 
-    def get_diagram(self) -> list:
-
-        bfarvalid   = self.bitfields["BFARVALID"]["value"]
-        lsperr      = self.bitfields["LSPERR"]["value"]
-        stkerr      = self.bitfields["STKERR"]["value"]
-        unstkerr    = self.bitfields["UNSTKERR"]["value"]
-        impreciserr = self.bitfields["IMPRECISERR"]["value"]
-        preciserr   = self.bitfields["PRECISERR"]["value"]
-        ibuserr     = self.bitfields["IBUSERR"]["value"]
-
-        bfsr_bitfield_template = f"""{bfarvalid}│ │{lsperr}│{stkerr}│{unstkerr}│{impreciserr}│{preciserr}│{ibuserr}"""
-
-        bfsr_bitfield_str = f"""
+    diagram_template = """
          │7 6 5 4│3 2 1 0│
          ├─┬─┬─┬─┼─┬─┬─┬─┤
-         │{bfsr_bitfield_template}│
+         │{BFARVALID}│ │{LSPERR}│{STKERR}│{UNSTKERR}│{IMPRECISERR}│{PRECISERR}│{IBUSERR}│
          └▲┴▲┴▲┴▲┴▲┴▲┴▲┴▲┘
 BFARVALID─┘ │ │ │ │ │ │ └─IBUSERR
  reserved───┘ │ │ │ │ └───PRECISERR
    LSPERR─────┘ │ │ └─────IMPRECISERR
    STKERR───────┘ └───────UNSTKERR
-"""    
-        return bfsr_bitfield_str.split('\n')
+"""
 
 class UFSR(Register):
 
+    __slots__ = ()
+
+    name = "UFSR"
+    size = 2
+    width = 16
+
     _UFSR_DIVBYZERO_MASK     = 0b0000001000000000
     _UFSR_DIVBYZERO_SHIFT    = 9
     _UFSR_UNALIGNED_MASK     = 0b0000000100000000
@@ -156,31 +158,25 @@ class UFSR(Register):
         if value is not None:
             self.decode(value)
 
-    def get_diagram(self) -> list:
-
-        divbyzero   = self.bitfields["DIVBYZERO"]["value"]
-        unaligned   = self.bitfields["UNALIGNED"]["value"]
-        nocp        = self.bitfields["NOCP"]["value"]
-        invpc       = self.bitfields["INVPC"]["value"]
-        invstate    = self.bitfields["INVSTATE"]["value"]
-        undefinstr  = self.bitfields["UNDEFINSTR"]["value"]
-
-        ufsr_bitfield_template = f"""  reserved  │{divbyzero}│{unaligned}│  res. │{nocp}│{invpc}│{invstate}│{undefinstr}"""
-
-        ufsr_bitfield_str = f"""
+    diagram_template = """
 │15      │ 10 9 8│7     4│3 2 1 0│
 ├────────┴───┬─┬─┼───────┼─┬─┬─┬─┤
-│{ufsr_bitfield_template}│
+│  reserved  │{DIVBYZERO}│{UNALIGNED}│  res. │{NOCP}│{INVPC}│{INVSTATE}│{UNDEFINSTR}│
 └────────────┴▲┴▲┴───────┴▲┴▲┴▲┴▲┘
     DIVBYZERO─┘ │    NOCP─┘ │ │ │
     UNALIGNED───┘   INVPC───┘ │ │
                  INVSTATE─────┘ │
                UNDEFINSTR───────┘
 """
-        return ufsr_bitfield_str.split('\n')
 
 class MMFSR(Register):
 
+    __slots__ = ()
+
+    name = "MMFSR"
+    size = 2
+    width = 8
+
     _MMFSR_MMARVALID_MASK    = 0b10000000
     _MMFSR_MMARVALID_SHIFT   = 7
     _MMFSR_MLSPERR_MASK      = 0b00100000
@@ -240,31 +236,21 @@ class MMFSR(Register):
         if value is not None:
             self.decode(value)
     
-    def get_diagram(self) -> list:
-
-        mmarvalid   = self.bitfields["MMARVALID"]["value"]
-        mlsperr     = self.bitfields["MLSPERR"]["value"]
-        mstkerr     = self.bitfields["MSTKERR"]["value"]
-        munstkerr   = self.bitfields["MUNSTKERR"]["value"]
-        daccviol    = self.bitfields["DACCVIOL"]["value"]
-        iaccviol    = self.bitfields["IACCVIOL"]["value"]
-
-        mmfsr_bitfield_template = f"""{mmarvalid}│ │{mlsperr}│{mstkerr}│{munstkerr}│ │{daccviol}│{iaccviol}"""
-
-        mmfsr_bitfield_str = f"""
+    diagram_template = """
          │7 6 5 4│3 2 1 0│
          ├─┬─┬─┬─┼─┬─┬─┬─┤
-         │{mmfsr_bitfield_template}│
+         │{MMARVALID}│ │{MLSPERR}│{MSTKERR}│{MUNSTKERR}│ │{DACCVIOL}│{IACCVIOL}│
          └▲┴▲┴▲┴▲┴▲┴▲┴▲┴▲┘
 MMARVALID─┘ │ │ │ │ │ │ └─IACCVIOL
  Reserved───┘ │ │ │ │ └───DACCVIOL
   MLSPERR─────┘ │ │ └─────Reserved
   MSTKERR───────┘ └───────MUNSTKERR
 """
-        return mmfsr_bitfield_str.split('\n')
 
 class CFSR():
 
+    __slots__ = ("bfsr", "ufsr", "mmfsr", "_raw")
+
     _CFSR_MMFSR_MASK     = 0x000000FF
     _CFSR_MMFSR_SHIFT    = 0
     _CFSR_BFSR_MASK      = 0x0000FF00
@@ -272,18 +258,35 @@ class CFSR():
     _CFSR_UFSR_MASK      = 0xFFFF0000
     _CFSR_UFSR_SHIFT     = 16
 
+    # sub-register classes, replaced by the profiles whose layouts differ
+    ufsr_class  = UFSR
+    bfsr_class  = BFSR
+    mmfsr_class = MMFSR
+
     def __init__(self, value = None):
 
+        # sub-registers are created once and re-decoded on every call
+        self.bfsr   = self.bfsr_class()
+        self.ufsr   = self.ufsr_class()
+        self.mmfsr  = self.mmfsr_class()
+        self._raw   = None
+
         if value is not None:
             self.decode(value)
 
     def decode(self, cfsr_value):
-        self.bfsr   = BFSR((cfsr_value & self._CFSR_BFSR_MASK) >> self._CFSR_BFSR_SHIFT)
-        self.ufsr   = UFSR((cfsr_value & self._CFSR_UFSR_MASK) >> self._CFSR_UFSR_SHIFT)
-        self.mmfsr  = MMFSR((cfsr_value & self._CFSR_MMFSR_MASK) >> self._CFSR_MMFSR_SHIFT)
+        self._raw = cfsr_value
+        self.bfsr.decode((cfsr_value & self._CFSR_BFSR_MASK) >> self._CFSR_BFSR_SHIFT)
+        self.ufsr.decode((cfsr_value & self._CFSR_UFSR_MASK) >> self._CFSR_UFSR_SHIFT)
+        self.mmfsr.decode((cfsr_value & self._CFSR_MMFSR_MASK) >> self._CFSR_MMFSR_SHIFT)
 
 class HFSR(Register):
 
+    __slots__ = ()
+
+    name = "HFSR"
+    size = 8
+
     _HFSR_DEBUGEVT_MASK      = 0x80000000
     _HFSR_DEBUGEVT_SHIFT     = 31
     _HFSR_FORCED_MASK        = 0x40000000
@@ -304,12 +307,12 @@ class HFSR(Register):
         "FORCED": {
             "mask":         _HFSR_FORCED_MASK,
             "shift":        _HFSR_FORCED_SHIFT,
-            "description":  _HFSR_DEBUGEVT_DESC
+            "description":  _HFSR_FORCED_DESC
         },
         "VECTTBL": {
             "mask":         _HFSR_VECTTBL_MASK,
             "shift":        _HFSR_VECTTBL_SHIFT,
-            "description":  _HFSR_DEBUGEVT_DESC
+            "description":  _HFSR_VECTTBL_DESC
         }
     }   
 
@@ -319,27 +322,22 @@ class HFSR(Register):
         if value is not None:
             self.decode(value)
 
-    def get_diagram(self) -> list:
-
-        debugevt    = self.bitfields["DEBUGEVT"]["value"]
-        forced      = self.bitfields["FORCED"]["value"]
-        vecttbl     = self.bitfields["VECTTBL"]["value"]
-        
-        hfsr_bitfield_template = f"""{debugevt}│{forced}│          RESERVED          │{vecttbl}│ """
-
-        hfsr_bitfield_str = f"""
+    diagram_template = """
 │31 │29                          │1│0│
 ├─┬─┼────────────────────────────┼─┼─┤
-│{hfsr_bitfield_template}│
+│{DEBUGEVT}│{FORCED}│          RESERVED          │{VECTTBL}│ │
 └▲┴▲┴────────────────────────────┴▲┴▲┘
  │ └─FORCED               VECTTBL─┘ │
  └───DEBUGEVT            RESERVED───┘
 """
-    
-        return hfsr_bitfield_str.split('\n')
 
 class SHCSR(Register):
 
+    __slots__ = ()
+
+    name = "SHCSR"
+    size = 8
+
     _SHCSR_USGFAULTENA_MASK      = 0x00040000
     _SHCSR_USGFAULTENA_SHIFT     = 18
     _SHCSR_BUSFAULTENA_MASK      = 0x00020000
@@ -463,30 +461,11 @@ class SHCSR(Register):
         if value is not None:
             self.decode(value)
 
-    def get_diagram(self) -> list:
-
-        usgfaultena     = self.bitfields["USGFAULTENA"]["value"]
-        busfaultena     = self.bitfields["BUSFAULTENA"]["value"]
-        memfaultena     = self.bitfields["MEMFAULTENA"]["value"]
-        svcallpended    = self.bitfields["SVCALLPENDED"]["value"]
-        busfaultpended  = self.bitfields["BUSFAULTPENDED"]["value"]
-        memfaultpended  = self.bitfields["MEMFAULTPENDED"]["value"]
-        usgfaultpended  = self.bitfields["USGFAULTPENDED"]["value"]
-        systickact      = self.bitfields["SYSTICKACT"]["value"]
-        pendsvact       = self.bitfields["PENDSVACT"]["value"]
-        monitoract      = self.bitfields["MONITORACT"]["value"]
-        svcallact       = self.bitfields["SVCALLACT"]["value"]
-        usgfaultact     = self.bitfields["USGFAULTACT"]["value"]
-        busfaultact     = self.bitfields["BUSFAULTACT"]["value"]
-        memfaultact     = self.bitfields["MEMFAULTACT"]["value"]
-        
-        shcsr_bitfield_template = f"""        RESERVED         │{usgfaultena}│{busfaultena}│{memfaultena}│{svcallpended}│{busfaultpended}│{memfaultpended}│{usgfaultpended}│{systickact}│{pendsvact}│ │{monitoract}│{svcallact}│ RES │{usgfaultact}│ │{busfaultact}│{memfaultact}"""
-
-        shcsr_bitfield_str = f"""
+    diagram_template = """
                          1 1 1 1 1 1 1 1 1 1
 │31                     │9 8 7 6│5 4 3 2│1 0 9 8│7 6   4│3 2 1 0│
 ├───────────────────────┴─┬─┬─┬─┼─┬─┬─┬─┼─┬─┬─┬─┼─┬─────┼─┬─┬─┬─┤
-│{shcsr_bitfield_template}│
+│        RESERVED         │{USGFAULTENA}│{BUSFAULTENA}│{MEMFAULTENA}│{SVCALLPENDED}│{BUSFAULTPENDED}│{MEMFAULTPENDED}│{USGFAULTPENDED}│{SYSTICKACT}│{PENDSVACT}│ │{MONITORACT}│{SVCALLACT}│ RES │{USGFAULTACT}│ │{BUSFAULTACT}│{MEMFAULTACT}│
 └─────────────────────────┴▲┴▲┴▲┴▲┴▲┴▲┴▲┴▲┴▲┴▲┴▲┴▲┴─────┴▲┴▲┴▲┴▲┘
                USGFAULTENA─┘ │ │ │ │ │ │ │ │ │ │ │       │ │ │ └─MEMFAULTACT
                BUSFAULTENA───┘ │ │ │ │ │ │ │ │ │ │       │ │ └───BUSFAULTACT
@@ -498,73 +477,705 @@ class SHCSR(Register):
                               SYSTICKACT─┘ │ └─────RESERVED
                                PENDSVACT───┘
 """
-        return shcsr_bitfield_str.split('\n')
 
-def get_report(reg_name, value, size, diagram: list, table: list, header_char = "=", separator_char = "-", line_width = 80) -> str:
+# ARMv8-M Mainline adds the stack limit check to UFSR, Secure state handlers to SHCSR and the SecureFault registers
+
+def _msb_first(bitfields: dict) -> dict:
+    """returns bitfields ordered from the most significant bit like the hand-written layouts"""
+
+    return dict(sorted(bitfields.items(), key=lambda bitfield: -bitfield[1]["shift"]))
 
-    report_str_list = list()
+class UFSR_V8M(UFSR):
+
+    __slots__ = ()
+
+    _UFSR_STKOF_MASK         = 0b0000000000010000
+    _UFSR_STKOF_SHIFT        = 4
+
+    _UFSR_STKOF_DESC         = "A stack overflow was detected by the stack limit check of MSPLIM or PSPLIM"
+
+    _ufsr_bitfields = _msb_first({
+        **UFSR._ufsr_bitfields,
+        "STKOF": {
+            "mask":         _UFSR_STKOF_MASK,
+            "shift":        _UFSR_STKOF_SHIFT,
+            "description":  _UFSR_STKOF_DESC
+        }
+    })
+
+    # the hand-drawn diagram has no STKOF slot, so the diagram is drawn from the masks
+    diagram_template = None
+
+class CFSR_V8M(CFSR):
+
+    __slots__ = ()
+
+    ufsr_class = UFSR_V8M
+
+class SHCSR_V8M(SHCSR):
+
+    __slots__ = ()
+
+    _SHCSR_HARDFAULTPENDED_MASK      = 0x00200000
+    _SHCSR_HARDFAULTPENDED_SHIFT     = 21
+    _SHCSR_SECUREFAULTPENDED_MASK    = 0x00100000
+    _SHCSR_SECUREFAULTPENDED_SHIFT   = 20
+    _SHCSR_SECUREFAULTENA_MASK       = 0x00080000
+    _SHCSR_SECUREFAULTENA_SHIFT      = 19
+    _SHCSR_NMIACT_MASK               = 0x00000020
+    _SHCSR_NMIACT_SHIFT              = 5
+    _SHCSR_SECUREFAULTACT_MASK       = 0x00000010
+    _SHCSR_SECUREFAULTACT_SHIFT      = 4
+    _SHCSR_HARDFAULTACT_MASK         = 0x00000004
+    _SHCSR_HARDFAULTACT_SHIFT        = 2
+
+    _SHCSR_HARDFAULTPENDED_DESC      = "HardFault is pending"
+    _SHCSR_SECUREFAULTPENDED_DESC    = "SecureFault is pending"
+    _SHCSR_SECUREFAULTENA_DESC       = "SecureFault enabled"
+    _SHCSR_NMIACT_DESC               = "NMI is active"
+    _SHCSR_SECUREFAULTACT_DESC       = "SecureFault is active"
+    _SHCSR_HARDFAULTACT_DESC         = "HardFault is active"
+
+    _shcsr_bitfields = _msb_first({
+        **SHCSR._shcsr_bitfields,
+        "HARDFAULTPENDED": {
+            "mask":         _SHCSR_HARDFAULTPENDED_MASK,
+            "shift":        _SHCSR_HARDFAULTPENDED_SHIFT,
+            "description":  _SHCSR_HARDFAULTPENDED_DESC
+        },
+        "SECUREFAULTPENDED": {
+            "mask":         _SHCSR_SECUREFAULTPENDED_MASK,
+            "shift":        _SHCSR_SECUREFAULTPENDED_SHIFT,
+            "description":  _SHCSR_SECUREFAULTPENDED_DESC
+        },
+        "SECUREFAULTENA": {
+            "mask":         _SHCSR_SECUREFAULTENA_MASK,
+            "shift":        _SHCSR_SECUREFAULTENA_SHIFT,
+            "description":  _SHCSR_SECUREFAULTENA_DESC
+        },
+        "NMIACT": {
+            "mask":         _SHCSR_NMIACT_MASK,
+            "shift":        _SHCSR_NMIACT_SHIFT,
+            "description":  _SHCSR_NMIACT_DESC
+        },
+        "SECUREFAULTACT": {
+            "mask":         _SHCSR_SECUREFAULTACT_MASK,
+            "shift":        _SHCSR_SECUREFAULTACT_SHIFT,
+            "description":  _SHCSR_SECUREFAULTACT_DESC
+        },
+        "HARDFAULTACT": {
+            "mask":         _SHCSR_HARDFAULTACT_MASK,
+            "shift":        _SHCSR_HARDFAULTACT_SHIFT,
+            "description":  _SHCSR_HARDFAULTACT_DESC
+        }
+    })
+
+    diagram_template = None
+
+class SFSR(Register):
+
+    __slots__ = ()
+
+    name = "SFSR"
+    size = 8
+
+    _SFSR_LSERR_MASK         = 0b10000000
+    _SFSR_LSERR_SHIFT        = 7
+    _SFSR_SFARVALID_MASK     = 0b01000000
+    _SFSR_SFARVALID_SHIFT    = 6
+    _SFSR_LSPERR_MASK        = 0b00100000
+    _SFSR_LSPERR_SHIFT       = 5
+    _SFSR_INVTRAN_MASK       = 0b00010000
+    _SFSR_INVTRAN_SHIFT      = 4
+    _SFSR_AUVIOL_MASK        = 0b00001000
+    _SFSR_AUVIOL_SHIFT       = 3
+    _SFSR_INVER_MASK         = 0b00000100
+    _SFSR_INVER_SHIFT        = 2
+    _SFSR_INVIS_MASK         = 0b00000010
+    _SFSR_INVIS_SHIFT        = 1
+    _SFSR_INVEP_MASK         = 0b00000001
+    _SFSR_INVEP_SHIFT        = 0
+
+    _SFSR_LSERR_DESC         = "An error occurred during lazy state activation or deactivation"
+    _SFSR_SFARVALID_DESC     = "SFAR has valid contents"
+    _SFSR_LSPERR_DESC        = "An SAU or IDAU violation occurred during lazy preservation of floating-point state"
+    _SFSR_INVTRAN_DESC       = "A branch that was not flagged as a domain crossing transitioned from Secure to Non-secure memory"
+    _SFSR_AUVIOL_DESC        = "Non-secure code attempted to access memory the SAU or IDAU marks Secure, the address is in SFAR (only valid if SFARVALID is set)"
+    _SFSR_INVER_DESC         = "An exception return was attempted from Secure state with an invalid EXC_RETURN, or to Secure state from a Non-secure handler"
+    _SFSR_INVIS_DESC         = "The integrity signature of an exception frame was invalid on unstacking"
+    _SFSR_INVEP_DESC         = "Non-secure code called Secure memory at an address that is not a valid entry point, with no SG instruction in NSC memory"
+
+    _sfsr_bitfields = {
+        "LSERR": {
+            "mask":         _SFSR_LSERR_MASK,
+            "shift":        _SFSR_LSERR_SHIFT,
+            "description":  _SFSR_LSERR_DESC
+        },
+        "SFARVALID": {
+            "mask":         _SFSR_SFARVALID_MASK,
+            "shift":        _SFSR_SFARVALID_SHIFT,
+            "description":  _SFSR_SFARVALID_DESC
+        },
+        "LSPERR": {
+            "mask":         _SFSR_LSPERR_MASK,
+            "shift":        _SFSR_LSPERR_SHIFT,
+            "description":  _SFSR_LSPERR_DESC
+        },
+        "INVTRAN": {
+            "mask":         _SFSR_INVTRAN_MASK,
+            "shift":        _SFSR_INVTRAN_SHIFT,
+            "description":  _SFSR_INVTRAN_DESC
+        },
+        "AUVIOL": {
+            "mask":         _SFSR_AUVIOL_MASK,
+            "shift":        _SFSR_AUVIOL_SHIFT,
+            "description":  _SFSR_AUVIOL_DESC
+        },
+        "INVER": {
+            "mask":         _SFSR_INVER_MASK,
+            "shift":        _SFSR_INVER_SHIFT,
+            "description":  _SFSR_INVER_DESC
+        },
+        "INVIS": {
+            "mask":         _SFSR_INVIS_MASK,
+            "shift":        _SFSR_INVIS_SHIFT,
+            "description":  _SFSR_INVIS_DESC
+        },
+        "INVEP": {
+            "mask":         _SFSR_INVEP_MASK,
+            "shift":        _SFSR_INVEP_SHIFT,
+            "description":  _SFSR_INVEP_DESC
+        }
+    }
+
+    def __init__(self, value = None):
+        super().__init__(self._sfsr_bitfields)
+
+        if value is not None:
+            self.decode(value)
+
+# ARMv6-M has no configurable fault status registers, its SHCSR only holds the SVCall pending bit
+
+class SHCSR_V6M(SHCSR):
+
+    __slots__ = ()
+
+    _shcsr_bitfields = {
+        "SVCALLPENDED": SHCSR._shcsr_bitfields["SVCALLPENDED"]
+    }
+
+    diagram_template = None
+
+def iter_report(reg_name, value, size, diagram, table, header_char = "=", separator_char = "-", line_width = 80):
+    """yields the lines of a register report"""
 
     # create header
-    report_str_list.append(header_char * line_width)
+    yield header_char * line_width
 
     # print raw
-    report_str_list.append(f"{reg_name}: 0x{value:0{size}X}")
+    yield f"{reg_name}: 0x{value:0{size}X}"
 
     # create separator
-    report_str_list.append(separator_char * line_width)
+    yield separator_char * line_width
 
     # padding
-    report_str_list.append("")
+    yield ""
 
     # diagram
-    report_str_list.extend(diagram)
+    yield from diagram
 
     # padding
-    report_str_list.append("")
+    yield ""
 
     # separator
-    report_str_list.append(separator_char * line_width)
+    yield separator_char * line_width
 
     # padding
-    report_str_list.append("")
+    yield ""
 
     # table
-    report_str_list.extend(table)
+    yield from table
 
     # padding
-    report_str_list.append("")
+    yield ""
 
     # header
-    report_str_list.append(header_char * line_width)
+    yield header_char * line_width
 
-    return "\n".join(report_str_list)
+def get_report(reg_name, value, size, diagram: list, table: list, header_char = "=", separator_char = "-", line_width = 80) -> str:
 
-if __name__ == '__main__':
+    return "\n".join(iter_report(reg_name, value, size, diagram, table, header_char, separator_char, line_width))
+
+def iter_address_report(reg_name, value, valid_name, valid, symbol = None, header_char = "=", separator_char = "-", line_width = 80):
+    """yields the lines of a fault address register report, valid is None if the status register is unknown"""
+
+    # create header
+    yield header_char * line_width
+
+    # print raw
+    yield f"{reg_name}: 0x{value:08X}"
+
+    # create separator
+    yield separator_char * line_width
+
+    # padding
+    yield ""
+
+    # validity
+    if valid is None:
+        yield f"{valid_name} unknown, the address may not be valid"
+    elif valid:
+        yield f"{valid_name} is set, the address is valid"
+    else:
+        yield f"{valid_name} is not set, the address is not valid"
+
+    # symbol
+    if symbol is not None:
+        yield f"symbol: {symbol}"
+
+    # padding
+    yield ""
+
+    # header
+    yield header_char * line_width
 
-    parser = argparse.ArgumentParser(description="Analyze Fault causes on arm M-33 devices")
-    parser.add_argument('--cfsr', dest="cfsr", type=lambda x: int(x, 0), required=False, help="the CFSR value from the ARM device")
-    parser.add_argument('--hfsr', dest="hfsr", type=lambda x: int(x, 0), required=False, help="the HFSR value from the ARM device")
-    parser.add_argument('--shcsr', dest="shcsr", type=lambda x: int(x, 0), required=False, help="the SHCSR value from the ARM device")
+def get_address_report(reg_name, value, valid_name, valid, symbol = None, header_char = "=", separator_char = "-", line_width = 80) -> str:
+    """generates report of a fault address register, valid is None if the status register is unknown"""
 
-    args = parser.parse_args()
+    return "\n".join(iter_address_report(reg_name, value, valid_name, valid, symbol, header_char, separator_char, line_width))
 
-    report = ""
+def write_lines(stream, lines):
+    """writes lines to a file-like object, each followed by a newline"""
 
-    if args.cfsr is not None:
-        cfsr = CFSR(args.cfsr)
+    for line in lines:
+        stream.write(line)
+        stream.write("\n")
 
-        report += get_report("UFSR", cfsr.ufsr._raw, 2, cfsr.ufsr.get_diagram(), cfsr.ufsr.get_table()) + "\n"
-        report += get_report("BFSR", cfsr.bfsr._raw, 2, cfsr.bfsr.get_diagram(), cfsr.bfsr.get_table()) + "\n"
-        report += get_report("MMFSR", cfsr.mmfsr._raw, 2, cfsr.mmfsr.get_diagram(), cfsr.mmfsr.get_table()) + "\n"
+def write_report(stream, reg_name, value, size, diagram, table, header_char = "=", separator_char = "-", line_width = 80):
+    """writes a register report to a file-like object without building it as one string"""
 
-    if args.hfsr is not None:
-        hfsr = HFSR(args.hfsr)
+    write_lines(stream, iter_report(reg_name, value, size, diagram, table, header_char, separator_char, line_width))
 
-        report += get_report("HFSR", hfsr._raw, 8, hfsr.get_diagram(), hfsr.get_table()) + "\n"
+def get_register_report(register: Register, line_width = 80, style = "plain", cache = None) -> str:
+    """returns the report of a decoded register, served from the report cache when possible"""
 
-    if args.shcsr is not None:
-        shcsr = SHCSR(args.shcsr)
+    cache = cache or report_cache.default_cache
 
-        report += get_report("SHCSR", shcsr._raw, 8, shcsr.get_diagram(), shcsr.get_table()) + "\n"
+    key = (type(register), register._raw, line_width, style)
+
+    return cache.get(key, lambda: get_report(register.name, register._raw, register.size, register.get_diagram(), register.get_table(line_width, style), line_width=line_width))
+
+def register_fields() -> tuple:
+    """returns the bitfield names of UFSR, BFSR, MMFSR, HFSR and SHCSR, each in layout order"""
+
+    cfsr = CFSR(0)
+    registers = (cfsr.ufsr, cfsr.bfsr, cfsr.mmfsr, HFSR(), SHCSR())
+
+    return tuple(tuple(register.bitfields.keys()) for register in registers)
+
+# register classes compiled from scb_registers.json, loaded on first use
+_scb_registers = None
+
+def scb_register(name) -> type:
+    """returns the class of an SCB register without a hand-written class, e.g. DFSR, compiled from scb_registers.json"""
+
+    global _scb_registers
+
+    if _scb_registers is None:
+        # imported on first use, the definitions loader is only needed for these registers
+        import definitions
+        _scb_registers = definitions.load_registers()
+
+    return _scb_registers[name]
+
+# fault address registers with the sub-register of CFSR and the bitfield marking them valid
+ADDRESS_VALID_BITS = {
+    "bfar":     ("BFAR", "bfsr", "BFARVALID"),
+    "mmfar":    ("MMFAR", "mmfsr", "MMARVALID")
+}
+
+# fault address register of the SecureFault status register and the bitfield marking it valid
+SECURE_ADDRESS_VALID_BITS = {
+    "sfar":     ("SFAR", "SFARVALID")
+}
+
+class Profile:
+    """fault registers of one M-profile architecture, the register class of each one it implements, None for the others"""
+
+    def __init__(self, name, description, cfsr, hfsr, shcsr, sfsr = None, exc_return = "EXC_RETURN"):
+
+        self.name           = name
+        self.description    = description
+        self.cfsr           = cfsr
+        self.hfsr           = hfsr
+        self.shcsr          = shcsr
+        self.sfsr           = sfsr
+
+        # name of the EXC_RETURN class in exception_frame, which is only imported for records with core registers
+        self.exc_return     = exc_return
+
+        self._triage        = None
+
+    def __repr__(self):
+        return f"Profile({self.name!r})"
+
+    def registers(self) -> SimpleNamespace:
+        """returns a new instance of every register of the profile, None for the registers it does not implement"""
+
+        return SimpleNamespace(
+            cfsr        = self.cfsr(0) if self.cfsr is not None else None,
+            hfsr        = self.hfsr() if self.hfsr is not None else None,
+            shcsr       = self.shcsr() if self.shcsr is not None else None,
+            sfsr        = self.sfsr() if self.sfsr is not None else None,
+            exc_return  = None
+        )
+
+    def register_fields(self) -> tuple:
+        """returns the bitfield names of UFSR, BFSR, MMFSR, HFSR, SHCSR and SFSR in layout order, none for missing registers"""
+
+        classes = (self.cfsr.ufsr_class, self.cfsr.bfsr_class, self.cfsr.mmfsr_class) if self.cfsr is not None else (None, None, None)
+
+        return tuple(tuple(cls().bitfields.keys()) if cls is not None else () for cls in classes + (self.hfsr, self.shcsr, self.sfsr))
+
+    def exc_return_class(self) -> type:
+        """returns the EXC_RETURN register class of the profile"""
+
+        import exception_frame
+
+        return getattr(exception_frame, self.exc_return)
+
+    def triage(self) -> "triage.Triage":
+        """returns the triage of the built-in rules compiled for the bitfields of the profile, on first use"""
+
+        if self._triage is None:
+            import triage
+
+            # the fields are passed in, so running this module as a script does not import it a second time
+            self._triage = triage.Triage(register_fields=self.register_fields)
+
+        return self._triage
+
+# register layouts of each architecture, the layouts, diagrams and triage tables of every profile are built once
+PROFILES = {
+    "armv8m":   Profile("armv8m", "ARMv8-M Mainline: Cortex-M33, M35P, M55, M85", CFSR_V8M, HFSR, SHCSR_V8M, SFSR, "EXC_RETURN"),
+    "armv7m":   Profile("armv7m", "ARMv7-M: Cortex-M3, M4, M7", CFSR, HFSR, SHCSR, None, "EXC_RETURN_V7M"),
+    "armv6m":   Profile("armv6m", "ARMv6-M: Cortex-M0, M0+, M1", None, None, SHCSR_V6M, None, "EXC_RETURN_V6M")
+}
+
+# profile of each core, by name without the 'cortex-' prefix
+CORE_PROFILES = {
+    "m33":      "armv8m",
+    "m35p":     "armv8m",
+    "m55":      "armv8m",
+    "m85":      "armv8m",
+    "m3":       "armv7m",
+    "m4":       "armv7m",
+    "m7":       "armv7m",
+    "m0":       "armv6m",
+    "m0+":      "armv6m",
+    "m1":       "armv6m"
+}
+
+# profile of records that do not name one, the fault bits ARMv7-M and ARMv8-M Mainline have in common
+DEFAULT_PROFILE = "armv7m"
+
+# profiles by every name they were looked up with
+_profile_names = dict()
+
+def get_profile(name = None) -> Profile:
+    """returns the profile of an architecture ('armv8m', 'ARMv8-M') or a core ('cortex-m33', 'M0+'), the default for None"""
+
+    if name is None:
+        name = DEFAULT_PROFILE
+
+    if isinstance(name, Profile):
+        return name
+
+    if not isinstance(name, str):
+        raise ValueError(f"invalid core profile {name!r}, expected a name like armv8m or cortex-m33")
+
+    try:
+        return _profile_names[name]
+    except KeyError:
+        pass
+
+    key = name.lower().replace("-", "").replace("_", "")
+    key = CORE_PROFILES.get(key.removeprefix("cortex"), key)
+
+    if key not in PROFILES:
+        raise ValueError(f"unknown core profile {name!r}, expected one of {', '.join(PROFILES.keys())} or a core like cortex-m33")
+
+    _profile_names[name] = PROFILES[key]
+
+    return PROFILES[key]
+
+def _instance(register, cls):
+    """returns register if it is an instance of cls, else a new instance"""
+
+    return register if type(register) is cls else cls()
+
+def iter_record_report(record: dict, cfsr = None, hfsr = None, shcsr = None, symbol_index = None, profile = None, sfsr = None):
+    """yields the ascii report of every register in a record, one register at a time
+
+    the core profile is the one named by the record's 'core' field, else profile, and registers it does not implement
+    are left out. register instances are reused if they are of the profile's classes, otherwise only the registers
+    present in the record are created
+    """
+
+    profile = get_profile(record.get("core") or profile)
+
+    cfsr_value = record.get("cfsr") if profile.cfsr is not None else None
+    if cfsr_value is not None:
+        cfsr = _instance(cfsr, profile.cfsr)
+        cfsr.decode(cfsr_value)
+        yield get_register_report(cfsr.ufsr) + "\n"
+        yield get_register_report(cfsr.bfsr) + "\n"
+        yield get_register_report(cfsr.mmfsr) + "\n"
+
+    # fault addresses marked valid, for the diagnoses
+    valid_addresses = dict()
+
+    for reg in ADDRESS_VALID_BITS.keys() if profile.cfsr is not None else ():
+        address = record.get(reg)
+        if address is None:
+            continue
+
+        # addresses are only resolved to symbols unless the status register marks them invalid
+        (reg_name, sub_register, valid_bit) = ADDRESS_VALID_BITS[reg]
+        valid   = getattr(cfsr, sub_register).values[valid_bit] if cfsr_value is not None else None
+        symbol  = None
+
+        if valid:
+            valid_addresses[reg] = address
+
+        if symbol_index is not None and valid is not False:
+            symbol = symbol_index.resolve(address) or "unknown"
+
+        yield get_address_report(reg_name, address, valid_bit, valid, symbol) + "\n"
+
+    hfsr_value = record.get("hfsr") if profile.hfsr is not None else None
+    if hfsr_value is not None:
+        hfsr = _instance(hfsr, profile.hfsr)
+        hfsr.decode(hfsr_value)
+        yield get_register_report(hfsr) + "\n"
+
+    shcsr_value = record.get("shcsr")
+    if shcsr_value is not None:
+        shcsr = _instance(shcsr, profile.shcsr)
+        shcsr.decode(shcsr_value)
+        yield get_register_report(shcsr) + "\n"
+
+    sfsr_value = record.get("sfsr") if profile.sfsr is not None else None
+    if sfsr_value is not None:
+        sfsr = _instance(sfsr, profile.sfsr)
+        sfsr.decode(sfsr_value)
+        yield get_register_report(sfsr) + "\n"
+
+    for reg in SECURE_ADDRESS_VALID_BITS.keys() if profile.sfsr is not None else ():
+        address = record.get(reg)
+        if address is None:
+            continue
+
+        (reg_name, valid_bit) = SECURE_ADDRESS_VALID_BITS[reg]
+        valid   = sfsr.values[valid_bit] if sfsr_value is not None else None
+        symbol  = None
+
+        if symbol_index is not None and valid is not False:
+            symbol = symbol_index.resolve(address) or "unknown"
+
+        yield get_address_report(reg_name, address, valid_bit, valid, symbol) + "\n"
+
+    dfsr_value = record.get("dfsr")
+    if dfsr_value is not None:
+        yield get_register_report(scb_register("DFSR")(dfsr_value)) + "\n"
+
+    # diagnoses combine all of the registers above
+    if cfsr_value is not None or hfsr_value is not None or shcsr_value is not None or sfsr_value is not None:
+        rules   = profile.triage()
+        matches = rules.diagnose_registers(cfsr if cfsr_value is not None else None, hfsr if hfsr_value is not None else None, shcsr if shcsr_value is not None else None, sfsr=sfsr if sfsr_value is not None else None, **valid_addresses)
+
+        if matches:
+            yield rules.report(matches) + "\n"
+
+    exc_return_value = record.get("exc_return")
+    frame = record.get("frame")
+    if exc_return_value is not None or frame is not None:
+
+        # imported on first use, most records only hold fault status registers
+        import exception_frame
+
+        if exc_return_value is not None:
+            yield get_register_report(profile.exc_return_class()(exc_return_value)) + "\n"
+
+        if frame is not None:
+            yield exception_frame.get_frame_report(frame, symbol_index) + "\n"
+
+# register values of the command line or a record and the profile register they need, the others are decoded on every profile
+PROFILE_REGISTERS = (
+    ("cfsr",    "cfsr"),
+    ("hfsr",    "hfsr"),
+    ("bfar",    "cfsr"),
+    ("mmfar",   "cfsr"),
+    ("sfsr",    "sfsr"),
+    ("sfar",    "sfsr")
+)
+
+# options of a plain decode, which the command line parses without argparse
+_fast_value_options     = ("--cfsr", "--hfsr", "--shcsr", "--bfar", "--mmfar", "--sfsr", "--sfar", "--dfsr", "--exc-return")
+_fast_string_options    = ("--core", "--symbols", "--symbol-cache")
+
+def _parse_fast(argv: list):
+    """parses a command line of register values and symbol options only, returns None for anything else"""
+
+    options = {option[2:].replace("-", "_"): None for option in _fast_value_options + _fast_string_options}
+
+    args = iter(argv)
+    for arg in args:
+        (option, separator, value) = arg.partition("=")
+
+        if option not in _fast_value_options + _fast_string_options:
+            return None
+
+        if not separator:
+            value = next(args, None)
+            if value is None:
+                return None
+
+        if option in _fast_value_options:
+            try:
+                value = int(value, 0)
+            except ValueError:
+                return None
+
+        options[option[2:].replace("-", "_")] = value
+
+    return SimpleNamespace(**options)
+
+if __name__ == '__main__':
+
+    # plain decodes skip argparse and the subcommand modules, which is most of the startup time
+    args = _parse_fast(sys.argv[1:])
+
+    if args is None:
+
+        import argparse
+
+        import aggregate
+        import batch
+        import coredump
+        import server
+        import symbols
+
+        parser = argparse.ArgumentParser(description="Analyze Fault causes on arm M-33 devices")
+        parser.add_argument('--cfsr', dest="cfsr", type=lambda x: int(x, 0), required=False, help="the CFSR value from the ARM device")
+        parser.add_argument('--hfsr', dest="hfsr", type=lambda x: int(x, 0), required=False, help="the HFSR value from the ARM device")
+        parser.add_argument('--shcsr', dest="shcsr", type=lambda x: int(x, 0), required=False, help="the SHCSR value from the ARM device")
+        parser.add_argument('--bfar', dest="bfar", type=lambda x: int(x, 0), required=False, help="the BFAR value from the ARM device")
+        parser.add_argument('--mmfar', dest="mmfar", type=lambda x: int(x, 0), required=False, help="the MMFAR value from the ARM device")
+        parser.add_argument('--sfsr', dest="sfsr", type=lambda x: int(x, 0), required=False, help="the SFSR value from an ARMv8-M device with the Security Extension")
+        parser.add_argument('--sfar', dest="sfar", type=lambda x: int(x, 0), required=False, help="the SFAR value from an ARMv8-M device with the Security Extension")
+        parser.add_argument('--dfsr', dest="dfsr", type=lambda x: int(x, 0), required=False, help="the DFSR value from the ARM device")
+        parser.add_argument('--exc-return', dest="exc_return", type=lambda x: int(x, 0), required=False, help="the EXC_RETURN value (LR on exception entry) from the ARM device")
+        parser.add_argument('--core', dest="core", default=None, help=f"core profile selecting the register layouts: {', '.join(PROFILES.keys())} or a core like cortex-m33 (default: {DEFAULT_PROFILE})")
+        parser.add_argument('--definitions', dest="definitions", default=None, help="SVD, JSON or YAML file of register definitions for --register")
+        parser.add_argument('--register', dest="registers", metavar="NAME=VALUE", action='append', default=[], help="decode a register of --definitions, may be repeated")
+        parser.add_argument('--definitions-cache', dest="definitions_cache", metavar="DIR", default=None, help="directory of parsed --definitions files keyed by their content, filled on first use")
+
+        symbols.add_symbol_arguments(parser)
+
+        subparsers = parser.add_subparsers(dest="command", metavar="command")
+
+        batch_parser = subparsers.add_parser('batch', help="decode a stream of CSV/JSONL register records")
+        batch.add_arguments(batch_parser)
+
+        coredump_parser = subparsers.add_parser('coredump', help="decode raw memory images of the system control block")
+        coredump.add_arguments(coredump_parser)
+
+        index_parser = subparsers.add_parser('index', help="build a symbol index from a firmware image for faster address lookups")
+        symbols.add_arguments(index_parser)
+
+        aggregate_parser = subparsers.add_parser('aggregate', help="count fault bitfields and signatures across many register records")
+        aggregate.add_arguments(aggregate_parser)
+
+        serve_parser = subparsers.add_parser('serve', help="serve decode and report requests over local http")
+        server.add_arguments(serve_parser)
+
+        args = parser.parse_args()
+
+        if args.registers and args.definitions is None:
+            parser.error("--register needs --definitions")
+
+        if args.command == 'batch':
+            batch.main(args)
+            raise SystemExit(0)
+
+        if args.command == 'coredump':
+            coredump.main(args)
+            raise SystemExit(0)
+
+        if args.command == 'index':
+            symbols.main(args)
+            raise SystemExit(0)
+
+        if args.command == 'aggregate':
+            aggregate.main(args)
+            raise SystemExit(0)
+
+        if args.command == 'serve':
+            server.main(args)
+            raise SystemExit(0)
+
+    symbol_index = None
+    if args.symbols:
+        import symbols
+        symbol_index = symbols.load(symbols.symbols_path(args))
+
+    record = {
+        "cfsr":         args.cfsr,
+        "hfsr":         args.hfsr,
+        "shcsr":        args.shcsr,
+        "bfar":         args.bfar,
+        "mmfar":        args.mmfar,
+        "sfsr":         args.sfsr,
+        "sfar":         args.sfar,
+        "dfsr":         args.dfsr,
+        "exc_return":   args.exc_return,
+        "core":         args.core
+    }
 
-    print(report)
\ No newline at end of file
+    try:
+        profile = get_profile(args.core)
+    except ValueError as error:
+        sys.exit(f"error: {error}")
+
+    # values of registers the core does not have would be left out of the report without a word
+    unsupported = [option for (option, register) in PROFILE_REGISTERS if getattr(args, option) is not None and getattr(profile, register) is None]
+    if unsupported:
+        options = ", ".join("--" + option for option in unsupported)
+        sys.exit(f"error: {profile.name} ({profile.description}) has no register for {options}")
+
+    # registers of a definitions file, checked before any report is written
+    defined = list()
+    if getattr(args, "registers", None):
+        import definitions
+
+        try:
+            classes = definitions.load_registers(args.definitions, args.definitions_cache)
+        except (OSError, ValueError, KeyError, SyntaxError) as error:
+            sys.exit(f"error: cannot load register definitions from {args.definitions}: {error}")
+
+        for register in args.registers:
+            (name, _, value) = register.partition("=")
+
+            if name not in classes:
+                sys.exit(f"error: no register {name!r} in {args.definitions}")
+
+            try:
+                defined.append(classes[name](int(value, 0)))
+            except ValueError:
+                sys.exit(f"error: invalid value {value!r} for register {name}")
+
+    # reports go straight to stdout, one register at a time
+    sys.stdout.writelines(iter_record_report(record, symbol_index=symbol_index))
+    sys.stdout.writelines(get_register_report(register) + "\n" for register in defined)
+    sys.stdout.write("\n")
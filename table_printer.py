@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 styles = {
     "plain": {
         "padding":                  1,
@@ -15,22 +17,97 @@ styles = {
     }
 }
 
+@lru_cache(maxsize=None)
+def _compile_style(style, col0_width, col1_width) -> tuple:
+    """resolves a style into the fixed strings of a table with the given column widths"""
+
+    s   = styles[style]
+    pad = " " * s["padding"]
+
+    col0_rule = s["horizontal"] * (col0_width + 2 * s["padding"])
+    col1_rule = s["horizontal"] * (col1_width + 2 * s["padding"])
+
+    top         = s["top_left_junction"] + col0_rule + s["top_junction"] + col1_rule + s["top_right_junction"]
+    separator   = s["left_junction"] + col0_rule + s["junction"] + col1_rule + s["right_junction"]
+    bottom      = s["bottom_left_junction"] + col0_rule + s["bottom_junction"] + col1_rule + s["bottom_right_junction"]
+
+    # pieces around the register and description text of a row
+    left        = s["vertical"] + pad
+    middle      = pad + s["vertical"] + pad
+    right       = pad + s["vertical"]
+    blank       = s["vertical"] + " " * (col0_width + 2 * s["padding"]) + s["vertical"] + pad
+
+    return (top, separator, bottom, left, middle, right, blank)
+
+@lru_cache(maxsize=4096)
+def _wrap(description, width) -> tuple:
+    """splits a description into lines of at most width characters, breaking between words"""
+
+    desc_entry_rows = list()
+    str_entry = ""
+
+    for word in description.split():
+
+        # new line needed wont fit on this line
+        if (len(str_entry) + len(word)) > width:
+            desc_entry_rows.append(str_entry[:-1])
+            str_entry = ""
+
+        str_entry += word + " "
+
+    # add str_entry if not empty
+    if str_entry:
+        desc_entry_rows.append(str_entry[:-1])
+
+    return tuple(desc_entry_rows)
+
 class Table_Printer:
 
     line_width = 80
 
-    def __init__(self, col1, col2, style = "plain"):
+    def __init__(self, col1, col2, style = "plain", compiled = True):
 
-        self.col1   = col1
-        self.col2   = col2
-        self.style  = style
-        self._table = None
+        self.col1       = col1
+        self.col2       = col2
+        self.style      = style
+        self.compiled   = compiled
+        self._table     = None
 
-        self._generate()
+        if compiled:
+            self._generate_compiled()
+        else:
+            self._generate()
 
     def list(self):
         return self._table
 
+    def _generate_compiled(self):
+        """renders the table from a precompiled style and cached description wrapping"""
+
+        padding     = styles[self.style]["padding"]
+        col0_width  = max((len(entry) for entry in self.col1), default=0)
+        col1_width  = self.line_width - col0_width - (3 + (4 * padding))
+
+        self.col_widths = (col0_width, col1_width)
+
+        (top, separator, bottom, left, middle, right, blank) = _compile_style(self.style, col0_width, col1_width)
+
+        tbl_str_list = [top]
+
+        for (register, description) in zip(self.col1, self.col2):
+            lines = _wrap(description, col1_width)
+
+            if lines:
+                tbl_str_list.append("".join((left, register.ljust(col0_width), middle, lines[0].ljust(col1_width), right)))
+                tbl_str_list.extend("".join((blank, line.ljust(col1_width), right)) for line in lines[1:])
+
+            tbl_str_list.append(separator)
+
+        #replace last element since it should be bottom border instead
+        tbl_str_list[-1] = bottom
+
+        self._table = tbl_str_list
+
     def _generate(self):
 
         tbl_str_list = []
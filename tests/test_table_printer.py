@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from system_control_registers import PROFILES
+from table_printer import Table_Printer, styles
+
+LINE_WIDTHS = (40, 60, 80, 120)
+
+def register_tables() -> list:
+    """returns (name, bitfields, descriptions) of every register of every profile with all of its bitfields set"""
+
+    tables = list()
+
+    for profile in PROFILES.values():
+        registers   = profile.registers()
+        instances   = [registers.hfsr, registers.shcsr, registers.sfsr, profile.exc_return_class()()]
+
+        if registers.cfsr is not None:
+            instances.extend((registers.cfsr.ufsr, registers.cfsr.bfsr, registers.cfsr.mmfsr))
+
+        for register in instances:
+            if register is not None:
+                register.decode(0xFFFFFFFF)
+                tables.append((f"{profile.name}.{type(register).__name__}", register.decoded.set_bits, register.decoded.descriptions))
+
+    return tables
+
+def random_tables(count = 200) -> list:
+    """returns (name, register names, descriptions) of tables of random lengths, including words wider than a column"""
+
+    rng     = random.Random(0)
+    words   = ["fault", "a", "the", "register", "BFAR", "exception", "occurred", "x" * 70, "imprecise", "stack"]
+    tables  = list()
+
+    for index in range(count):
+        rows = index % 20
+        names           = ["".join(rng.choice("ABCDEFGHIJ") for _ in range(rng.randint(1, 16))) for _ in range(rows)]
+        descriptions    = [" ".join(rng.choice(words) for _ in range(rng.randint(0, 40))) for _ in range(rows)]
+        tables.append((f"random {index}", names, descriptions))
+
+    return tables
+
+@pytest.mark.parametrize("line_width", LINE_WIDTHS)
+@pytest.mark.parametrize("style", styles.keys())
+def test_compiled_renderer_matches_original(monkeypatch, style, line_width):
+
+    monkeypatch.setattr(Table_Printer, "line_width", line_width)
+
+    for (name, names, descriptions) in register_tables() + random_tables():
+        compiled = Table_Printer(names, descriptions, style, compiled=True).list()
+        original = Table_Printer(names, descriptions, style, compiled=False).list()
+
+        assert compiled == original, f"{name} renders differently at a line width of {line_width}"
@@ -0,0 +1,46 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from system_control_registers import PROFILES
+
+# more values than the lru cache of a wide layout holds, so threads evict and rebuild entries while others read them
+VALUES  = 6000
+THREADS = 8
+
+def decode_all(values: list, offset: int) -> list:
+    """decodes values with fresh instances of every register of every profile, starting at offset"""
+
+    profiles    = [profile.registers() for profile in PROFILES.values()]
+    results     = list()
+
+    for value in values[offset:] + values[:offset]:
+        decoded = list()
+
+        for registers in profiles:
+            for register in (registers.hfsr, registers.shcsr, registers.sfsr):
+                if register is not None:
+                    register.decode(value)
+                    decoded.append((dict(register.values), tuple(register.get_table())))
+
+            if registers.cfsr is not None:
+                registers.cfsr.decode(value)
+                decoded.extend(dict(sub_register.values) for sub_register in (registers.cfsr.ufsr, registers.cfsr.bfsr, registers.cfsr.mmfsr))
+
+        results.append((value, decoded))
+
+    return results
+
+def test_concurrent_decodes_match_serial_decode():
+
+    rng     = random.Random(0)
+    values  = [rng.getrandbits(32) for _ in range(VALUES)]
+
+    expected = dict(decode_all(values, 0))
+
+    # each thread walks the values from a different starting point so decodes interleave
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = list(pool.map(decode_all, [values] * THREADS, [index * VALUES // THREADS for index in range(THREADS)]))
+
+    mismatches = [value for result in results for (value, decoded) in result if decoded != expected[value]]
+
+    assert not mismatches, f"{len(mismatches)} threaded decodes differ from the serial decode, first 0x{mismatches[0]:08X}"
@@ -0,0 +1,430 @@
+# fault addresses below this are reported as NULL pointer dereferences
+NULL_REGION_SIZE = 0x1000
+
+# state bits covered by each dispatch table, which has 2 ** DISPATCH_BITS entries
+DISPATCH_BITS = 8
+
+# distinct sets of matching rules kept as ranked tuples, cleared when full
+MATCH_CACHE_SIZE = 1 << 16
+
+# decoded registers a state is built from, each contributing its bitfield flags in layout order
+TRIAGE_REGISTERS = ("UFSR", "BFSR", "MMFSR", "HFSR", "SHCSR", "SFSR")
+
+# conditions set for every register present in a record, so rules can tell a cleared bit from a missing register
+PRESENT_CONDITIONS = tuple(f"{name}.PRESENT" for name in TRIAGE_REGISTERS)
+
+# conditions derived from the fault addresses, only set when the address is marked valid
+ADDRESS_CONDITIONS = ("BFAR.NULL", "MMFAR.NULL")
+
+_CFSR_FAULTS = [
+    "UFSR.DIVBYZERO", "UFSR.UNALIGNED", "UFSR.STKOF", "UFSR.NOCP", "UFSR.INVPC", "UFSR.INVSTATE", "UFSR.UNDEFINSTR",
+    "BFSR.LSPERR", "BFSR.STKERR", "BFSR.UNSTKERR", "BFSR.IMPRECISERR", "BFSR.PRECISERR", "BFSR.IBUSERR",
+    "MMFSR.MLSPERR", "MMFSR.MSTKERR", "MMFSR.MUNSTKERR", "MMFSR.DACCVIOL", "MMFSR.IACCVIOL"
+]
+
+_SFSR_FAULTS = ["SFSR.LSERR", "SFSR.LSPERR", "SFSR.INVTRAN", "SFSR.AUVIOL", "SFSR.INVER", "SFSR.INVIS", "SFSR.INVEP"]
+
+# a rule matches when every 'all' condition, at least one 'any' condition and no 'none' condition is set,
+# matching diagnoses are ranked by priority, then by the order of this list. bitfields a core profile does not
+# implement read as cleared
+RULES = [
+    {
+        "name":         "null-dereference",
+        "priority":     3,
+        "all":          ["BFSR.PRECISERR", "BFAR.NULL"],
+        "diagnosis":    "Likely NULL pointer dereference, a precise data access faulted near address 0 (see BFAR)"
+    },
+    {
+        "name":         "mpu-null-dereference",
+        "priority":     3,
+        "all":          ["MMFSR.DACCVIOL", "MMFAR.NULL"],
+        "diagnosis":    "Likely NULL pointer dereference caught by the MPU, a data access near address 0 was denied (see MMFAR)"
+    },
+    {
+        "name":         "escalated-precise-bus-fault",
+        "priority":     3,
+        "all":          ["HFSR.FORCED", "BFSR.PRECISERR", "BFSR.BFARVALID"],
+        "diagnosis":    "A precise bus fault escalated to HardFault, BFAR holds the data address and the stacked PC the faulting instruction"
+    },
+    {
+        "name":         "stacking-overflow",
+        "priority":     3,
+        "any":          ["BFSR.STKERR", "MMFSR.MSTKERR"],
+        "diagnosis":    "Stacking the exception frame failed, most likely a stack overflow or a corrupted stack pointer"
+    },
+    {
+        "name":         "stack-limit",
+        "priority":     3,
+        "all":          ["UFSR.STKOF"],
+        "diagnosis":    "Stack overflow caught by the stack limit check, the stack pointer went below MSPLIM or PSPLIM"
+    },
+    {
+        "name":         "secure-entry-violation",
+        "priority":     3,
+        "all":          ["SFSR.INVEP"],
+        "diagnosis":    "Non-secure code called Secure code at an address that is not an entry point, the function is missing from the NSC veneers"
+    },
+    {
+        "name":         "secure-attribution-violation",
+        "priority":     3,
+        "all":          ["SFSR.AUVIOL"],
+        "diagnosis":    "Non-secure code accessed memory the SAU or IDAU marks Secure, check the SAU regions around the address in SFAR"
+    },
+    {
+        "name":         "vector-table-read",
+        "priority":     3,
+        "all":          ["HFSR.VECTTBL"],
+        "diagnosis":    "Reading the vector table failed, VTOR points to invalid memory or the table is corrupt"
+    },
+    {
+        "name":         "unstacking-corruption",
+        "priority":     2,
+        "any":          ["BFSR.UNSTKERR", "MMFSR.MUNSTKERR"],
+        "diagnosis":    "Unstacking on exception return failed, the stack was corrupted or the stack pointer changed while in the handler"
+    },
+    {
+        "name":         "invalid-exc-return",
+        "priority":     2,
+        "all":          ["UFSR.INVPC"],
+        "diagnosis":    "Invalid EXC_RETURN on exception return, LR was overwritten in a handler or the stack is corrupt"
+    },
+    {
+        "name":         "secure-stack-integrity",
+        "priority":     2,
+        "any":          ["SFSR.INVIS", "SFSR.INVER"],
+        "diagnosis":    "Exception return to Secure state failed its integrity checks, the Secure stack frame or EXC_RETURN is corrupt"
+    },
+    {
+        "name":         "invalid-security-transition",
+        "priority":     2,
+        "all":          ["SFSR.INVTRAN"],
+        "diagnosis":    "Secure code branched to Non-secure code without BXNS or BLXNS, typically a Non-secure function pointer called directly"
+    },
+    {
+        "name":         "bad-code-pointer",
+        "priority":     2,
+        "any":          ["UFSR.INVSTATE", "BFSR.IBUSERR", "MMFSR.IACCVIOL"],
+        "diagnosis":    "Execution from an invalid address or in ARM state, typically a corrupted function pointer or return address"
+    },
+    {
+        "name":         "undefined-instruction",
+        "priority":     2,
+        "all":          ["UFSR.UNDEFINSTR"],
+        "diagnosis":    "Undefined instruction, data was executed as code or the code was overwritten"
+    },
+    {
+        "name":         "fpu-disabled",
+        "priority":     2,
+        "all":          ["UFSR.NOCP"],
+        "diagnosis":    "Floating-point instruction with the FPU disabled, FP code ran before CPACR enabled the coprocessor"
+    },
+    {
+        "name":         "lazy-fp-stacking",
+        "priority":     2,
+        "any":          ["BFSR.LSPERR", "MMFSR.MLSPERR", "SFSR.LSPERR", "SFSR.LSERR"],
+        "diagnosis":    "Lazy floating-point state preservation faulted, the stack holding the reserved FP frame is no longer valid"
+    },
+    {
+        "name":         "divide-by-zero",
+        "priority":     2,
+        "all":          ["UFSR.DIVBYZERO"],
+        "diagnosis":    "Integer division by zero with DIV_0_TRP enabled"
+    },
+    {
+        "name":         "unaligned-access",
+        "priority":     2,
+        "all":          ["UFSR.UNALIGNED"],
+        "diagnosis":    "Unaligned memory access with UNALIGN_TRP enabled, or an unaligned LDM, STM, LDRD or STRD"
+    },
+    {
+        "name":         "imprecise-bus-fault",
+        "priority":     2,
+        "all":          ["BFSR.IMPRECISERR"],
+        "diagnosis":    "Imprecise bus fault from a buffered write, the faulting store ran some instructions before the stacked PC"
+    },
+    {
+        "name":         "mpu-data-violation",
+        "priority":     2,
+        "all":          ["MMFSR.DACCVIOL"],
+        "none":         ["MMFAR.NULL"],
+        "diagnosis":    "Data access denied by the MPU, check the region attributes around the address in MMFAR"
+    },
+    {
+        "name":         "fault-in-fault-handler",
+        "priority":     2,
+        "all":          ["HFSR.FORCED"],
+        "any":          ["SHCSR.MEMFAULTACT", "SHCSR.BUSFAULTACT", "SHCSR.USGFAULTACT"],
+        "diagnosis":    "A fault occurred while a configurable fault handler was active and escalated to HardFault"
+    },
+    {
+        "name":         "usage-fault-disabled",
+        "priority":     1,
+        "all":          ["HFSR.FORCED", "SHCSR.PRESENT"],
+        "any":          [fault for fault in _CFSR_FAULTS if fault.startswith("UFSR.")],
+        "none":         ["SHCSR.USGFAULTENA"],
+        "diagnosis":    "UsageFault is disabled in SHCSR, so the usage fault escalated to HardFault"
+    },
+    {
+        "name":         "bus-fault-disabled",
+        "priority":     1,
+        "all":          ["HFSR.FORCED", "SHCSR.PRESENT"],
+        "any":          [fault for fault in _CFSR_FAULTS if fault.startswith("BFSR.")],
+        "none":         ["SHCSR.BUSFAULTENA"],
+        "diagnosis":    "BusFault is disabled in SHCSR, so the bus fault escalated to HardFault"
+    },
+    {
+        "name":         "memmanage-fault-disabled",
+        "priority":     1,
+        "all":          ["HFSR.FORCED", "SHCSR.PRESENT"],
+        "any":          [fault for fault in _CFSR_FAULTS if fault.startswith("MMFSR.")],
+        "none":         ["SHCSR.MEMFAULTENA"],
+        "diagnosis":    "MemManage is disabled in SHCSR, so the MPU fault escalated to HardFault"
+    },
+    {
+        "name":         "securefault-disabled",
+        "priority":     1,
+        "all":          ["HFSR.FORCED", "SHCSR.PRESENT"],
+        "any":          _SFSR_FAULTS,
+        "none":         ["SHCSR.SECUREFAULTENA"],
+        "diagnosis":    "SecureFault is disabled in SHCSR, so the security violation escalated to HardFault"
+    },
+    {
+        "name":         "forced-without-cause",
+        "priority":     1,
+        "all":          ["HFSR.FORCED", "UFSR.PRESENT"],
+        "none":         _CFSR_FAULTS,
+        "diagnosis":    "Forced HardFault with no fault bits in CFSR, CFSR was cleared before the dump or a fault handler faulted"
+    },
+    {
+        "name":         "debug-event",
+        "priority":     1,
+        "all":          ["HFSR.DEBUGEVT"],
+        "diagnosis":    "Debug event escalated to HardFault, e.g. a BKPT instruction without a debugger attached"
+    }
+]
+
+class Rule:
+    """rule compiled to bitmasks over the condition bits of a register state"""
+
+    __slots__ = ("name", "priority", "diagnosis", "all_mask", "any_mask", "none_mask")
+
+    def __init__(self, name, priority: int, diagnosis: str, all_mask: int, any_mask: int, none_mask: int):
+
+        self.name       = name
+        self.priority   = priority
+        self.diagnosis  = diagnosis
+        self.all_mask   = all_mask
+        self.any_mask   = any_mask
+        self.none_mask  = none_mask
+
+    def matches(self, state: int) -> bool:
+        """checks the rule against a register state"""
+
+        return state & self.all_mask == self.all_mask and (not self.any_mask or state & self.any_mask) and not state & self.none_mask
+
+class Triage:
+    """ranks the diagnoses of a set of rules for decoded register states
+
+    a state packs the bitfield flags of every register and the derived conditions into one integer. rules are
+    compiled into one dispatch table per DISPATCH_BITS bits of the state, each entry holding the set of rules (one
+    bit per rule) whose conditions on those bits are met, so matching takes a lookup and an AND per table however
+    many rules there are
+    """
+
+    def __init__(self, rules = RULES, null_region = NULL_REGION_SIZE, register_fields = None):
+
+        self.null_region = null_region
+
+        # bitfield names of TRIAGE_REGISTERS in layout order, from system_control_registers unless given
+        if register_fields is None:
+            from system_control_registers import register_fields
+
+        # registers missing from the end of the fields have no bitfields
+        fields = tuple(register_fields())
+        fields += ((),) * (len(TRIAGE_REGISTERS) - len(fields))
+
+        # conditions in state bit order, the bitfields of each register in the order of its flags, then the derived conditions
+        names = tuple(f"{name}.{bitfield}" for (name, bitfields) in zip(TRIAGE_REGISTERS, fields) for bitfield in bitfields) + PRESENT_CONDITIONS + ADDRESS_CONDITIONS
+        self.conditions = {name: index for (index, name) in enumerate(names)}
+
+        # state bit that is never set, standing in for bitfields these layouts do not have
+        self._absent = len(names)
+
+        # (state bit of the first bitfield, present condition mask) of each register
+        self._registers     = tuple((sum(len(bitfields) for bitfields in fields[:index]), 1 << self.conditions[PRESENT_CONDITIONS[index]]) for index in range(len(fields)))
+        self._bfar_null     = 1 << self.conditions["BFAR.NULL"]
+        self._mmfar_null    = 1 << self.conditions["MMFAR.NULL"]
+
+        compiled = [self._compile(rule) for rule in rules]
+        self.rules = tuple(sorted(compiled, key=lambda rule: -rule.priority))
+
+        self._compile_tables()
+
+        # matching rules by set of matching rules, and rendered reports by matches
+        self._matches   = dict()
+        self._reports   = dict()
+
+    def _mask(self, rule: dict, key: str) -> int:
+
+        mask = 0
+
+        for condition in rule.get(key, ()):
+            if condition in self.conditions:
+                mask |= 1 << self.conditions[condition]
+            elif condition.partition(".")[0] in TRIAGE_REGISTERS:
+                mask |= 1 << self._absent
+            else:
+                raise ValueError(f"rule {rule['name']}: unknown condition {condition}")
+
+        return mask
+
+    def _compile(self, rule: dict) -> Rule:
+        """compiles a declarative rule to bitmasks"""
+
+        return Rule(rule["name"], rule.get("priority", 1), rule["diagnosis"], self._mask(rule, "all"), self._mask(rule, "any"), self._mask(rule, "none"))
+
+    def _compile_tables(self):
+        """builds the dispatch tables of every DISPATCH_BITS wide slice of the state"""
+
+        size = 1 << DISPATCH_BITS
+
+        # rules with 'any' conditions only match if a table also reports one of them set
+        self._all_rules = (1 << len(self.rules)) - 1
+        self._no_any    = sum(1 << index for (index, rule) in enumerate(self.rules) if not rule.any_mask)
+        self._tables    = list()
+
+        for shift in range(0, self._absent + 1, DISPATCH_BITS):
+            met     = [self._all_rules] * size
+            any_set = [0] * size
+
+            for (index, rule) in enumerate(self.rules):
+                (all_bits, any_bits, none_bits) = ((mask >> shift) & (size - 1) for mask in (rule.all_mask, rule.any_mask, rule.none_mask))
+
+                for value in range(size):
+                    if value & all_bits != all_bits or value & none_bits:
+                        met[value] &= ~(1 << index)
+                    if value & any_bits:
+                        any_set[value] |= 1 << index
+
+            self._tables.append((shift, tuple(met), tuple(any_set)))
+
+    def state(self, decoded, bfar = None, mmfar = None) -> int:
+        """packs decoded entries in TRIAGE_REGISTERS order (None if missing) and valid fault addresses into a state"""
+
+        state = 0
+
+        for (entry, (offset, present)) in zip(decoded, self._registers):
+            if entry is not None:
+                state |= entry.flags << offset | present
+
+        if bfar is not None and bfar < self.null_region:
+            state |= self._bfar_null
+
+        if mmfar is not None and mmfar < self.null_region:
+            state |= self._mmfar_null
+
+        return state
+
+    def match(self, state: int) -> tuple:
+        """returns the rules matching a state, highest priority first"""
+
+        met     = self._all_rules
+        any_set = self._no_any
+        mask    = (1 << DISPATCH_BITS) - 1
+
+        for (shift, met_table, any_table) in self._tables:
+            value = (state >> shift) & mask
+            met &= met_table[value]
+            any_set |= any_table[value]
+
+        matched = met & any_set
+
+        try:
+            return self._matches[matched]
+        except KeyError:
+            pass
+
+        if len(self._matches) >= MATCH_CACHE_SIZE:
+            self._matches.clear()
+
+        matches = tuple(rule for (index, rule) in enumerate(self.rules) if matched & (1 << index))
+        self._matches[matched] = matches
+
+        return matches
+
+    def diagnose(self, decoded, bfar = None, mmfar = None) -> tuple:
+        """returns the rules matching decoded entries in TRIAGE_REGISTERS order and valid fault addresses"""
+
+        return self.match(self.state(decoded, bfar, mmfar))
+
+    def diagnose_registers(self, cfsr = None, hfsr = None, shcsr = None, bfar = None, mmfar = None, sfsr = None) -> tuple:
+        """returns the rules matching decoded register instances, None for registers that are missing"""
+
+        decoded = [None] * len(TRIAGE_REGISTERS)
+
+        if cfsr is not None:
+            decoded[0:3] = (cfsr.ufsr.decoded, cfsr.bfsr.decoded, cfsr.mmfsr.decoded)
+
+        if hfsr is not None:
+            decoded[3] = hfsr.decoded
+
+        if shcsr is not None:
+            decoded[4] = shcsr.decoded
+
+        if sfsr is not None:
+            decoded[5] = sfsr.decoded
+
+        return self.diagnose(decoded, bfar, mmfar)
+
+    def report(self, matches: tuple, style = "plain", header_char = "=", separator_char = "-", line_width = 80) -> str:
+        """returns the report of matching rules, rendered once for every distinct set of matches"""
+
+        key = (matches, style, header_char, separator_char, line_width)
+
+        try:
+            return self._reports[key]
+        except KeyError:
+            pass
+
+        report = "\n".join(iter_diagnosis_report(matches, style, header_char, separator_char, line_width))
+        self._reports[key] = report
+
+        return report
+
+def iter_diagnosis_report(matches: tuple, style = "plain", header_char = "=", separator_char = "-", line_width = 80):
+    """yields the lines of a report of ranked diagnoses, laid out like a register report so it joins the other blocks"""
+
+    from table_printer import Table_Printer
+
+    # create header
+    yield header_char * line_width
+
+    # print title
+    yield "Diagnosis"
+
+    # create separator
+    yield separator_char * line_width
+
+    # padding
+    yield ""
+
+    # table
+    yield from Table_Printer([rule.name for rule in matches], [rule.diagnosis for rule in matches], style).list()
+
+    # padding
+    yield ""
+
+    # header
+    yield header_char * line_width
+
+_default_triage = None
+
+def default_triage(register_fields = None) -> Triage:
+    """returns the triage of the built-in rules, compiled on first use"""
+
+    global _default_triage
+
+    if _default_triage is None:
+        _default_triage = Triage(register_fields=register_fields)
+
+    return _default_triage
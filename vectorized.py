@@ -0,0 +1,95 @@
+from array import array
+
+from system_control_registers import BFSR, UFSR, MMFSR, CFSR, HFSR, SHCSR
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# typecode of a 32 bit unsigned array.array on this platform
+_UINT32_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+# (column prefix, bitfield dict, shift of the sub-register within the 32 bit value)
+_cfsr_layout = (
+    ("UFSR",    UFSR._ufsr_bitfields,   CFSR._CFSR_UFSR_SHIFT),
+    ("BFSR",    BFSR._bfsr_bitfields,   CFSR._CFSR_BFSR_SHIFT),
+    ("MMFSR",   MMFSR._mmfsr_bitfields, CFSR._CFSR_MMFSR_SHIFT)
+)
+
+_hfsr_layout = (
+    ("HFSR",    HFSR._hfsr_bitfields,   0),
+)
+
+_shcsr_layout = (
+    ("SHCSR",   SHCSR._shcsr_bitfields, 0),
+)
+
+def as_uint32(values):
+    """converts a numpy array, buffer or sequence of register values to a uint32 array"""
+
+    if np is not None:
+        if isinstance(values, (bytes, bytearray, memoryview)):
+            return np.frombuffer(values, dtype=np.uint32)
+        return np.asarray(values, dtype=np.uint32)
+
+    if isinstance(values, array) and values.typecode == _UINT32_TYPECODE:
+        return values
+
+    if isinstance(values, (bytes, bytearray, memoryview)):
+        return memoryview(values).cast('B').cast(_UINT32_TYPECODE)
+
+    return array(_UINT32_TYPECODE, values)
+
+def _column(values, mask: int, shift: int):
+    """extracts one bitfield from every value as a uint8 column"""
+
+    if np is not None:
+        return ((values & np.uint32(mask)) >> np.uint32(shift)).astype(np.uint8)
+
+    return array('B', [(value & mask) >> shift for value in values])
+
+def decode_layout(layout, values) -> dict:
+    """decodes every bitfield of a register layout into columns named 'REG.FIELD'"""
+
+    values  = as_uint32(values)
+    columns = dict()
+
+    for (prefix, bitfields, reg_shift) in layout:
+        for bitfield in bitfields.keys():
+            mask    = bitfields[bitfield]["mask"] << reg_shift
+            shift   = bitfields[bitfield]["shift"] + reg_shift
+            columns[f"{prefix}.{bitfield}"] = _column(values, mask, shift)
+
+    return columns
+
+def decode_cfsr(values) -> dict:
+    """decodes an array of CFSR values into UFSR, BFSR and MMFSR bitfield columns"""
+
+    return decode_layout(_cfsr_layout, values)
+
+def decode_hfsr(values) -> dict:
+    """decodes an array of HFSR values into bitfield columns"""
+
+    return decode_layout(_hfsr_layout, values)
+
+def decode_shcsr(values) -> dict:
+    """decodes an array of SHCSR values into bitfield columns"""
+
+    return decode_layout(_shcsr_layout, values)
+
+def decode(cfsr = None, hfsr = None, shcsr = None) -> dict:
+    """decodes arrays of register values into one column per bitfield"""
+
+    columns = dict()
+
+    if cfsr is not None:
+        columns.update(decode_cfsr(cfsr))
+
+    if hfsr is not None:
+        columns.update(decode_hfsr(hfsr))
+
+    if shcsr is not None:
+        columns.update(decode_shcsr(shcsr))
+
+    return columns